@@ -0,0 +1,191 @@
+import os, json, time, base64, hashlib
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+
+from ..core.metrics import counter
+from ..core.redis import redis_client
+
+REQUESTS = counter("answer_cache_requests_total", "Consultas ao cache de respostas do KnowledgeAgent.",
+                   ("tier", "result"))
+ERRORS = counter("answer_cache_errors_total", "Falhas de Redis no cache de respostas (fail-open).")
+EVICTIONS = counter("answer_cache_evictions_total", "Entradas removidas por limite de tamanho.")
+
+def enabled() -> bool:
+    return (os.getenv("ANSWER_CACHE", "1") or "1") not in ("0", "false", "no")
+
+def _ttl() -> int:
+    return int(os.getenv("ANSWER_CACHE_TTL_S", "3600") or "3600")
+
+def _max_entries() -> int:
+    return int(os.getenv("ANSWER_CACHE_MAX", "1000") or "1000")
+
+def _threshold() -> float:
+    return float(os.getenv("ANSWER_CACHE_SIM", "0.92") or "0.92")
+
+class Hit(NamedTuple):
+    response: str
+    details: str
+    # Fontes validadas da resposta (o /chat/stream as manda no evento "sources").
+    sources: Tuple[str, ...] = ()
+
+def _key_id(norm: str) -> str:
+    return hashlib.sha1(norm.encode("utf-8")).hexdigest()[:20]
+
+def _pack(vec: Sequence[float]) -> str:
+    return base64.b64encode(np.asarray(vec, dtype=np.float32).tobytes()).decode("ascii")
+
+def _unpack(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+class AnswerCache:
+    """
+    Cache de respostas do KnowledgeAgent em duas camadas, compartilhado entre
+    réplicas via Redis:
+
+    - exata: mensagem normalizada por `_tokenize` → resposta;
+    - semântica: similaridade de cosseno entre o embedding da consulta e o das
+      consultas já respondidas, acima de ANSWER_CACHE_SIM.
+
+    Todas as chaves levam a versão do índice, então um rebuild invalida tudo.
+    Entradas expiram após ANSWER_CACHE_TTL_S; acima de ANSWER_CACHE_MAX as menos
+    usadas recentemente são removidas. Erros de Redis viram miss.
+    """
+
+    def __init__(self, client=None, prefix: str = "ans"):
+        self.client = client or redis_client
+        self.prefix = prefix
+        # Espelho local dos vetores por versão: (geração, posição no log "added", ids, matriz normalizada).
+        self._mirror: Dict[str, Tuple[Optional[str], int, List[str], np.ndarray]] = {}
+
+    def _k(self, version: str, *parts: str) -> str:
+        return ":".join((self.prefix, version) + parts)
+
+    async def get_exact(self, norm: str, version: str) -> Optional[Hit]:
+        if not enabled() or not norm:
+            return None
+        try:
+            hit = await self._get_entry(version, _key_id(norm))
+        except Exception:
+            ERRORS.inc()
+            return None
+        REQUESTS.inc(tier="exact", result="hit" if hit else "miss")
+        return hit
+
+    async def get_semantic(self, vec: Sequence[float], version: str) -> Optional[Hit]:
+        if not enabled():
+            return None
+        try:
+            ids, matrix = await self._vectors(version)
+            hit = None
+            if ids:
+                q = np.asarray(vec, dtype=np.float32)
+                q = q / (np.linalg.norm(q) or 1.0)
+                sims = matrix @ q
+                best = int(np.argmax(sims))
+                if float(sims[best]) >= _threshold():
+                    hit = await self._get_entry(version, ids[best])
+                    if hit is None:
+                        await self._drop(version, [ids[best]])
+        except Exception:
+            ERRORS.inc()
+            return None
+        REQUESTS.inc(tier="semantic", result="hit" if hit else "miss")
+        return hit
+
+    async def put(self, norm: str, vec: Optional[Sequence[float]], response: str, details: str,
+                  version: str, sources: Sequence[str] = ()) -> None:
+        if not enabled() or not norm:
+            return
+        eid, ttl = _key_id(norm), _ttl()
+        entry = json.dumps({"response": response, "details": details, "sources": list(sources), "norm": norm},
+                           ensure_ascii=False)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.set(self._k(version, "e", eid), entry, ex=ttl)
+            if vec is not None:
+                pipe.hset(self._k(version, "vec"), eid, _pack(vec))
+                pipe.expire(self._k(version, "vec"), ttl)
+                # Entrada nova vai para o log "added": as réplicas carregam só ela, sem HGETALL.
+                pipe.rpush(self._k(version, "added"), eid)
+                pipe.expire(self._k(version, "added"), ttl)
+            pipe.zadd(self._k(version, "lru"), {eid: time.time()})
+            pipe.expire(self._k(version, "lru"), ttl)
+            pipe.zcard(self._k(version, "lru"))
+            size = (await pipe.execute())[-1]
+            excess = int(size) - _max_entries()
+            if excess > 0:
+                evicted = [m for m, _ in await self.client.zpopmin(self._k(version, "lru"), excess)]
+                await self._drop(version, evicted)
+                EVICTIONS.inc(len(evicted))
+        except Exception:
+            ERRORS.inc()
+
+    async def _get_entry(self, version: str, eid: str) -> Optional[Hit]:
+        raw = await self.client.get(self._k(version, "e", eid))
+        if not raw:
+            return None
+        await self.client.zadd(self._k(version, "lru"), {eid: time.time()}, xx=True)
+        data = json.loads(raw)
+        return Hit(data["response"], data["details"], tuple(data.get("sources") or ()))
+
+    async def _drop(self, version: str, ids: List[str]) -> None:
+        if not ids:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        pipe.delete(*[self._k(version, "e", i) for i in ids])
+        pipe.hdel(self._k(version, "vec"), *ids)
+        pipe.zrem(self._k(version, "lru"), *ids)
+        # Remoção muda a geração e zera o log: as réplicas recarregam o conjunto inteiro.
+        pipe.delete(self._k(version, "added"))
+        pipe.incr(self._k(version, "gen"))
+        pipe.expire(self._k(version, "gen"), _ttl())
+        await pipe.execute()
+
+    async def _vectors(self, version: str) -> Tuple[List[str], np.ndarray]:
+        # GET + LLEN por consulta; entradas novas chegam por HMGET só delas, e o
+        # HGETALL só acontece quando algo saiu do conjunto (geração nova).
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(self._k(version, "gen"))
+        pipe.llen(self._k(version, "added"))
+        gen, size = await pipe.execute()
+        cached = self._mirror.get(version)
+        if cached is None or cached[0] != gen or cached[1] > size:
+            return await self._reload(version)
+        _, seen, ids, matrix = cached
+        if seen == size:
+            return ids, matrix
+        new = await self.client.lrange(self._k(version, "added"), seen, size - 1)
+        raw = await self.client.hmget(self._k(version, "vec"), new) if new else []
+        ids, matrix = list(ids), matrix
+        pos = {e: i for i, e in enumerate(ids)}
+        for eid, data in zip(new, raw):
+            if data is None:
+                continue
+            row = _unpack(data)
+            row = row / (np.linalg.norm(row) or 1.0)
+            if eid in pos:
+                matrix = matrix.copy()
+                matrix[pos[eid]] = row
+            else:
+                pos[eid] = len(ids)
+                ids.append(eid)
+                matrix = row[None, :] if matrix.size == 0 else np.vstack([matrix, row])
+        self._mirror = {version: (gen, size, ids, matrix)}
+        return ids, matrix
+
+    async def _reload(self, version: str) -> Tuple[List[str], np.ndarray]:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.get(self._k(version, "gen"))
+        pipe.llen(self._k(version, "added"))
+        pipe.hgetall(self._k(version, "vec"))
+        gen, size, raw = await pipe.execute()
+        ids = list(raw.keys())
+        if ids:
+            matrix = np.stack([_unpack(raw[i]) for i in ids])
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True).clip(min=1e-12)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        self._mirror = {version: (gen, size, ids, matrix)}
+        return ids, matrix
+
+answer_cache = AnswerCache()
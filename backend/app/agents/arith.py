@@ -0,0 +1,198 @@
+import os, re, time
+from decimal import Decimal, localcontext
+from fractions import Fraction
+from typing import NamedTuple, Optional, Tuple
+
+class MathError(ValueError):
+    """Expressão válida que não tem resultado (ex.: divisão por zero)."""
+
+class Unsupported(MathError):
+    """O caminho rápido não sabe avaliar; quem chama pode cair no sympy."""
+
+class LimitExceeded(MathError):
+    """Estourou tamanho, expoente ou tempo: não deve ir para o sympy."""
+
+class Limits(NamedTuple):
+    max_len: int
+    max_exp: int
+    max_bits: int
+    timeout_s: float
+
+def limits() -> Limits:
+    return Limits(
+        max_len=int(os.getenv("MATH_MAX_LEN", "256") or "256"),
+        max_exp=int(os.getenv("MATH_MAX_EXP", "1000") or "1000"),
+        max_bits=int(os.getenv("MATH_MAX_BITS", "4096") or "4096"),
+        timeout_s=float(os.getenv("MATH_TIMEOUT_MS", "50") or "50") / 1000.0,
+    )
+
+_TOKEN = re.compile(r"\s*(?:(\d+\.?\d*|\.\d+)|(\*\*|[-+*/^x()]))")
+_OPS = {"**": "^", "x": "*"}
+
+# Precedência dos operadores binários; "^" associa à direita.
+_PREC = {"+": 1, "-": 1, "*": 2, "/": 2, "^": 4}
+_UNARY_PREC = 3
+
+def lex(expr: str, lim: Optional[Limits] = None) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """
+    Quebra a expressão em (forma, números em texto): a forma troca cada número
+    por "#", então "1000 * 0.0349" e "250 x 0.05" têm a mesma forma ("#", "*", "#").
+    """
+    lim = lim or limits()
+    if len(expr) > lim.max_len:
+        raise LimitExceeded("expressão longa demais")
+    shape, raws = [], []
+    pos, end = 0, len(expr.rstrip())
+    while pos < end:
+        m = _TOKEN.match(expr, pos)
+        if not m:
+            raise Unsupported(f"caractere inesperado na posição {pos}")
+        num, op = m.groups()
+        if num is not None:
+            shape.append("#")
+            raws.append(num)
+        else:
+            shape.append(_OPS.get(op, op))
+        pos = m.end()
+    if not shape:
+        raise Unsupported("expressão vazia")
+    return tuple(shape), tuple(raws)
+
+def tokenize(expr: str, lim: Optional[Limits] = None) -> Tuple[Tuple[str, ...], Tuple[Fraction, ...]]:
+    shape, raws = lex(expr, lim)
+    return shape, tuple(Fraction(r) for r in raws)
+
+def parse(shape: Tuple[str, ...]):
+    """
+    Precedence climbing sobre a forma. Nós: ("#", i) aponta para o i-ésimo
+    número, ("neg", a) e (op, a, b). Aceita multiplicação implícita antes de
+    "(" — "2(3+4)".
+    """
+    pos = 0
+    nidx = 0
+
+    def peek():
+        return shape[pos] if pos < len(shape) else None
+
+    def primary():
+        nonlocal pos, nidx
+        tok = peek()
+        if tok == "#":
+            node = ("#", nidx)
+            pos += 1
+            nidx += 1
+            return node
+        if tok == "(":
+            pos += 1
+            node = expr(0)
+            if peek() != ")":
+                raise Unsupported("parêntese sem fechamento")
+            pos += 1
+            return node
+        if tok in ("-", "+"):
+            pos += 1
+            node = expr(_UNARY_PREC)
+            return ("neg", node) if tok == "-" else node
+        raise Unsupported(f"token inesperado: {tok!r}")
+
+    def expr(min_prec: int):
+        nonlocal pos
+        left = primary()
+        while True:
+            tok = peek()
+            if tok == "(":
+                op = "*"
+            elif tok in _PREC:
+                op = tok
+            else:
+                return left
+            prec = _PREC[op]
+            if prec < min_prec:
+                return left
+            if tok != "(":
+                pos += 1
+            right = expr(prec if op == "^" else prec + 1)
+            left = (op, left, right)
+
+    node = expr(0)
+    if pos != len(shape):
+        raise Unsupported(f"token inesperado: {shape[pos]!r}")
+    return node
+
+def _bits(v: Fraction) -> int:
+    return max(v.numerator.bit_length(), v.denominator.bit_length())
+
+def _pow(base: Fraction, exp: Fraction, lim: Limits) -> Fraction:
+    if abs(exp) > lim.max_exp:
+        raise LimitExceeded("expoente grande demais")
+    if exp.denominator != 1:
+        raise Unsupported("expoente fracionário")
+    e = int(exp)
+    if base == 0 and e < 0:
+        raise MathError("divisão por zero")
+    if base in (0, 1) or e == 0:
+        return base ** e
+    if _bits(base) * abs(e) > lim.max_bits:
+        raise LimitExceeded("resultado grande demais")
+    return base ** e
+
+def evaluate(node, nums: Tuple[Fraction, ...], lim: Optional[Limits] = None) -> Fraction:
+    """Avalia a árvore com aritmética exata (Fraction), dentro dos limites."""
+    lim = lim or limits()
+    deadline = time.perf_counter() + lim.timeout_s
+
+    def ev(n) -> Fraction:
+        if time.perf_counter() > deadline:
+            raise LimitExceeded("tempo de avaliação esgotado")
+        op = n[0]
+        if op == "#":
+            return nums[n[1]]
+        if op == "neg":
+            return -ev(n[1])
+        a, b = ev(n[1]), ev(n[2])
+        if op == "+":
+            v = a + b
+        elif op == "-":
+            v = a - b
+        elif op == "*":
+            v = a * b
+        elif op == "/":
+            if b == 0:
+                raise MathError("divisão por zero")
+            v = a / b
+        else:
+            v = _pow(a, b, lim)
+        if _bits(v) > lim.max_bits:
+            raise LimitExceeded("resultado grande demais")
+        return v
+
+    return ev(node)
+
+def calc(expr: str, lim: Optional[Limits] = None) -> Fraction:
+    lim = lim or limits()
+    shape, nums = tokenize(expr, lim)
+    return evaluate(parse(shape), nums, lim)
+
+def decimal_scale(v: Fraction) -> Optional[int]:
+    """Casas decimais da representação exata, ou None se a dízima não termina."""
+    d, counts = v.denominator, []
+    for p in (2, 5):
+        n = 0
+        while d % p == 0:
+            d //= p
+            n += 1
+        counts.append(n)
+    return max(counts) if d == 1 else None
+
+def to_text(v: Fraction, precision: int = 16) -> str:
+    """Inteiro ou decimal exato quando dá; senão `precision` dígitos significativos."""
+    if v.denominator == 1:
+        return str(v.numerator)
+    scale = decimal_scale(v)
+    if scale is not None:
+        digits = str(abs(v.numerator) * 10 ** scale // v.denominator).rjust(scale + 1, "0")
+        sign = "-" if v < 0 else ""
+        return f"{sign}{digits[:-scale]}.{digits[-scale:]}"
+    with localcontext() as ctx:
+        ctx.prec = precision
+        return str(Decimal(v.numerator) / Decimal(v.denominator))
@@ -0,0 +1,145 @@
+import os, re, base64
+from typing import List, NamedTuple, Optional, Sequence
+import numpy as np
+
+from ..core.analysis import Analysis
+from ..core.metrics import counter
+from ..core.redis import redis_client
+
+FOLLOWUPS = counter("context_followups_total", "Follow-ups do KnowledgeAgent, por onde saiu a resposta.",
+                    ("result",))
+ERRORS = counter("context_cache_errors_total", "Falhas de Redis no contexto das conversas (fail-open).")
+
+# Começo típico de pergunta de continuação: "e para CPF?", "mas no débito?", "what about ...".
+_MARKER = re.compile(r"^\s*(e|mas|and|what about|how about|também|tambem|e se|e quanto|e no|e na|e para|e pra)\b",
+                     re.IGNORECASE)
+
+def enabled() -> bool:
+    return (os.getenv("CONTEXT_CACHE", "1") or "1") not in ("0", "false", "no")
+
+def _ttl() -> int:
+    return int(os.getenv("CONTEXT_TTL_S", "1800") or "1800")
+
+def max_ids() -> int:
+    return int(os.getenv("CONTEXT_MAX_IDS", "20") or "20")
+
+def _blend() -> float:
+    return float(os.getenv("CONTEXT_BLEND", "0.5") or "0.5")
+
+def min_score() -> float:
+    return float(os.getenv("CONTEXT_MIN_SCORE", "0.3") or "0.3")
+
+def _on_topic() -> float:
+    return float(os.getenv("CONTEXT_ON_TOPIC", "0.5") or "0.5")
+
+def _short() -> int:
+    return int(os.getenv("CONTEXT_FOLLOWUP_TOKENS", "3") or "3")
+
+def _pack(vec: Sequence[float]) -> str:
+    # float16: metade do tamanho; o re-rank só compara cossenos.
+    return base64.b64encode(np.asarray(vec, dtype=np.float16).tobytes()).decode("ascii")
+
+def _unpack(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float16).astype(np.float32)
+
+def _unit(v) -> np.ndarray:
+    v = np.asarray(v, dtype=np.float32)
+    return v / (np.linalg.norm(v) or 1.0)
+
+class Context(NamedTuple):
+    route: str
+    version: str
+    # Embedding da última consulta de conhecimento (já combinado nos follow-ups).
+    vector: Optional[np.ndarray]
+    # Chunks recuperados nas últimas consultas, mais recentes primeiro, até CONTEXT_MAX_IDS.
+    chunk_ids: List[str]
+
+def is_marked(a: Analysis) -> bool:
+    return bool(_MARKER.match(a.text))
+
+def is_followup(a: Analysis, ctx: Optional[Context], version: str) -> bool:
+    """
+    Continuação da última pergunta de conhecimento da conversa: começa com
+    "e ...", "mas ...", ou é curta (até CONTEXT_FOLLOWUP_TOKENS palavras).
+    """
+    if ctx is None or ctx.route != "KnowledgeAgent" or ctx.version != version or not ctx.chunk_ids:
+        return False
+    if a.math_only:
+        return False
+    return is_marked(a) or len(a.text.split()) <= _short()
+
+def followup_vector(vec: Sequence[float], ctx: Context, marked: bool) -> Optional[np.ndarray]:
+    """
+    Vetor da busca de um follow-up: a consulta combinada com o contexto
+    (CONTEXT_BLEND é o peso da consulta nova). Pergunta curta sem marcador
+    que não fala do mesmo assunto (cosseno < CONTEXT_ON_TOPIC) devolve None.
+    """
+    q = _unit(vec)
+    if ctx.vector is None:
+        return q
+    prev = _unit(ctx.vector)
+    if not marked and float(q @ prev) < _on_topic():
+        return None
+    w = _blend()
+    return _unit(w * q + (1.0 - w) * prev)
+
+class ContextCache:
+    """
+    Estado da conversa no Redis, um HASH por conversation_id com TTL
+    (CONTEXT_TTL_S): rota da última resposta, versão do índice, o embedding
+    da última consulta de conhecimento (float16 em base64) e os ids dos chunks
+    recuperados (até CONTEXT_MAX_IDS). Erros de Redis viram "sem contexto".
+    """
+
+    def __init__(self, client=None, prefix: str = "ctx"):
+        self.client = client or redis_client
+        self.prefix = prefix
+
+    def _k(self, conversation_id: str) -> str:
+        return f"{self.prefix}:{conversation_id}"
+
+    async def get(self, conversation_id: str) -> Optional[Context]:
+        if not enabled() or not conversation_id:
+            return None
+        try:
+            raw = await self.client.hgetall(self._k(conversation_id))
+        except Exception:
+            ERRORS.inc()
+            return None
+        if not raw:
+            return None
+        vec = raw.get("v")
+        return Context(raw.get("route", ""), raw.get("version", ""), _unpack(vec) if vec else None,
+                       [i for i in raw.get("ids", "").split("\n") if i])
+
+    async def put(self, conversation_id: str, route: str, vector: Optional[Sequence[float]] = None,
+                  chunk_ids: Optional[Sequence[str]] = None, version: Optional[str] = None,
+                  previous: Optional[Context] = None) -> None:
+        """
+        Grava a rota e, quando dados, vetor, versão e chunks. Os ids novos vêm
+        na frente dos de `previous` (mesma versão do índice), sem repetir.
+        """
+        if not enabled() or not conversation_id:
+            return
+        fields = {"route": route}
+        if vector is not None:
+            fields["v"] = _pack(vector)
+        if chunk_ids is not None:
+            ids = list(chunk_ids)
+            if previous is not None and previous.version == version:
+                ids += previous.chunk_ids
+            fields["ids"] = "\n".join(list(dict.fromkeys(ids))[:max_ids()])
+        if version is not None:
+            fields["version"] = version
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            if chunk_ids is not None and vector is None:
+                # Contexto novo sem embedding (BM25 confiante): o vetor antigo é de outro assunto.
+                pipe.hdel(self._k(conversation_id), "v")
+            pipe.hset(self._k(conversation_id), mapping=fields)
+            pipe.expire(self._k(conversation_id), _ttl())
+            await pipe.execute()
+        except Exception:
+            ERRORS.inc()
+
+context_cache = ContextCache()
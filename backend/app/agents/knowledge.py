@@ -1,37 +1,21 @@
-import os, re, time, json
-from typing import List, Dict
-from urllib.parse import urlparse, urlunparse
-import bleach
-
-from app.rag.store import retriever as get_retriever
-
-SUSPICIOUS = (
-    "ignore previous", "system prompt", "jailbreak", "do anything",
-    "por favor ignore", "resete as regras",
-)
-
-STOPWORDS_PT = {
-    "a","o","os","as","um","uma","de","da","do","das","dos","em","no","na","nos","nas",
-    "para","por","com","e","ou","se","que","qual","quais","como","quando","onde","porque",
-    "porquê","sobre","ao","à","às","aos","minha","meu","meus","minhas","sua","seu","seus",
-    "suas","esse","essa","isso","este","esta","isto","aquele","aquela","aquilo","já","não",
-    "sim","também","mais","menos","até","sem","muito","pouco"
-}
-STOPWORDS_EN = {
-    "the","a","an","and","or","to","for","of","in","on","at","by","with","from","as","is",
-    "are","be","been","this","that","these","those","it","its","your","you","we","our"
-}
-STOPWORDS = STOPWORDS_PT | STOPWORDS_EN
-
-def _normalize_url(u: str) -> str:
-    if not u:
-        return ""
-    p = urlparse(u)
-    p = p._replace(query="", fragment="")
-    norm = urlunparse(p)
-    if norm.endswith("/"):
-        norm = norm[:-1]
-    return norm
+import asyncio, os, re, time, json
+from types import MappingProxyType
+from typing import Any, AsyncIterator, List, Dict, Mapping, NamedTuple, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+from ..core.analysis import KNOWLEDGE_SUSPICIOUS as SUSPICIOUS, Analysis, ensure
+from ..core.config import settings
+from ..core.logging import annotate
+from ..core.timing import span
+from ..core.workers import WorkerPool
+from ..rag import store
+from ..rag.text import STOPWORDS, normalize_url as _normalize_url, tokenize as _tokenize
+from . import answer_cache as cache, context_cache as context, registry
+from .answer_cache import answer_cache
+from .context_cache import FOLLOWUPS, context_cache
+
+# Embedding e busca no Chroma rodam aqui, nunca no event loop do uvicorn.
+knowledge_pool = WorkerPool("knowledge", settings.KNOWLEDGE_WORKERS, settings.KNOWLEDGE_QUEUE)
 
 def _load_pages() -> List[str]:
     jf = os.getenv("PAGES_FILE", "").strip()
@@ -45,14 +29,14 @@ def _load_pages() -> List[str]:
             pass
     pages = []
     try:
-        from app.rag.pages_auto import PAGES as PAGES_AUTO
+        from ..rag.pages_auto import PAGES as PAGES_AUTO
         if isinstance(PAGES_AUTO, (list, tuple)):
             pages.extend([str(u).strip() for u in PAGES_AUTO])
     except Exception:
         pass
     if not pages:
         try:
-            from app.rag.pages_manual import PAGES as PAGES_MAN
+            from ..rag.pages_manual import PAGES as PAGES_MAN
             if isinstance(PAGES_MAN, (list, tuple)):
                 pages.extend([str(u).strip() for u in PAGES_MAN])
         except Exception:
@@ -66,10 +50,29 @@ def _load_pages() -> List[str]:
             seen.add(u); out.append(u)
     return out
 
-def _tokenize(text: str) -> List[str]:
-    text = text.lower()
-    text = re.sub(r"[^0-9a-zá-úà-ùâ-ûã-õç]+", " ", text, flags=re.IGNORECASE)
-    return [t for t in text.split() if t and t not in STOPWORDS and len(t) > 1]
+_ALLOWLIST: Optional[Tuple[tuple, Mapping[str, str]]] = None
+
+def _allowlist_key() -> tuple:
+    jf = os.getenv("PAGES_FILE", "").strip()
+    try:
+        mtime = os.stat(jf).st_mtime_ns if jf else None
+    except OSError:
+        mtime = None
+    return (jf, mtime, store.index_version())
+
+def _allowlist() -> Mapping[str, str]:
+    """
+    URL normalizada → URL canônica das páginas permitidas. Montado uma vez e
+    reaproveitado até o PAGES_FILE mudar (mtime) ou o índice ser reconstruído.
+    """
+    global _ALLOWLIST
+    key = _allowlist_key()
+    cached = _ALLOWLIST
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    index = MappingProxyType({_normalize_url(u): u for u in _load_pages()})
+    _ALLOWLIST = (key, index)
+    return index
 
 def _extractive_answer(docs, max_chars: int = 900) -> str:
     parts = []
@@ -94,79 +97,387 @@ def _dedupe_keep_order(items: List[str]) -> List[str]:
             seen.add(x); out.append(x)
     return out
 
-def knowledge_answer(message: str, user_id: str, conversation_id: str, log):
+def knowledge_answer(message: Union[str, Analysis], user_id: str, conversation_id: str, log):
     """
     Retorna (response_text, source_agent_response_text).
     """
+    response, details, _ = _answer(message, user_id, conversation_id, log)
+    return response, details
+
+class Retrieval(NamedTuple):
+    t0: float
+    docs: list
+    sources: List[str]
+    mode: str
+    # (response, details, decision) quando a resposta já está decidida antes da montagem.
+    early: Optional[Tuple[str, str, str]] = None
+    # Ids dos chunks candidatos, guardados no contexto da conversa (só com `keep`).
+    candidates: Tuple[str, ...] = ()
+
+def _answer(message: Union[str, Analysis], user_id: str, conversation_id: str, log, query_vector=None):
+    """
+    Como knowledge_answer, mas também retorna a decisão; com `query_vector`
+    a busca usa o embedding já calculado.
+    """
+    r = _retrieve(message, user_id, conversation_id, log, query_vector)
+    if r.early:
+        return r.early
+    return _compose(r, user_id, conversation_id, log)
+
+def _answer_in_context(a: Analysis, user_id: str, conversation_id: str, log, query_vector,
+                       candidates: Optional[List[str]], keep: int):
+    """_answer que também devolve a Retrieval (modo, fontes e chunks candidatos para o contexto da conversa)."""
+    r = _retrieve(a, user_id, conversation_id, log, query_vector, candidates, keep)
+    return (r.early or _compose(r, user_id, conversation_id, log)), r
+
+def _retrieve(message: Union[str, Analysis], user_id: str, conversation_id: str, log,
+              query_vector=None, candidates: Optional[List[str]] = None, keep: int = 0) -> Retrieval:
+    """
+    Etapa de busca: recupera e valida as fontes contra o allowlist. Num
+    follow-up (`candidates`), tenta antes o re-rank dos chunks da conversa
+    pelo `query_vector`; com `keep`, busca até `keep` chunks e devolve os ids
+    deles em Retrieval.candidates (a resposta continua com os RAG_K primeiros).
+    """
     t0 = time.perf_counter()
 
-    msg = bleach.clean(message or "", tags=[], attributes={}, strip=True).strip()
-    if any(tok in msg.lower() for tok in SUSPICIOUS):
-        ms = int((time.perf_counter()-t0)*1000)
-        log.warn({
-            "agent":"KnowledgeAgent","conversation_id":conversation_id,
-            "user_id":user_id,"execution_time":ms,"decision":"blocked"
-        })
-        return ("Não posso seguir instruções potencialmente maliciosas. Tente reformular.",
-                f"Blocked suspicious message | time={ms}ms")
-
-    pages = _load_pages()
-    norm_pages = {_normalize_url(u): u for u in pages}
-    if not pages:
-        ms = int((time.perf_counter()-t0)*1000)
-        log.error({"agent":"KnowledgeAgent","conversation_id":conversation_id,"user_id":user_id,
-                   "execution_time":ms,"decision":"no_pages"})
-        return ("Base de conhecimento não configurada (sem PAGES).",
-                f"Sources: [] | time={ms}ms")
+    a = ensure(message)
+    msg = a.text.strip()
+    early, norm_pages = _precheck(a, t0)
+    if early is not None:
+        return early
+    k = _rag_k()
+    docs = None
+    if candidates and query_vector is not None:
+        hits = store.rerank_ids(query_vector, candidates, k)
+        if hits and hits[0][1] >= context.min_score():
+            docs, mode = [d for d, _ in hits], "context"
+    if docs is None:
+        docs, mode = store.hybrid_search(msg, k=max(k, keep), vector=query_vector)
+    r = _validate(t0, docs[:k], mode, norm_pages)
+    if not keep:
+        return r
+    return r._replace(candidates=tuple(candidates) if mode == "context" else tuple(d.id for d in docs if d.id))
 
-    k = int(os.getenv("RAG_K", "4") or "4")
-    retr = get_retriever(k=k)
-    try:
-        docs = retr.invoke(msg)
-    except Exception:
-        docs = retr.get_relevant_documents(msg)
-    print(f"[KnowledgeAgent] msg='{msg}' k={k} retrieved={len(docs) if docs else 0}", flush=True)
+def _query_vector(text: str, force: bool = False) -> Optional[list]:
+    """
+    No knowledge_pool (o BM25 também é CPU): None para consulta de
+    palavra-chave com BM25 confiante, que nem calcula embedding; senão o embedding.
+    """
+    if not force and store.keyword_confident(text):
+        return None
+    return store.embed_query(text)
 
-    valid_docs = []
-    valid_sources = []
-    for d in docs:
-        url = (d.metadata or {}).get("url") or (d.metadata or {}).get("source")
-        nu = _normalize_url(url or "")
-        if nu and nu in norm_pages:
-            valid_docs.append(d)
-            valid_sources.append(norm_pages[nu])
+def _query_vectors(texts: List[str]) -> List[Optional[list]]:
+    """_query_vector de um lote, com um único forward para as consultas que precisam de embedding."""
+    need = [i for i, t in enumerate(texts) if not store.keyword_confident(t)]
+    out: List[Optional[list]] = [None] * len(texts)
+    for i, vec in zip(need, store.embed_queries([texts[i] for i in need]) if need else []):
+        out[i] = vec
+    return out
 
-    valid_sources = _dedupe_keep_order(valid_sources)[:5]
+def _rag_k() -> int:
+    return int(os.getenv("RAG_K", "4") or "4")
+
+def _precheck(a: Analysis, t0: float) -> Tuple[Optional[Retrieval], Mapping[str, str]]:
+    """(resposta decidida antes da busca, allowlist): mensagem suspeita ou base sem páginas."""
+    if a.suspicious:
+        ms = int((time.perf_counter()-t0)*1000)
+        annotate(level="warning", decision="blocked")
+        return Retrieval(t0, [], [], "none", (
+            "Não posso seguir instruções potencialmente maliciosas. Tente reformular.",
+            f"Blocked suspicious message | time={ms}ms", "blocked")), {}
+    with span("allowlist"):
+        norm_pages = _allowlist()
+    if not norm_pages:
+        ms = int((time.perf_counter()-t0)*1000)
+        annotate(level="error", decision="no_pages")
+        return Retrieval(t0, [], [], "none", (
+            "Base de conhecimento não configurada (sem PAGES).",
+            f"Sources: [] | time={ms}ms", "no_pages")), norm_pages
+    return None, norm_pages
+
+def _validate(t0: float, docs, mode: str, norm_pages: Mapping[str, str]) -> Retrieval:
+    """Mantém só os documentos de páginas do allowlist."""
+    with span("allowlist"):
+        valid_docs = []
+        valid_sources = []
+        for d in docs:
+            md = d.metadata or {}
+            nu = md.get("norm_url") or _normalize_url(md.get("url") or md.get("source") or "")
+            if nu and nu in norm_pages:
+                valid_docs.append(d)
+                valid_sources.append(norm_pages[nu])
+        valid_sources = _dedupe_keep_order(valid_sources)[:5]
 
     if not valid_docs:
         ms = int((time.perf_counter()-t0)*1000)
-        print(f"[KnowledgeAgent] no_valid_hits time={ms}ms", flush=True)
-        log.info({
-            "agent":"KnowledgeAgent",
-            "conversation_id":conversation_id,
-            "user_id":user_id,
-            "execution_time":ms,
-            "sources":[],
-            "decision":"no_valid_hits"
-        })
+        annotate(decision="no_valid_hits", sources=[], retrieval=mode, retrieved=len(docs))
         msg_out = ("Não encontrei informações suficientes na Central de Ajuda para essa pergunta. "
                    "Tente ser mais específico (ex.: 'taxas do link de pagamento').")
-        return (msg_out, f"Sources: [] | time={ms}ms")
+        return Retrieval(t0, [], [], mode, (msg_out, f"Sources: [] | time={ms}ms", "no_valid_hits"))
 
-    ans = _extractive_answer(valid_docs, max_chars=int(os.getenv("MAX_SNIPPET_CHARS","900") or "900"))
-    ms = int((time.perf_counter()-t0)*1000)
-    print(f"[KnowledgeAgent] ok sources={valid_sources} time={ms}ms", flush=True)
+    return Retrieval(t0, valid_docs, valid_sources, mode)
 
-    log.info({
-        "agent":"KnowledgeAgent",
-        "conversation_id":conversation_id,
-        "user_id":user_id,
-        "execution_time":ms,
-        "sources":valid_sources,
-        "decision":"vector_rag_validated"
-    })
+def _compose(r: Retrieval, user_id: str, conversation_id: str, log) -> Tuple[str, str, str]:
+    """Etapa de montagem: resposta extrativa a partir dos documentos validados."""
+    t0, valid_docs, valid_sources, mode = r.t0, r.docs, r.sources, r.mode
+    with span("assemble"):
+        ans = _extractive_answer(valid_docs, max_chars=int(os.getenv("MAX_SNIPPET_CHARS","900") or "900"))
+    ms = int((time.perf_counter()-t0)*1000)
+    annotate(decision="vector_rag_validated", sources=valid_sources, retrieval=mode, retrieved=len(valid_docs))
 
     fontes = "\\n".join(f"- {u}" for u in valid_sources) if valid_sources else "- (sem fonte detectada)"
     response = f"{ans}\n\nFontes:\n{fontes}"
-    details = f"Docs={len(valid_docs)} | Sources: {valid_sources} | time={ms}ms"
+    details = f"Docs={len(valid_docs)} | Sources: {valid_sources} | retrieval={mode} | time={ms}ms"
+    return response, details, "vector_rag_validated"
+
+async def aknowledge_answer(message: Union[str, Analysis], user_id: str, conversation_id: str, log):
+    """
+    Versão async de knowledge_answer: consulta o answer_cache (exato, depois
+    semântico) e só então roda a recuperação no knowledge_pool.
+    Levanta PoolSaturated se o pool e a fila estiverem cheios.
+    """
+    response, details, _ = await aknowledge_solve(message, user_id, conversation_id, log)
     return response, details
+
+class _Turn(NamedTuple):
+    """Estado de uma pergunta entre as etapas de cache/contexto e a de busca."""
+    version: str
+    norm: str
+    use_cache: bool
+    use_context: bool
+    ctx: Optional[context.Context] = None
+    followup: bool = False
+    vec: Optional[list] = None
+    candidates: Optional[List[str]] = None
+    # Resposta do answer_cache: (response, details, decision, sources).
+    hit: Optional[Tuple[str, str, str, Tuple[str, ...]]] = None
+
+    @property
+    def keep(self) -> int:
+        return context.max_ids() if self.use_context else 0
+
+async def _lookup(a: Analysis, conversation_id: str) -> _Turn:
+    """
+    Etapas antes da busca, comuns a aknowledge_solve e knowledge_stream:
+    contexto da conversa (follow-up), answer_cache exato, embedding no
+    knowledge_pool e answer_cache semântico.
+    """
+    use_context = context.enabled() and not a.suspicious
+    use_cache = cache.enabled() and not a.suspicious
+    turn = _Turn(store.index_version(), " ".join(_tokenize(a.text)), use_cache, use_context)
+    if not (use_cache or use_context):
+        # Sem caches o embedding é calculado na própria busca, numa ida só ao pool.
+        return turn
+    ctx = None
+    if use_context:
+        with span("cache"):
+            ctx = await context_cache.get(conversation_id)
+    # A resposta de um follow-up depende da conversa: não sai do answer_cache nem entra nele.
+    followup = context.is_followup(a, ctx, turn.version)
+    turn = turn._replace(ctx=ctx, followup=followup)
+    # Só respostas validadas entram no cache.
+    if use_cache and not followup:
+        with span("cache"):
+            hit = await answer_cache.get_exact(turn.norm, turn.version)
+        if hit:
+            return await _cached(turn, hit, "exact", conversation_id)
+
+    vec = await knowledge_pool.run(_query_vector, a.text, followup)
+    if vec is None:
+        return turn
+    if followup:
+        blended = context.followup_vector(vec, ctx, context.is_marked(a))
+        if blended is None:
+            turn = turn._replace(followup=False)
+        else:
+            return turn._replace(vec=blended.tolist(), candidates=ctx.chunk_ids)
+    turn = turn._replace(vec=vec)
+    if use_cache:
+        with span("cache"):
+            hit = await answer_cache.get_semantic(vec, turn.version)
+        if hit:
+            return await _cached(turn, hit, "semantic", conversation_id)
+    return turn
+
+async def _cached(turn: _Turn, hit: cache.Hit, tier: str, conversation_id: str) -> _Turn:
+    annotate(decision="vector_rag_validated", cache=tier)
+    if turn.use_context:
+        # Sem chunks: a próxima pergunta curta não vira follow-up de um assunto antigo.
+        await context_cache.put(conversation_id, "KnowledgeAgent", chunk_ids=[], version=turn.version)
+    return turn._replace(hit=(hit[0], f"{hit[1]} | cache={tier}", "vector_rag_validated", tuple(hit.sources)))
+
+async def _remember(turn: _Turn, conversation_id: str, r: Retrieval, response: str, details: str,
+                    decision: str) -> None:
+    """Depois da busca: métrica do follow-up, answer_cache e contexto da conversa."""
+    if turn.followup:
+        FOLLOWUPS.inc(result="context" if r.mode == "context" else "search")
+        annotate(followup=r.mode)
+    if decision != "vector_rag_validated":
+        return
+    if turn.use_cache and not turn.followup:
+        await answer_cache.put(turn.norm, turn.vec, response, details, turn.version, r.sources)
+    if turn.use_context:
+        with span("cache"):
+            await context_cache.put(conversation_id, "KnowledgeAgent", turn.vec, r.candidates, turn.version,
+                                    turn.ctx if turn.followup else None)
+
+async def aknowledge_solve(message: Union[str, Analysis], user_id: str, conversation_id: str,
+                           log) -> Tuple[str, str, str]:
+    """
+    Como aknowledge_answer, mas também retorna a decisão. Com CONTEXT_CACHE,
+    um follow-up da conversa ("e para CPF?") busca com o embedding combinado
+    ao da pergunta anterior e re-ranqueia os chunks dela antes de ir ao índice.
+    """
+    a = ensure(message)
+    turn = await _lookup(a, conversation_id)
+    if turn.hit:
+        return turn.hit[:3]
+    (response, details, decision), r = await knowledge_pool.run(
+        _answer_in_context, a, user_id, conversation_id, log, turn.vec, turn.candidates, turn.keep
+    )
+    await _remember(turn, conversation_id, r, response, details, decision)
+    return response, details, decision
+
+def _retrieve_many(analyses: List[Analysis], vectors: List[Optional[list]],
+                   keep: int = 0) -> List[Union[Tuple[Tuple[str, str, str], Retrieval], Exception]]:
+    """
+    Busca + montagem de um lote: um forward para os embeddings que faltam e
+    uma busca vetorial; (resultado, Retrieval) por item, como _answer_in_context.
+    """
+    t0 = time.perf_counter()
+    k = _rag_k()
+    out: List[Any] = [None] * len(analyses)
+    todo: List[Tuple[int, Mapping[str, str]]] = []
+    for i, a in enumerate(analyses):
+        early, norm_pages = _precheck(a, t0)
+        if early is not None:
+            out[i] = (early.early, early)
+        else:
+            todo.append((i, norm_pages))
+    if todo:
+        hits = store.hybrid_search_many([analyses[i].text.strip() for i, _ in todo], k=max(k, keep),
+                                        vectors=[vectors[i] for i, _ in todo])
+        for (i, norm_pages), (docs, mode) in zip(todo, hits):
+            try:
+                r = _validate(t0, docs[:k], mode, norm_pages)
+                if keep:
+                    r = r._replace(candidates=tuple(d.id for d in docs if d.id))
+                out[i] = (r.early or _compose(r, "", "", None), r)
+            except Exception as e:
+                out[i] = e
+    return out
+
+async def aknowledge_solve_many(analyses: List[Analysis],
+                                conversation_ids: List[str]) -> List[Union[Tuple[str, str, str], Exception]]:
+    """
+    aknowledge_solve para um grupo do /chat/batch: contexto e caches em
+    paralelo, um forward para todas as consultas que precisam de embedding e
+    uma única ida ao knowledge_pool para busca e montagem. Follow-ups de uma
+    conversa vão item a item pelo aknowledge_solve. Erro de um item volta no
+    lugar dele; PoolSaturated derruba o grupo inteiro.
+    """
+    version = store.index_version()
+    turns = [_Turn(version, " ".join(_tokenize(a.text)), cache.enabled() and not a.suspicious,
+                   context.enabled() and not a.suspicious) for a in analyses]
+    with_context = [i for i, t in enumerate(turns) if t.use_context]
+    if with_context:
+        with span("cache"):
+            ctxs = await asyncio.gather(*(context_cache.get(conversation_ids[i]) for i in with_context))
+        for i, ctx in zip(with_context, ctxs):
+            turns[i] = turns[i]._replace(ctx=ctx, followup=context.is_followup(analyses[i], ctx, version))
+    followups = [i for i, t in enumerate(turns) if t.followup]
+    rest = [i for i, t in enumerate(turns) if not t.followup]
+    # A resposta de um follow-up depende da conversa (embedding combinado, re-rank
+    # dos chunks dela): segue o caminho do /chat e não passa pelo answer_cache.
+    solo, grouped = await asyncio.gather(
+        asyncio.gather(*(aknowledge_solve(analyses[i], "", conversation_ids[i], None) for i in followups),
+                       return_exceptions=True),
+        _solve_group([analyses[i] for i in rest], [conversation_ids[i] for i in rest], [turns[i] for i in rest]),
+    )
+    out: List[Any] = [None] * len(analyses)
+    for i, r in zip(followups + rest, list(solo) + grouped):
+        out[i] = r
+    return out
+
+async def _solve_group(analyses: List[Analysis], conversation_ids: List[str],
+                       turns: List[_Turn]) -> List[Union[Tuple[str, str, str], Exception]]:
+    """Itens do lote que não são follow-up: as etapas de _lookup e _remember, cada uma de uma vez para o grupo."""
+    out: List[Any] = [None] * len(analyses)
+
+    async def cached(i: int, hit: cache.Hit, tier: str) -> None:
+        out[i] = (await _cached(turns[i], hit, tier, conversation_ids[i])).hit[:3]
+
+    safe = [i for i, t in enumerate(turns) if t.use_cache]
+    if safe:
+        with span("cache"):
+            hits = await asyncio.gather(*(answer_cache.get_exact(turns[i].norm, turns[i].version) for i in safe))
+        await asyncio.gather(*(cached(i, hit, "exact") for i, hit in zip(safe, hits) if hit))
+    miss = [i for i, t in enumerate(turns) if out[i] is None and (t.use_cache or t.use_context)]
+    vecs = await knowledge_pool.run(_query_vectors, [analyses[i].text for i in miss]) if miss else []
+    for i, vec in zip(miss, vecs):
+        turns[i] = turns[i]._replace(vec=vec)
+    need = [i for i in miss if turns[i].use_cache and turns[i].vec is not None]
+    if need:
+        with span("cache"):
+            hits = await asyncio.gather(*(answer_cache.get_semantic(turns[i].vec, turns[i].version) for i in need))
+        await asyncio.gather(*(cached(i, hit, "semantic") for i, hit in zip(need, hits) if hit))
+
+    pending = [i for i in range(len(analyses)) if out[i] is None]
+    if not pending:
+        return out
+    keep = max(t.keep for t in turns)
+    results = await knowledge_pool.run(_retrieve_many, [analyses[i] for i in pending],
+                                       [turns[i].vec for i in pending], keep)
+    done = []
+    for i, res in zip(pending, results):
+        if isinstance(res, BaseException):
+            out[i] = res
+        else:
+            out[i], r = res
+            done.append(_remember(turns[i], conversation_ids[i], r, *out[i]))
+    await asyncio.gather(*done)
+    return out
+
+_TOKEN = re.compile(r"\S+\s*")
+
+def split_tokens(text: str) -> List[str]:
+    return _TOKEN.findall(text) or [text]
+
+async def knowledge_stream(message: Union[str, Analysis], user_id: str, conversation_id: str,
+                           log) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Versão em etapas de aknowledge_solve para o /chat/stream, com os mesmos
+    caches e follow-ups. Gera eventos ("sources", ...), vários ("token", ...)
+    e por fim ("result", ...).
+    Levanta PoolSaturated se o pool e a fila estiverem cheios.
+    """
+    a = ensure(message)
+    turn = await _lookup(a, conversation_id)
+    if turn.hit:
+        response, details, decision, sources = turn.hit
+        yield "sources", {"sources": list(sources), "retrieval": "cache"}
+        for tok in split_tokens(response):
+            yield "token", {"text": tok}
+        yield "result", {"response": response, "details": details, "decision": decision}
+        return
+
+    r = await knowledge_pool.run(_retrieve, a, user_id, conversation_id, log, turn.vec, turn.candidates, turn.keep)
+    yield "sources", {"sources": r.sources, "retrieval": r.mode}
+    response, details, decision = r.early or _compose(r, user_id, conversation_id, log)
+    for tok in split_tokens(response):
+        yield "token", {"text": tok}
+    await _remember(turn, conversation_id, r, response, details, decision)
+    yield "result", {"response": response, "details": details, "decision": decision}
+
+def score(a: Analysis) -> float:
+    """Palavra de domínio: KnowledgeAgent; conta pura quase nunca; o resto cai aqui por padrão."""
+    if a.is_domain:
+        return 0.9
+    return 0.2 if a.is_mathy else 0.5
+
+def confident(a: Analysis, result) -> bool:
+    return result[2] == "vector_rag_validated"
+
+registry.register(registry.Agent("KnowledgeAgent", score, aknowledge_solve, confident,
+                                 "KNOWLEDGE_AGENT_TIMEOUT_S", 10.0, aknowledge_solve_many, knowledge_stream))
@@ -1,21 +1,122 @@
-import re, time
-from sympy.parsing.sympy_parser import parse_expr, standard_transformations, implicit_multiplication_application
+import asyncio, math, os, re, time
+from fractions import Fraction
+from typing import List, Tuple, Union
+from ..core.analysis import Analysis
+from ..core.logging import annotate
+from ..core.timing import span
+from ..core.workers import ProcessPool
+from . import arith, registry
+from . import math_cache as cache
+from .math_cache import math_cache
 
 SAFE = re.compile(r"[^0-9\+\-\*\/\^\(\)\.\sx]")
 
+def _sympy_import() -> None:
+    # Inicializador dos processos do sympy_pool: o import sai do caminho da primeira conta.
+    import sympy.parsing.sympy_parser  # noqa: F401
+
+# sympy fora do processo: expressão hostil que estoura MATH_SYMPY_TIMEOUT_S tem o processo morto,
+# em vez de prender uma thread do executor padrão até terminar.
+sympy_pool = ProcessPool("sympy", int(os.getenv("MATH_SYMPY_WORKERS", "1") or "1"),
+                         int(os.getenv("MATH_SYMPY_QUEUE", "4") or "4"), _sympy_import)
+
+def _sympy_eval(expr: str) -> float:
+    # Importado só aqui: o sympy pesa no startup e raramente é necessário.
+    from sympy.parsing.sympy_parser import (
+        parse_expr, standard_transformations, implicit_multiplication_application, convert_xor,
+    )
+    transformations = standard_transformations + (implicit_multiplication_application, convert_xor)
+    # evaluate=False + evalf: potências enormes viram float, sem calcular o inteiro exato.
+    val = float(parse_expr(expr, transformations=transformations, evaluate=False).evalf(15))
+    if not math.isfinite(val):
+        raise arith.LimitExceeded("resultado grande demais")
+    return val
+
+def _fast(shape, raws) -> Tuple[str, str]:
+    """Caminho rápido: AST do template (cacheada) + substituição dos números."""
+    node = math_cache.template(shape) if cache.enabled() else arith.parse(shape)
+    val = arith.evaluate(node, tuple(Fraction(r) for r in raws))
+    # Dízima que não termina: o texto é arredondado, a fração exata vai nos detalhes.
+    exact = "" if arith.decimal_scale(val) is not None else f" | exact={val}"
+    return arith.to_text(val), f"engine=fast{exact}"
+
 async def math_answer(message: str):
+    text, details, _ = await math_solve(message)
+    return text, details
+
+def _engine(info: str) -> str:
+    return "evaluated_sympy" if info.startswith("engine=sympy") else "evaluated_fast"
+
+async def math_solve(message: str) -> Tuple[str, str, str]:
+    """Como math_answer, mas também retorna a decisão (evaluated_fast, evaluated_sympy, ..., failed)."""
+    result = await _solve(message)
+    annotate(decision=result[2])
+    return result
+
+async def _solve(message: str) -> Tuple[str, str, str]:
     t0 = time.perf_counter()
     expr = SAFE.sub("", message)
+    ms = lambda: int((time.perf_counter()-t0)*1000)
+    try:
+        shape, raws = arith.lex(expr)
+        key = cache.key(shape, raws)
+    except arith.Unsupported:
+        shape, raws, key = None, (), " ".join(expr.split())
+    except arith.MathError as e:
+        return (f"Não consegui calcular: {e}.", f"MathAgent failed in {ms()}ms", "rejected")
+
+    use_cache = cache.enabled() and bool(key)
+    hit = await math_cache.get(key) if use_cache else None
+    if hit:
+        (text, info), tier = hit
+        return (text, f"MathAgent evaluated in {ms()}ms | {info} | cache={tier}", _engine(info))
+
     try:
-        ast = parse_expr(expr, transformations=(standard_transformations + (implicit_multiplication_application,)))
-        val = float(ast.evalf())
-        print(f"[MathAgent] expr='{expr}' -> {val}", flush=True)
-        return (str(val), f"MathAgent evaluated in {int((time.perf_counter()-t0)*1000)}ms")
-    except Exception:
-        m = re.search(r"(\d+(?:\.\d+)?)\s*[x\*]\s*(\d+(?:\.\d+)?)", message, re.I)
-        if m:
-            v = float(m.group(1)) * float(m.group(2))
-            print(f"[MathAgent] fallback '{message}' -> {v}", flush=True)
-            return (str(v), f"MathAgent evaluated in {int((time.perf_counter()-t0)*1000)}ms")
-        print(f"[MathAgent] fail '{message}'", flush=True)
-        return ("Não consegui interpretar a expressão.", f"MathAgent failed in {int((time.perf_counter()-t0)*1000)}ms")
+        if shape is None:
+            raise arith.Unsupported(expr)
+        text, info = _fast(shape, raws)
+    except arith.Unsupported:
+        try:
+            timeout = float(os.getenv("MATH_SYMPY_TIMEOUT_S", "3") or "3")
+            val = await sympy_pool.run(timeout, _sympy_eval, expr)
+            text, info = str(val), "engine=sympy"
+        except Exception:
+            m = re.search(r"(\d+(?:\.\d+)?)\s*[x\*]\s*(\d+(?:\.\d+)?)", message, re.I)
+            if m:
+                v = float(m.group(1)) * float(m.group(2))
+                return (str(v), f"MathAgent evaluated in {ms()}ms", "evaluated_regex")
+            return ("Não consegui interpretar a expressão.", f"MathAgent failed in {ms()}ms", "failed")
+    except arith.MathError as e:
+        return (f"Não consegui calcular: {e}.", f"MathAgent failed in {ms()}ms", "rejected")
+
+    if use_cache:
+        await math_cache.put(key, (text, info))
+    return (text, f"MathAgent evaluated in {ms()}ms | {info}", _engine(info))
+
+def score(a: Analysis) -> float:
+    """Expressão pura ou "a x b" sem palavra de domínio: MathAgent; com domínio, só especulativo."""
+    if a.is_domain:
+        return 0.5 if a.has_product else (0.3 if a.has_number else 0.0)
+    if a.math_only:
+        return 1.0
+    if a.has_product:
+        return 0.9
+    return 0.1 if a.has_number else 0.0
+
+def confident(a: Analysis, result) -> bool:
+    # sympy aceita qualquer sopa de números ("3 1200" vira 3600): só confia nele se a mensagem é só conta.
+    return result[2] == "evaluated_fast" or (result[2] == "evaluated_sympy" and a.math_only)
+
+async def _run(a: Analysis, user_id: str, conversation_id: str, log):
+    with span("math"):
+        return await math_solve(a.text)
+
+async def _run_many(analyses: List[Analysis], conversation_ids: List[str]) -> List[Union[Tuple[str, str, str], Exception]]:
+    """Grupo do /chat/batch: cada expressão distinta é avaliada uma vez, todas em paralelo."""
+    with span("math"):
+        texts = list(dict.fromkeys(a.text for a in analyses))
+        results = await asyncio.gather(*(math_solve(t) for t in texts), return_exceptions=True)
+    by_text = dict(zip(texts, results))
+    return [by_text[a.text] for a in analyses]
+
+registry.register(registry.Agent("MathAgent", score, _run, confident, "MATH_AGENT_TIMEOUT_S", 2.0, _run_many))
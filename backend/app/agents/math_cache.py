@@ -0,0 +1,122 @@
+import os, json, threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from ..core.metrics import counter
+from ..core.redis import redis_client
+from . import arith
+
+REQUESTS = counter("math_cache_requests_total", "Consultas ao cache do MathAgent.", ("tier", "result"))
+ERRORS = counter("math_cache_errors_total", "Falhas de Redis no cache do MathAgent (fail-open).")
+EVICTIONS = counter("math_cache_evictions_total", "Entradas removidas do cache local do MathAgent.", ("tier",))
+
+def enabled() -> bool:
+    return (os.getenv("MATH_CACHE", "1") or "1") not in ("0", "false", "no")
+
+def redis_enabled() -> bool:
+    return (os.getenv("MATH_CACHE_REDIS", "0") or "0") not in ("0", "false", "no")
+
+def _max_entries() -> int:
+    return int(os.getenv("MATH_CACHE_MAX", "4096") or "4096")
+
+def _max_templates() -> int:
+    return int(os.getenv("MATH_TEMPLATE_MAX", "512") or "512")
+
+def _ttl() -> int:
+    return int(os.getenv("MATH_CACHE_TTL_S", "86400") or "86400")
+
+def key(shape: Tuple[str, ...], raws: Tuple[str, ...]) -> str:
+    """Forma canônica: tokens colados, sem espaços, com x→* e **→^."""
+    nums = iter(raws)
+    return "".join(next(nums) if t == "#" else t for t in shape)
+
+class LRU:
+    """LRU em memória com tamanho máximo; conta hits/misses em math_cache_requests_total."""
+
+    def __init__(self, tier: str, maxsize: int):
+        self.tier = tier
+        self.maxsize = max(1, maxsize)
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, k: Hashable) -> Optional[Any]:
+        with self._lock:
+            v = self._data.get(k)
+            if v is not None:
+                self._data.move_to_end(k)
+        REQUESTS.inc(tier=self.tier, result="hit" if v is not None else "miss")
+        return v
+
+    def put(self, k: Hashable, v: Any) -> None:
+        with self._lock:
+            self._data[k] = v
+            self._data.move_to_end(k)
+            evicted = 0
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                evicted += 1
+        if evicted:
+            EVICTIONS.inc(evicted, tier=self.tier)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class MathCache:
+    """
+    Cache do MathAgent em duas partes:
+
+    - resultados: expressão canônica (`key`) → (texto, detalhes do motor),
+      num LRU local e, com MATH_CACHE_REDIS=1, também no Redis, compartilhado
+      entre réplicas;
+    - templates: forma da expressão → AST já parseada, então "1000 * 0.0349" e
+      "250 x 0.05" só diferem na substituição dos números.
+
+    Erros de Redis viram miss.
+    """
+
+    def __init__(self, client=None, prefix: str = "math", max_entries: Optional[int] = None,
+                 max_templates: Optional[int] = None):
+        self.client = client or redis_client
+        self.prefix = prefix
+        self.results = LRU("local", max_entries or _max_entries())
+        self.templates = LRU("template", max_templates or _max_templates())
+
+    def template(self, shape: Tuple[str, ...]):
+        node = self.templates.get(shape)
+        if node is None:
+            node = arith.parse(shape)
+            self.templates.put(shape, node)
+        return node
+
+    async def get(self, k: str) -> Optional[Tuple[Tuple[str, str], str]]:
+        """((texto, detalhes), camada) ou None."""
+        hit = self.results.get(k)
+        if hit is not None:
+            return hit, "local"
+        if not redis_enabled():
+            return None
+        try:
+            raw = await self.client.get(f"{self.prefix}:{k}")
+        except Exception:
+            ERRORS.inc()
+            return None
+        REQUESTS.inc(tier="redis", result="hit" if raw else "miss")
+        if not raw:
+            return None
+        text, info = json.loads(raw)
+        self.results.put(k, (text, info))
+        return (text, info), "redis"
+
+    async def put(self, k: str, value: Tuple[str, str]) -> None:
+        self.results.put(k, value)
+        if not redis_enabled():
+            return
+        try:
+            await self.client.set(f"{self.prefix}:{k}", json.dumps(list(value), ensure_ascii=False), ex=_ttl())
+        except Exception:
+            ERRORS.inc()
+
+    def stats(self) -> dict:
+        return {"entries": len(self.results), "templates": len(self.templates)}
+
+math_cache = MathCache()
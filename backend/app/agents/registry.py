@@ -0,0 +1,251 @@
+import asyncio, os, time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..core.analysis import Analysis
+from ..core.metrics import counter, histogram
+from ..core.timing import span
+
+OUTCOMES = counter("agent_dispatch_total", "Resultado de cada agente despachado pelo router.",
+                   ("agent", "outcome"))
+AGENT_SECONDS = histogram("agent_seconds", "Tempo de resposta de cada agente, por decisão do agente.",
+                          ("agent", "decision"))
+
+# (resposta, detalhes, decisão do agente)
+Result = Tuple[str, str, str]
+
+@dataclass(frozen=True)
+class Agent:
+    """
+    Agente plugável. `score` é barato (só olha a Analysis) e diz de 0 a 1 o
+    quanto o agente é adequado; `confident` diz se a resposta que ele deu pode
+    encerrar a disputa.
+    """
+    name: str
+    score: Callable[[Analysis], float]
+    run: Callable[[Analysis, str, str, Any], Awaitable[Result]]
+    confident: Callable[[Analysis, Result], bool]
+    timeout_env: str
+    default_timeout_s: float = 10.0
+    # Lote do /chat/batch: recebe as Analysis do grupo e os conversation_id
+    # delas e devolve um Result (ou a exceção) por item, na mesma ordem. Sem
+    # ele, `run` item a item.
+    run_many: Optional[Callable[[List[Analysis], List[str]], Awaitable[List[Any]]]] = None
+    # /chat/stream: mesmos argumentos de `run`, gera ("sources", ...), ("token", ...)
+    # e por fim ("result", {"response", "details", "decision"}). Sem ele, `run` e
+    # a resposta inteira vira tokens no fim.
+    stream: Optional[Callable[[Analysis, str, str, Any], AsyncIterator[Tuple[str, Dict[str, Any]]]]] = None
+
+    def timeout_s(self) -> float:
+        raw = os.getenv(self.timeout_env, "") or str(self.default_timeout_s)
+        return float(raw)
+
+_AGENTS: Dict[str, Agent] = {}
+
+def register(agent: Agent) -> Agent:
+    _AGENTS[agent.name] = agent
+    return agent
+
+def get(name: str) -> Agent:
+    return _AGENTS[name]
+
+def ranked(a: Analysis) -> List[Tuple[Agent, float]]:
+    """Agentes registrados pela nota, maior primeiro; empate mantém a ordem de registro."""
+    scored = [(agent, agent.score(a)) for agent in _AGENTS.values()]
+    return sorted(scored, key=lambda p: -p[1])
+
+def _speculate() -> bool:
+    return (os.getenv("ROUTER_SPECULATE", "1") or "1") not in ("0", "false", "no")
+
+def _min_score() -> float:
+    return float(os.getenv("ROUTER_SPECULATE_MIN", "0.3") or "0.3")
+
+def _max_agents() -> int:
+    return int(os.getenv("ROUTER_SPECULATE_TOP", "2") or "2")
+
+def _deadline_s() -> float:
+    return float(os.getenv("ROUTER_DEADLINE_S", "15") or "15")
+
+def candidates(a: Analysis) -> List[Tuple[Agent, float]]:
+    """O melhor agente e, com especulação ligada, os próximos com nota >= ROUTER_SPECULATE_MIN."""
+    order = ranked(a)
+    if not order:
+        raise LookupError("nenhum agente registrado")
+    if not _speculate():
+        return order[:1]
+    return order[:1] + [p for p in order[1:_max_agents()] if p[1] >= _min_score()]
+
+def _trace(agent: Agent, score: float, outcome: str, elapsed: float,
+           decision: Optional[str] = None) -> Dict[str, Any]:
+    OUTCOMES.inc(agent=agent.name, outcome=outcome)
+    if decision is not None:
+        AGENT_SECONDS.observe(elapsed, agent=agent.name, decision=decision)
+    return {"agent": agent.name, "decision": decision, "outcome": outcome,
+            "score": round(score, 2), "elapsed_ms": int(elapsed * 1000)}
+
+async def dispatch(a: Analysis, user_id: str, conversation_id: str, log,
+                   cands: Optional[List[Tuple[Agent, float]]] = None) -> Tuple[Agent, Result, List[Dict[str, Any]]]:
+    """
+    Roda os candidatos em paralelo sob um deadline comum (ROUTER_DEADLINE_S) e
+    o timeout de cada agente. Vence a primeira resposta confiante na ordem de
+    nota: a de um candidato de nota menor fica guardada e só vence quando todos
+    os de nota maior terminaram sem confiança. Com o vencedor decidido, o resto
+    é cancelado. Sem resposta confiante, fica a do melhor candidato (ou o
+    erro dele, ex.: PoolSaturated).
+
+    Retorna (agente vencedor, resultado, traces); o trace do vencedor é o último.
+    """
+    if cands is None:
+        with span("route"):
+            cands = candidates(a)
+    t0 = time.perf_counter()
+    deadline = t0 + _deadline_s()
+
+    async def attempt(agent: Agent) -> Result:
+        budget = max(0.0, min(agent.timeout_s(), deadline - time.perf_counter()))
+        return await asyncio.wait_for(agent.run(a, user_id, conversation_id, log), budget)
+
+    if len(cands) == 1:
+        agent, score = cands[0]
+        try:
+            result = await attempt(agent)
+        except Exception as e:
+            outcome = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+            _trace(agent, score, outcome, time.perf_counter() - t0)
+            raise
+        return agent, result, [_trace(agent, score, "winner", time.perf_counter() - t0, result[2])]
+
+    tasks = {asyncio.ensure_future(attempt(agent)): i for i, (agent, _) in enumerate(cands)}
+    results: Dict[int, Result] = {}
+    errors: Dict[int, BaseException] = {}
+    elapsed: Dict[int, float] = {}
+    winner: Optional[int] = None
+    pending = set(tasks)
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                i = tasks[task]
+                elapsed[i] = time.perf_counter() - t0
+                try:
+                    results[i] = task.result()
+                except Exception as e:
+                    errors[i] = e
+            for i, (agent, _) in enumerate(cands):
+                if i in results and agent.confident(a, results[i]):
+                    winner = i
+                    break
+                if i not in elapsed:
+                    break
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if winner is None:
+        # Ninguém confiante: vale a resposta do melhor candidato, ou o erro dele.
+        if 0 in errors:
+            raise errors[0]
+        winner = 0
+
+    traces: List[Dict[str, Any]] = []
+    for i, (agent, score) in enumerate(cands):
+        if i == winner:
+            continue
+        if i in results:
+            traces.append(_trace(agent, score, "loser", elapsed[i], results[i][2]))
+        elif i in errors:
+            outcome = "timeout" if isinstance(errors[i], asyncio.TimeoutError) else "error"
+            traces.append(_trace(agent, score, outcome, elapsed[i]))
+        else:
+            traces.append(_trace(agent, score, "cancelled", time.perf_counter() - t0))
+    agent, score = cands[winner]
+    traces.append(_trace(agent, score, "winner", elapsed[winner], results[winner][2]))
+    return agent, results[winner], traces
+
+async def dispatch_stream(a: Analysis, user_id: str, conversation_id: str, log,
+                          cands: Optional[List[Tuple[Agent, float]]] = None) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    dispatch do /chat/stream. Com um candidato só e `stream` no agente,
+    repassa os eventos dele sob o mesmo timeout (cada evento espera no
+    máximo o que sobra do prazo); com especulação, ou agente sem stream,
+    despacha como o dispatch. Gera ("route", agente de maior nota) antes de
+    despachar, ("reroute", vencedor) se outro candidato venceu, os eventos
+    do agente e por fim ("result", (agente, resultado, traces)).
+    """
+    if cands is None:
+        with span("route"):
+            cands = candidates(a)
+    agent, score = cands[0]
+    yield "route", agent.name
+    if len(cands) > 1 or agent.stream is None:
+        winner, result, traces = await dispatch(a, user_id, conversation_id, log, cands)
+        if winner is not agent:
+            yield "reroute", winner.name
+        yield "result", (winner, result, traces)
+        return
+
+    t0 = time.perf_counter()
+    budget = min(agent.timeout_s(), _deadline_s())
+    events = agent.stream(a, user_id, conversation_id, log).__aiter__()
+    result: Optional[Result] = None
+    try:
+        while True:
+            remaining = max(0.0, budget - (time.perf_counter() - t0))
+            try:
+                event, data = await asyncio.wait_for(events.__anext__(), remaining)
+            except StopAsyncIteration:
+                break
+            if event == "result":
+                result = (data["response"], data["details"], data["decision"])
+            else:
+                yield event, data
+        if result is None:
+            raise RuntimeError(f"{agent.name}: stream sem resultado")
+    except Exception as e:
+        outcome = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+        _trace(agent, score, outcome, time.perf_counter() - t0)
+        raise
+    yield "result", (agent, result, [_trace(agent, score, "winner", time.perf_counter() - t0, result[2])])
+
+async def dispatch_many(analyses: List[Analysis], conversation_ids: List[str],
+                        chosen: Optional[List[Tuple[Agent, float]]] = None) -> List[Any]:
+    """
+    Despacho do /chat/batch: sem especulação, cada item vai para o agente de
+    maior nota e os itens de um mesmo agente rodam juntos (`run_many`, ou
+    `run` item a item) sob ROUTER_DEADLINE_S. Retorna, na ordem, (agente,
+    resultado, traces) ou a exceção daquele item. `chosen` é o (agente, nota)
+    de cada item, se a rota já foi calculada.
+    """
+    if chosen is None:
+        with span("route"):
+            chosen = [ranked(a)[0] for a in analyses]
+    groups: Dict[str, List[int]] = {}
+    for i, (agent, _) in enumerate(chosen):
+        groups.setdefault(agent.name, []).append(i)
+    out: List[Any] = [None] * len(analyses)
+    t0 = time.perf_counter()
+
+    async def run_group(agent: Agent, idx: List[int]) -> None:
+        items = [analyses[i] for i in idx]
+        cids = [conversation_ids[i] for i in idx]
+        if agent.run_many is not None:
+            group = agent.run_many(items, cids)
+        else:
+            group = asyncio.gather(*(agent.run(a, "", cid, None) for a, cid in zip(items, cids)),
+                                   return_exceptions=True)
+        try:
+            results = await asyncio.wait_for(group, _deadline_s())
+        except Exception as e:
+            results = [e] * len(idx)
+        elapsed = time.perf_counter() - t0
+        for i, result in zip(idx, results):
+            score = chosen[i][1]
+            if isinstance(result, BaseException):
+                outcome = "timeout" if isinstance(result, asyncio.TimeoutError) else "error"
+                _trace(agent, score, outcome, elapsed)
+                out[i] = result
+            else:
+                out[i] = (agent, result, [_trace(agent, score, "winner", elapsed, result[2])])
+
+    await asyncio.gather(*(run_group(get(name), idx) for name, idx in groups.items()))
+    return out
@@ -1,28 +1,98 @@
-import re
-from typing import Dict, Any, Tuple, List
+import time
+from typing import Dict, Any, AsyncIterator, Optional, Tuple, List, Union
 from structlog.stdlib import BoundLogger
-from .knowledge import knowledge_answer
-from .math import math_answer
+from ..core.analysis import Analysis, ensure
+from ..core.metrics import histogram
+from ..core.timing import span
+from . import registry
+from .context_cache import context_cache
+from .knowledge import split_tokens
+from . import math  # noqa: F401 (registra o MathAgent)
 
-MATH_HINT = re.compile(r"^[\d\s\+\-\*\/\^\(\)\.x]+$", re.I)
-KNOWLEDGE_KEYWORDS = re.compile(r"\b(taxa|fee|maquininha|máquina|ajuda|faq|suporte|infinitepay|link de pagamento|infinitetap)\b", re.I)
+DECISION_SECONDS = histogram("router_decision_seconds",
+                             "Tempo do router_agent até a resposta do agente, por decisão.", ("decision",))
 
-async def route(message: str) -> str:
-    msg = message or ""
-    is_mathy = bool(MATH_HINT.match(msg)) or re.search(r"\d+\s*[x\*]\s*\d+", msg)
-    is_domain = bool(KNOWLEDGE_KEYWORDS.search(msg))
-    decision = "MathAgent" if (is_mathy and not is_domain) else "KnowledgeAgent"
-    print(f"[RouterAgent] decision={decision} msg='{msg[:80]}'", flush=True)
-    return decision
+Plan = List[Tuple[registry.Agent, float]]
 
-async def router_agent(message: str, user_id: str, conversation_id: str, log: BoundLogger) -> Tuple[str, str, List[Dict[str, Any]]]:
-    decision = await route(message)
-    workflow = [{"agent": "RouterAgent", "decision": decision}]
-    if decision == "MathAgent":
-        resp, details = await math_answer(message)
-        workflow.append({"agent": "MathAgent"})
-        return resp, details, workflow
-    else:
-        resp, details = knowledge_answer(message, user_id, conversation_id, log)
-        workflow.append({"agent": "KnowledgeAgent"})
-        return resp, details, workflow
+async def plan(message: Union[str, Analysis]) -> Plan:
+    """
+    Candidatos do registry para a mensagem; o primeiro é a rota. O /chat
+    calcula uma vez (o rate limit cobra do agente da rota) e repassa ao despacho.
+    """
+    a = ensure(message)
+    with span("route"):
+        return registry.candidates(a)
+
+async def route(message: Union[str, Analysis]) -> str:
+    return (await plan(message))[0][0].name
+
+async def router_agent(message: Union[str, Analysis], user_id: str, conversation_id: str,
+                       log: BoundLogger, cands: Optional[Plan] = None) -> Tuple[str, str, List[Dict[str, Any]]]:
+    """
+    Despacha pelo registry: o agente de maior nota e, em mensagens ambíguas,
+    os candidatos especulativos em paralelo. A decisão do RouterAgent é o
+    agente que respondeu; os demais entram no workflow com o seu outcome.
+    `cands` é o plan() já calculado na admissão.
+    """
+    t0 = time.perf_counter()
+    a = ensure(message)
+    agent, (resp, details, _), traces = await registry.dispatch(a, user_id, conversation_id, log, cands)
+    if agent.name != "KnowledgeAgent":
+        # O KnowledgeAgent grava o contexto completo (vetor e chunks); aqui fica só a rota.
+        await context_cache.put(conversation_id, agent.name)
+    workflow = [{"agent": "RouterAgent", "decision": agent.name}] + traces
+    DECISION_SECONDS.observe(time.perf_counter() - t0, decision=agent.name)
+    return resp, details, workflow
+
+async def router_agent_batch(messages: List[Analysis], conversation_ids: List[str],
+                             plans: Optional[List[Plan]] = None
+                             ) -> List[Union[Tuple[str, str, List[Dict[str, Any]]], Exception]]:
+    """
+    Como router_agent para vários itens (/chat/batch): agrupa pela decisão e
+    cada agente resolve o seu grupo de uma vez. Falha de um item volta como
+    exceção no lugar dele, sem afetar os outros.
+    """
+    t0 = time.perf_counter()
+    out: List[Any] = []
+    chosen = [p[0] for p in plans] if plans is not None else None
+    for item, cid in zip(await registry.dispatch_many(messages, conversation_ids, chosen), conversation_ids):
+        if isinstance(item, BaseException):
+            out.append(item)
+            continue
+        agent, (resp, details, _), traces = item
+        if agent.name != "KnowledgeAgent":
+            await context_cache.put(cid, agent.name)
+        out.append((resp, details, [{"agent": "RouterAgent", "decision": agent.name}] + traces))
+        DECISION_SECONDS.observe(time.perf_counter() - t0, decision=agent.name)
+    return out
+
+async def router_agent_stream(message: Union[str, Analysis], user_id: str, conversation_id: str,
+                              log: BoundLogger, cands: Optional[Plan] = None
+                              ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Como router_agent, mas em eventos: ("route", ...) com o agente de maior
+    nota, já antes do despacho, ("reroute", ...) se um especulativo venceu,
+    ("sources", ...) e ("token", ...) do agente, e ("done", ...) com a
+    resposta completa e o agent_workflow. O despacho é o do registry
+    (notas, especulação, timeouts e traces); agente que não faz stream tem
+    a resposta quebrada em tokens no fim.
+    """
+    t0 = time.perf_counter()
+    a = ensure(message)
+    streamed = False
+    async for event, data in registry.dispatch_stream(a, user_id, conversation_id, log, cands):
+        if event in ("route", "reroute"):
+            yield event, {"agent": "RouterAgent", "decision": data}
+        elif event == "result":
+            agent, (resp, details, _), traces = data
+        else:
+            streamed = streamed or event == "token"
+            yield event, data
+    if not streamed:
+        for tok in split_tokens(resp):
+            yield "token", {"text": tok}
+    if agent.name != "KnowledgeAgent":
+        await context_cache.put(conversation_id, agent.name)
+    workflow = [{"agent": "RouterAgent", "decision": agent.name}] + traces
+    DECISION_SECONDS.observe(time.perf_counter() - t0, decision=agent.name)
+    yield "done", {"response": resp, "source_agent_response": details, "agent_workflow": workflow}
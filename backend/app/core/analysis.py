@@ -0,0 +1,126 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Tuple, Union
+
+import bleach
+
+from .security import SUSPICIOUS
+
+# Marcadores que fazem o KnowledgeAgent recusar a mensagem (além do guard global).
+KNOWLEDGE_SUSPICIOUS = (
+    "ignore previous", "system prompt", "jailbreak", "do anything",
+    "por favor ignore", "resete as regras",
+)
+
+DOMAIN_KEYWORDS = (
+    "taxa", "fee", "maquininha", "máquina", "ajuda", "faq", "suporte",
+    "infinitepay", "link de pagamento", "infinitetap",
+)
+
+MATH_HINT = re.compile(r"[\d\s\+\-\*\/\^\(\)\.x]+", re.I)
+
+# Só estes caracteres fazem o bleach mudar o texto; sem eles a limpeza é identidade.
+_HTML = r"[<>&\r\x00]"
+
+def _markers() -> Dict[str, FrozenSet[str]]:
+    kinds: Dict[str, set] = {}
+    for m in SUSPICIOUS:
+        kinds.setdefault(m, set()).add("guard")
+    for m in KNOWLEDGE_SUSPICIOUS:
+        kinds.setdefault(m, set()).add("knowledge")
+    # A varredura só guarda o marcador mais longo de cada posição: ele herda os
+    # tipos dos marcadores que são prefixo dele ("ignore" dentro de "ignore previous").
+    return {m: frozenset().union(*(kinds[p] for p in kinds if m.startswith(p))) for m in kinds}
+
+_MARKERS = _markers()
+
+def _alt(words) -> str:
+    # Mais longos primeiro: a alternância do `re` para no primeiro que casar.
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+_MARKER = _alt(_MARKERS)
+_DOMAIN = rf"\b(?:{_alt(DOMAIN_KEYWORDS)})\b"
+
+# Um único autômato, uma passada: para em cada posição onde começa um marcador
+# (guard ou KnowledgeAgent), uma palavra de domínio, um dígito ou HTML, e ali
+# testa cada tipo num lookahead próprio. Nada é consumido, então um achado
+# nunca esconde outro que se sobrepõe a ele, como o `in` do looks_malicious.
+_SCAN = re.compile(
+    rf"(?={_MARKER}|{_DOMAIN}|\d|{_HTML})"
+    rf"(?:(?=(?P<marker>{_MARKER}))|)"
+    rf"(?:(?=(?P<domain>{_DOMAIN}))|)"
+    r"(?:(?=(?P<product>\d+\s*[x\*]\s*\d+))|)"
+    r"(?:(?=(?P<number>\d))|)"
+    rf"(?:(?=(?P<html>{_HTML}))|)"
+)
+
+def _scan(lower: str):
+    """(domínio, marcadores, has_product, has_number, has_html) de uma passada no texto."""
+    domain, markers, has_product, has_number, has_html = [], [], False, False, False
+    for m in _SCAN.finditer(lower):
+        marker, word, product, number, html = m.group("marker", "domain", "product", "number", "html")
+        if marker:
+            markers.append(marker)
+        if word:
+            domain.append(word)
+        has_product = has_product or bool(product)
+        has_number = has_number or bool(number)
+        has_html = has_html or bool(html)
+    return domain, markers, has_product, has_number, has_html
+
+@dataclass(frozen=True)
+class Analysis:
+    """
+    Resultado da análise da mensagem, feita uma vez na entrada do /chat e
+    repassada ao router e aos agentes para ninguém varrer o texto de novo.
+    """
+    raw: str
+    text: str
+    lower: str
+    math_only: bool
+    has_product: bool
+    has_number: bool
+    domain: Tuple[str, ...]
+    markers: Tuple[str, ...]
+
+    @property
+    def is_mathy(self) -> bool:
+        return self.math_only or self.has_product
+
+    @property
+    def is_domain(self) -> bool:
+        return bool(self.domain)
+
+    @property
+    def blocked(self) -> bool:
+        """Casa com core.security.SUSPICIOUS: o /chat recusa na entrada."""
+        return any("guard" in _MARKERS[m] for m in self.markers)
+
+    @property
+    def suspicious(self) -> bool:
+        """Casa com KNOWLEDGE_SUSPICIOUS: o KnowledgeAgent recusa e não usa cache."""
+        return any("knowledge" in _MARKERS[m] for m in self.markers)
+
+def analyze(message: str) -> Analysis:
+    raw = message or ""
+    text, lower = raw, raw.lower()
+    domain, markers, has_product, has_number, has_html = _scan(lower)
+    if has_html:
+        # Raro: só com <, >, & ... o bleach muda o texto, e aí a varredura é refeita no texto limpo.
+        text = bleach.clean(raw, tags=[], attributes={}, strip=True)
+        lower = text.lower()
+        domain, markers, has_product, has_number, _ = _scan(lower)
+    return Analysis(
+        raw=raw,
+        text=text,
+        lower=lower,
+        # Âncora no início: em texto comum falha no primeiro caractere, não é outra varredura.
+        math_only=bool(MATH_HINT.fullmatch(text)),
+        has_product=has_product,
+        has_number=has_number,
+        domain=tuple(dict.fromkeys(domain)),
+        markers=tuple(dict.fromkeys(markers)),
+    )
+
+def ensure(message: Union[str, Analysis]) -> Analysis:
+    return message if isinstance(message, Analysis) else analyze(message)
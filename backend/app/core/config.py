@@ -3,7 +3,39 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     APP_PORT: int = 8080
     REDIS_URL: str = "redis://redis:6379/0"
+    REDIS_MAX_CONNECTIONS: int = 50
+    WEB_CONCURRENCY: int = 1
+    PRELOAD_STORE: bool = True
+    WORKER_RESTART_MAX: int = 5
+    WORKER_RESTART_WINDOW_S: float = 60.0
+    WORKER_RESTART_BACKOFF_S: float = 0.5
     LOG_LEVEL: str = "info"
+    LOG_QUEUE_MAX: int = 10000
+    LOG_SAMPLE_INFO: float = 1.0
     CORS_ORIGINS: str = "*"
+    KNOWLEDGE_WORKERS: int = 4
+    KNOWLEDGE_QUEUE: int = 16
+    CHAT_BATCH_MAX: int = 256
+    LOG_BATCH_SIZE: int = 100
+    LOG_FLUSH_MS: int = 50
+    LOG_BUFFER_MAX: int = 10000
+    LOG_STREAM_MAXLEN: int = 1000
+    LOG_TTL_S: int = 7 * 24 * 3600
+    RATE_LIMIT: bool = True
+    # "tokens/s:capacidade" por agente e escopo; capacidade 0 desliga o escopo.
+    RATE_KNOWLEDGE_USER: str = "0.5:10"
+    RATE_KNOWLEDGE_IP: str = "2:30"
+    RATE_KNOWLEDGE_GLOBAL: str = "20:60"
+    RATE_MATH_USER: str = "5:30"
+    RATE_MATH_IP: str = "20:100"
+    RATE_MATH_GLOBAL: str = "500:1000"
+    # Mensagens barradas pelo guard de prompt injection (bucket do RouterAgent).
+    RATE_ROUTER_USER: str = "0.5:10"
+    RATE_ROUTER_IP: str = "2:30"
+    RATE_ROUTER_GLOBAL: str = "20:60"
+    RATE_TRUST_PROXY: bool = False
+    # Proxies confiáveis na frente do backend (o ingress é 1), contados do fim do X-Forwarded-For.
+    RATE_PROXY_HOPS: int = 1
+    RATE_FALLBACK_S: float = 5.0
 
 settings = Settings()
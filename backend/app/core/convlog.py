@@ -0,0 +1,145 @@
+import asyncio, json
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .config import settings
+from .metrics import counter
+from .redis import redis_client
+from .timing import detach, span
+
+WRITTEN = counter("chat_log_written_total", "Entradas de log de conversa gravadas no Redis.")
+DROPPED = counter("chat_log_dropped_total", "Entradas descartadas com o buffer cheio.")
+ERRORS = counter("chat_log_errors_total", "Lotes que falharam ao gravar no Redis.")
+
+def stream_key(conversation_id: str) -> str:
+    return f"chatlog:{conversation_id}"
+
+class ConversationLogWriter:
+    """
+    Grava o log das conversas no Redis fora do caminho da requisição.
+
+    `enqueue` só coloca a entrada num buffer em memória; uma task em background
+    junta até `batch_size` entradas e grava tudo num único pipeline
+    (XADD com MAXLEN ~ por conversa + EXPIRE). Se o Redis cair, o lote volta
+    para o buffer e é regravado depois; com o buffer cheio as entradas mais
+    antigas são descartadas (chat_log_dropped_total), nunca bloqueando o /chat.
+    """
+
+    def __init__(self, client=None, batch_size: int = 100, flush_ms: int = 50,
+                 max_buffer: int = 10000, maxlen: int = 1000, ttl_s: int = 7 * 24 * 3600):
+        self.client = client or redis_client
+        self.batch_size = max(1, batch_size)
+        self.flush_s = max(1, flush_ms) / 1000.0
+        self.max_buffer = max(1, max_buffer)
+        self.maxlen = maxlen
+        self.ttl_s = ttl_s
+        self._buf: Deque[Tuple[str, str]] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def enqueue(self, conversation_id: str, item: Dict[str, Any]) -> None:
+        if len(self._buf) >= self.max_buffer:
+            self._buf.popleft()
+            DROPPED.inc()
+        self._buf.append((conversation_id, json.dumps(item, ensure_ascii=False, separators=(",", ":"))))
+        self._ensure_task()
+        if len(self._buf) >= self.batch_size and self._wake is not None:
+            self._wake.set()
+
+    def _ensure_task(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        # A task nasce com o contexto da requisição que a criou; não herda os spans dela.
+        detach()
+        backoff = self.flush_s
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                while self._buf:
+                    await self._write_batch()
+                backoff = self.flush_s
+            except Exception:
+                ERRORS.inc()
+                backoff = min(5.0, max(backoff * 2, 0.1))
+
+    async def _execute(self, batch: List[Tuple[str, str]]) -> None:
+        with span("log_write"):
+            pipe = self.client.pipeline(transaction=False)
+            for cid, data in batch:
+                pipe.xadd(stream_key(cid), {"data": data}, maxlen=self.maxlen, approximate=True)
+            for cid in {cid for cid, _ in batch}:
+                pipe.expire(stream_key(cid), self.ttl_s)
+            await pipe.execute()
+
+    async def write_many(self, entries: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Grava já, num único pipeline, as entradas de um /chat/batch. Se o Redis
+        falhar elas vão para o buffer e a task de background regrava.
+        """
+        batch = [(cid, json.dumps(item, ensure_ascii=False, separators=(",", ":"))) for cid, item in entries]
+        if not batch:
+            return
+        try:
+            await self._execute(batch)
+        except Exception:
+            ERRORS.inc()
+            for cid, item in entries:
+                self.enqueue(cid, item)
+            return
+        WRITTEN.inc(len(batch))
+
+    async def _write_batch(self) -> None:
+        batch = [self._buf.popleft() for _ in range(min(self.batch_size, len(self._buf)))]
+        try:
+            await self._execute(batch)
+        except Exception:
+            # Devolve o lote na ordem original, respeitando o limite do buffer.
+            room = self.max_buffer - len(self._buf)
+            keep = batch[-room:] if room > 0 else []
+            DROPPED.inc(len(batch) - len(keep))
+            self._buf.extendleft(reversed(keep))
+            raise
+        WRITTEN.inc(len(batch))
+
+    async def flush(self) -> None:
+        while self._buf:
+            await self._write_batch()
+
+    async def stop(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            ERRORS.inc()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def pending(self) -> int:
+        return len(self._buf)
+
+    async def read(self, conversation_id: str, cursor: Optional[str] = None,
+                   limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Página de entradas depois de `cursor` (id do stream) e o próximo cursor."""
+        start = f"({cursor}" if cursor else "-"
+        rows = await self.client.xrange(stream_key(conversation_id), min=start, max="+", count=limit)
+        entries = [{"id": rid, **json.loads(fields["data"])} for rid, fields in rows]
+        next_cursor = rows[-1][0] if len(rows) == limit else None
+        return entries, next_cursor
+
+conv_log = ConversationLogWriter(
+    batch_size=settings.LOG_BATCH_SIZE,
+    flush_ms=settings.LOG_FLUSH_MS,
+    max_buffer=settings.LOG_BUFFER_MAX,
+    maxlen=settings.LOG_STREAM_MAXLEN,
+    ttl_s=settings.LOG_TTL_S,
+)
@@ -1,21 +1,116 @@
-import logging, sys, structlog
+import atexit, logging, os, queue, random, sys, structlog
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
 
-def setup_logging(level: str = "info"):
-    logging.basicConfig(
-        level=getattr(logging, level.upper(), logging.INFO),
-        stream=sys.stdout,
-        format="%(message)s"
-    )
+from .metrics import counter
+
+DROPPED = counter("log_dropped_total", "Registros de log descartados com a fila cheia.")
+SAMPLED_OUT = counter("log_sampled_out_total", "Eventos INFO descartados pela amostragem.")
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler que nunca bloqueia: com a fila cheia o registro é descartado e contado."""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED.inc()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # A fila é entre threads do mesmo processo: não precisa formatar nem copiar aqui.
+        return record
+
+def _sampler(rate: float):
+    def sample(logger, method: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+        keep = event_dict.pop("_keep", False)
+        if method == "info" and not keep and rate < 1.0 and random.random() >= rate:
+            SAMPLED_OUT.inc()
+            raise structlog.DropEvent
+        return event_dict
+    return sample
+
+_listener: Optional[QueueListener] = None
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def _after_fork() -> None:
+    """A thread do listener não atravessa o fork: o worker abre fila e thread próprias."""
+    global _listener
+    if _listener is None:
+        return
+    q: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=_listener.queue.maxsize)
+    for h in logging.getLogger().handlers:
+        if isinstance(h, DroppingQueueHandler):
+            h.queue = q
+    _listener = QueueListener(q, *_listener.handlers)
+    _listener.start()
+
+os.register_at_fork(after_in_child=_after_fork)
+
+def setup_logging(level: str = "info", queue_size: int = 10000, sample_rate: float = 1.0):
+    """
+    structlog → logging → fila em memória → thread dedicada que escreve no
+    stdout. A requisição só enfileira; com a fila cheia descarta
+    (log_dropped_total) em vez de bloquear. Eventos INFO sem `_keep=True`
+    são amostrados com `sample_rate`.
+    """
+    global _listener
+    lvl = getattr(logging, level.upper(), logging.INFO)
+    out = logging.StreamHandler(sys.stdout)
+    out.setFormatter(logging.Formatter("%(message)s"))
+    q: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=max(1, queue_size))
+    _stop_listener()
+    _listener = QueueListener(q, out)
+    _listener.start()
+    atexit.register(_stop_listener)
+
+    root = logging.getLogger()
+    root.handlers = [DroppingQueueHandler(q)]
+    root.setLevel(lvl)
     structlog.configure(
         processors=[
+            _sampler(sample_rate),
             structlog.processors.TimeStamper(fmt="iso"),
             structlog.processors.add_log_level,
             structlog.processors.dict_tracebacks,
             structlog.processors.JSONRenderer(),
         ],
-        wrapper_class=structlog.make_filtering_bound_logger(
-            getattr(logging, level.upper(), logging.INFO)
-        ),
-        context_class=dict
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.make_filtering_bound_logger(lvl),
+        context_class=dict,
+        cache_logger_on_first_use=True,
     )
-    return structlog.get_logger()
+    return structlog.get_logger("chat")
+
+# Registro único da requisição: o /chat abre, router e agentes anotam, o /chat emite.
+_REQUEST: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_log", default=None)
+
+_LEVELS = {"info": 0, "warning": 1, "error": 2}
+
+def begin(**fields: Any) -> Dict[str, Any]:
+    record: Dict[str, Any] = dict(fields)
+    _REQUEST.set(record)
+    return record
+
+def annotate(level: Optional[str] = None, **fields: Any) -> None:
+    """Acrescenta campos ao registro da requisição atual; `level` só sobe (info → warning → error)."""
+    record = _REQUEST.get()
+    if record is None:
+        return
+    record.update(fields)
+    if level and _LEVELS[level] > _LEVELS[record.get("level", "info")]:
+        record["level"] = level
+
+def finish(log, **fields: Any) -> None:
+    record = _REQUEST.get()
+    if record is None:
+        return
+    _REQUEST.set(None)
+    record.update(fields)
+    level = record.pop("level", "info")
+    getattr(log, level)(record)
@@ -0,0 +1,105 @@
+import bisect, threading
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+class Counter:
+    """Contador Prometheus com labels, seguro entre threads."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(l, "")) for l in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels.get(l, "")) for l in self.labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, v in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, key)} {_num(v)}")
+        return lines
+
+class Histogram:
+    """Histograma Prometheus (buckets cumulativos, _sum e _count) com labels."""
+
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # Por label: [contagem por bucket..., +Inf], soma.
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        self._observe(tuple(str(labels.get(l, "")) for l in self.labels), value)
+
+    def bind(self, **labels: str) -> Callable[[float], None]:
+        """`observe` com os labels já resolvidos, para caminhos quentes."""
+        key = tuple(str(labels.get(l, "")) for l in self.labels)
+        return lambda value: self._observe(key, value)
+
+    def _observe(self, key: Tuple[str, ...], value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][i] += 1
+            entry[1][0] += value
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(tuple(str(labels.get(l, "")) for l in self.labels))
+        return sum(entry[0]) if entry else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self._values.items()):
+            acc = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                bound = "+Inf" if le == float("inf") else repr(le)
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + (bound,))} {acc}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_num(total[0])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {acc}")
+        return lines
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    body = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + body + "}"
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(v)
+
+_REGISTRY: Dict[str, Union[Counter, Histogram]] = {}
+
+def counter(name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+    if name not in _REGISTRY:
+        _REGISTRY[name] = Counter(name, help, labels)
+    return _REGISTRY[name]
+
+def histogram(name: str, help: str, labels: Tuple[str, ...] = (),
+              buckets: Sequence[float] = Histogram.DEFAULT_BUCKETS) -> Histogram:
+    if name not in _REGISTRY:
+        _REGISTRY[name] = Histogram(name, help, labels, buckets)
+    return _REGISTRY[name]
+
+def render() -> str:
+    lines: List[str] = []
+    for m in _REGISTRY.values():
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,194 @@
+import math, time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from .config import settings
+from .metrics import counter
+from .redis import Script, redis_client
+
+DECISIONS = counter("ratelimit_requests_total", "Admissões do rate limiter, por agente e resultado.",
+                    ("agent", "result"))
+ERRORS = counter("ratelimit_errors_total", "Falhas de Redis no rate limiter (passa aos buckets locais).")
+FALLBACKS = counter("ratelimit_fallback_total", "Verificações feitas nos buckets locais do processo.")
+
+# Cada bucket guarda tokens e o instante da última leitura; o relógio é o do
+# Redis (TIME), igual para todos os workers. Só desconta se todos os buckets
+# tiverem saldo. Devolve {espera em s, saldo de cada bucket} como strings
+# (número do Lua vira inteiro na resposta).
+_TAKE = Script("""
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local level, wait = {}, 0
+for i, key in ipairs(KEYS) do
+  local rate, burst, cost = tonumber(ARGV[3*i-2]), tonumber(ARGV[3*i-1]), tonumber(ARGV[3*i])
+  local b = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(b[1]) or burst
+  local ts = tonumber(b[2]) or now
+  tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+  level[i] = tokens
+  if tokens < cost then wait = math.max(wait, (cost - tokens) / rate) end
+end
+local out = {tostring(wait)}
+for i, key in ipairs(KEYS) do
+  local rate, burst, cost = tonumber(ARGV[3*i-2]), tonumber(ARGV[3*i-1]), tonumber(ARGV[3*i])
+  if wait == 0 then level[i] = level[i] - cost end
+  redis.call('HSET', key, 'tokens', tostring(level[i]), 'ts', tostring(now))
+  redis.call('PEXPIRE', key, math.ceil((burst - level[i]) / rate * 1000) + 1000)
+  out[#out + 1] = tostring(level[i])
+end
+return out
+""")
+
+_LOCAL_MAX = 10000
+
+class Limit(NamedTuple):
+    rate: float
+    burst: int
+
+def limit(agent: str, scope: str) -> Limit:
+    """
+    Orçamento do agente num escopo (user, ip, global), de RATE_<AGENTE>_<ESCOPO>:
+    MathAgent → RATE_MATH_USER. Agente sem entrada própria usa o do KnowledgeAgent.
+    """
+    name = agent[:-len("Agent")] if agent.endswith("Agent") else agent
+    raw = (getattr(settings, f"RATE_{name.upper()}_{scope.upper()}", None)
+           or getattr(settings, f"RATE_KNOWLEDGE_{scope.upper()}"))
+    rate, _, burst = str(raw).partition(":")
+    return Limit(float(rate or 0), int(burst or 0))
+
+class Decision(NamedTuple):
+    allowed: bool
+    # Do bucket mais apertado (ou do que negou): capacidade, saldo e segundos até encher.
+    limit: int = 0
+    remaining: int = 0
+    reset_s: int = 0
+    retry_after_s: int = 0
+    scope: str = ""
+    # Custo acima da capacidade do bucket: nunca passaria, nem esperando.
+    oversized: bool = False
+
+    def headers(self) -> Dict[str, str]:
+        """RateLimit-Limit/Remaining/Reset e, quando negado, Retry-After."""
+        if not self.limit:
+            return {}
+        h = {"RateLimit-Limit": str(self.limit), "RateLimit-Remaining": str(self.remaining),
+             "RateLimit-Reset": str(self.reset_s)}
+        if not self.allowed:
+            h["Retry-After"] = str(self.retry_after_s)
+        return h
+
+UNLIMITED = Decision(True)
+
+def client_ip(request) -> str:
+    """
+    IP do cliente. Atrás de RATE_PROXY_HOPS proxies confiáveis
+    (RATE_TRUST_PROXY), é o último endereço do X-Forwarded-For que eles não
+    acrescentaram: o que vem antes é do cliente e pode ser forjado.
+    """
+    if settings.RATE_TRUST_PROXY:
+        forwarded = [p.strip() for p in request.headers.get("x-forwarded-for", "").split(",") if p.strip()]
+        if forwarded:
+            return forwarded[-min(len(forwarded), max(1, settings.RATE_PROXY_HOPS))]
+    return request.client.host if request.client else ""
+
+# chave → (escopo, limite, custo)
+Buckets = Dict[str, Tuple[str, Limit, int]]
+
+class RateLimiter:
+    """
+    Token buckets por agente em três escopos: user_id, IP e global. Cada
+    requisição custa um token de cada bucket do agente que vai respondê-la,
+    e só passa se os três tiverem saldo (um script Lua, atômico entre
+    workers e réplicas). Sem Redis, usa buckets locais do processo por
+    RATE_FALLBACK_S antes de tentar de novo.
+    """
+
+    def __init__(self, client=None, prefix: str = "rl"):
+        self.client = client or redis_client
+        self.prefix = prefix
+        self._local: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._down_until = 0.0
+
+    def buckets(self, items: Iterable[Tuple[str, str]], ip: str) -> Buckets:
+        """Buckets de (user_id, agente) por requisição, com o custo somado."""
+        out: Buckets = {}
+        for user_id, agent in items:
+            for scope, ident in (("user", user_id), ("ip", ip), ("global", "")):
+                lim = limit(agent, scope)
+                if lim.rate <= 0 or lim.burst <= 0:
+                    continue
+                key = f"{self.prefix}:{agent}:{scope}" + (f":{ident}" if scope != "global" else "")
+                cost = out[key][2] if key in out else 0
+                out[key] = (scope, lim, cost + 1)
+        return out
+
+    async def check(self, user_id: str, ip: str, agent: str) -> Decision:
+        return await self.check_many([(user_id, agent)], ip)
+
+    async def check_many(self, items: Iterable[Tuple[str, str]], ip: str) -> Decision:
+        """Admite (e desconta) todas as requisições de uma vez, ou nenhuma."""
+        items = list(items)
+        buckets = self.buckets(items, ip) if settings.RATE_LIMIT else {}
+        if not buckets:
+            return UNLIMITED
+        over = [(scope, lim) for scope, lim, cost in buckets.values() if cost > lim.burst]
+        if over:
+            # Lote maior que a capacidade: recusado sem descontar nada.
+            scope, lim = min(over, key=lambda o: o[1].burst)
+            for agent in sorted({a for _, a in items}):
+                DECISIONS.inc(agent=agent, result="oversized")
+            return Decision(False, limit=lim.burst, scope=scope, oversized=True)
+        levels = None
+        if time.monotonic() >= self._down_until:
+            try:
+                wait, levels = await self._take_redis(buckets)
+            except Exception:
+                ERRORS.inc()
+                self._down_until = time.monotonic() + settings.RATE_FALLBACK_S
+        if levels is None:
+            FALLBACKS.inc()
+            wait, levels = self._take_local(buckets)
+        decision = _decision(buckets, wait, levels)
+        for agent in sorted({a for _, a in items}):
+            DECISIONS.inc(agent=agent, result="allowed" if decision.allowed else "limited")
+        return decision
+
+    async def _take_redis(self, buckets: Buckets) -> Tuple[float, List[float]]:
+        args: List[float] = []
+        for _, lim, cost in buckets.values():
+            args += [lim.rate, lim.burst, cost]
+        raw = await _TAKE(self.client, list(buckets), args)
+        return float(raw[0]), [float(x) for x in raw[1:]]
+
+    def _take_local(self, buckets: Buckets) -> Tuple[float, List[float]]:
+        # Mesmo algoritmo do Lua, por processo: com N workers o limite efetivo fica N vezes maior.
+        now = time.monotonic()
+        wait = 0.0
+        levels: List[float] = []
+        for key, (_, lim, cost) in buckets.items():
+            tokens, ts = self._local.get(key, (float(lim.burst), now))
+            tokens = min(lim.burst, tokens + max(0.0, now - ts) * lim.rate)
+            levels.append(tokens)
+            if tokens < cost:
+                wait = max(wait, (cost - tokens) / lim.rate)
+        for i, (key, (_, _, cost)) in enumerate(buckets.items()):
+            if wait == 0:
+                levels[i] -= cost
+            self._local[key] = (levels[i], now)
+            self._local.move_to_end(key)
+        while len(self._local) > _LOCAL_MAX:
+            self._local.popitem(last=False)
+        return wait, levels
+
+def _decision(buckets: Buckets, wait: float, levels: List[float]) -> Decision:
+    rows = [(scope, lim, cost, level) for (scope, lim, cost), level in zip(buckets.values(), levels)]
+    if wait > 0:
+        # O bucket que mais demora para ter saldo é o que negou.
+        scope, lim, _, level = max(rows, key=lambda r: (r[2] - r[3]) / r[1].rate)
+    else:
+        scope, lim, _, level = min(rows, key=lambda r: r[3] / r[1].burst)
+    return Decision(allowed=wait == 0, limit=lim.burst, remaining=max(0, math.floor(level)),
+                    reset_s=math.ceil(max(0.0, lim.burst - level) / lim.rate),
+                    retry_after_s=max(1, math.ceil(wait)) if wait > 0 else 0, scope=scope)
+
+rate_limiter = RateLimiter()
@@ -1,4 +1,47 @@
+import os, hashlib
 import redis.asyncio as redis
+from redis.exceptions import NoScriptError
 from .config import settings
 
-redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+class _PerProcessClient:
+    """
+    Cliente Redis com um pool por processo (REDIS_MAX_CONNECTIONS). Os caches
+    guardam esta referência no import; com o app pré-carregado antes do fork
+    (python -m app.serve), cada worker abre o próprio pool no primeiro uso.
+    """
+
+    def __init__(self, url: str, max_connections: int):
+        self._url = url
+        self._max = max_connections
+        self._pid = None
+        self._client = None
+
+    def get(self) -> redis.Redis:
+        pid = os.getpid()
+        if self._pid != pid:
+            self._client = redis.from_url(self._url, decode_responses=True, max_connections=self._max)
+            self._pid = pid
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+redis_client = _PerProcessClient(settings.REDIS_URL, settings.REDIS_MAX_CONNECTIONS)
+
+class Script:
+    """
+    Script Lua executado por EVALSHA; se o Redis ainda não o tiver (restart,
+    outro nó), carrega com SCRIPT LOAD e repete. Serve para redis_client e
+    para qualquer cliente redis.asyncio (fakeredis nos testes).
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.sha = hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+    async def __call__(self, client, keys, args):
+        try:
+            return await client.evalsha(self.sha, len(keys), *keys, *args)
+        except NoScriptError:
+            self.sha = await client.script_load(self.source)
+            return await client.evalsha(self.sha, len(keys), *keys, *args)
@@ -9,8 +9,24 @@ class ChatRequest(BaseModel):
 class AgentTrace(BaseModel):
     agent: str
     decision: Optional[str] = None
+    # Preenchidos pelo despacho do router: winner, loser, cancelled, timeout ou error.
+    outcome: Optional[str] = None
+    score: Optional[float] = None
+    elapsed_ms: Optional[int] = None
 
 class ChatResponse(BaseModel):
     response: str
     source_agent_response: str
     agent_workflow: List[AgentTrace]
+
+class ChatBatchRequest(BaseModel):
+    items: List[ChatRequest] = Field(min_length=1)
+
+class ChatBatchItem(BaseModel):
+    # Status que o /chat devolveria para o item; `result` só vem com 200.
+    status: int = 200
+    result: Optional[ChatResponse] = None
+    detail: Optional[str] = None
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatBatchItem]
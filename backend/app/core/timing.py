@@ -0,0 +1,80 @@
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from .metrics import histogram
+
+SPAN_SECONDS = histogram("chat_span_seconds", "Duração de cada etapa do atendimento.", ("span",))
+
+# Etapas da requisição atual (nome → segundos). O dict é compartilhado por
+# referência com as tasks filhas e as threads do WorkerPool, que copiam o contexto.
+_SPANS: ContextVar[Optional[Dict[str, float]]] = ContextVar("spans", default=None)
+
+def start() -> Dict[str, float]:
+    spans: Dict[str, float] = {}
+    _SPANS.set(spans)
+    return spans
+
+def detach() -> None:
+    """Para tasks de background: spans delas vão só para o histograma."""
+    _SPANS.set(None)
+
+def current() -> Optional[Dict[str, float]]:
+    return _SPANS.get()
+
+_OBSERVERS: Dict[str, Callable[[float], None]] = {}
+
+class span:
+    """`with span("embed"): ...` mede a etapa no histograma e nos spans da requisição."""
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "span":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        dt = time.perf_counter() - self.t0
+        observe = _OBSERVERS.get(self.name)
+        if observe is None:
+            observe = _OBSERVERS[self.name] = SPAN_SECONDS.bind(span=self.name)
+        observe(dt)
+        spans = _SPANS.get()
+        if spans is not None:
+            spans[self.name] = spans.get(self.name, 0.0) + dt
+
+def server_timing(spans: Dict[str, float]) -> str:
+    """Header Server-Timing: `embed;dur=12.3, search;dur=4.1, ...` em ms."""
+    return ", ".join(f"{name};dur={dt * 1000:.1f}" for name, dt in spans.items())
+
+class ServerTimingMiddleware:
+    """
+    Middleware ASGI: abre o registro de spans da requisição e devolve o que
+    foi medido no header Server-Timing (mais `total` até o início da resposta).
+    Em streaming o header sai com as etapas concluídas antes do primeiro byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        token = _SPANS.set({})
+        spans = _SPANS.get()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                spans["total"] = time.perf_counter() - t0
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(spans).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _SPANS.reset(token)
@@ -0,0 +1,130 @@
+import asyncio, contextvars, functools, multiprocessing, threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+class PoolSaturated(Exception):
+    """Todos os workers ocupados e a fila cheia; o chamador deve responder 503."""
+
+class WorkerPool:
+    """
+    Executa funções síncronas (CPU/IO bloqueante) fora do event loop, num
+    ThreadPoolExecutor com `max_workers` threads e no máximo `max_queue`
+    tarefas esperando. Acima disso `run` levanta PoolSaturated em vez de enfileirar.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self.rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    def _release(self, _fut) -> None:
+        with self._lock:
+            self._inflight -= 1
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            if self._inflight >= self.capacity:
+                self.rejected += 1
+                raise PoolSaturated(self.name)
+            self._inflight += 1
+        ctx = contextvars.copy_context()
+        try:
+            fut = self._get_executor().submit(functools.partial(ctx.run, fn, *args, **kwargs))
+        except BaseException:
+            self._release(None)
+            raise
+        # O slot só é liberado quando a thread termina, mesmo se o await for cancelado.
+        fut.add_done_callback(self._release)
+        return await asyncio.wrap_future(fut)
+
+    def stats(self) -> Dict[str, int]:
+        inflight = self._inflight
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": min(inflight, self.max_workers),
+            "queued": max(0, inflight - self.max_workers),
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+class ProcessPool:
+    """
+    Como WorkerPool, mas em processos (spawn) e com prazo: se `run` estoura o
+    `timeout`, os processos do pool são mortos (thread não se interrompe;
+    processo sim) e o próximo `run` sobe um pool novo. As outras tarefas em
+    andamento no pool morto falham com BrokenProcessPool.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, initializer: Optional[Callable] = None):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.initializer = initializer
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self.rejected = 0
+        self.killed = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.max_workers, multiprocessing.get_context("spawn"),
+                                                     initializer=self.initializer)
+            return self._executor
+
+    def _kill(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+            self.killed += 1
+        for proc in list((getattr(executor, "_processes", None) or {}).values()):
+            proc.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, timeout: float, fn: Callable[..., Any], *args) -> Any:
+        with self._lock:
+            if self._inflight >= self.capacity:
+                self.rejected += 1
+                raise PoolSaturated(self.name)
+            self._inflight += 1
+        try:
+            executor = self._get_executor()
+            fut = executor.submit(fn, *args)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(fut), timeout)
+            except asyncio.TimeoutError:
+                self._kill(executor)
+                raise
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,14 +1,47 @@
-from fastapi import FastAPI, HTTPException
+import asyncio, json, time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from .core.config import settings
+from .core import logging as reqlog
 from .core.logging import setup_logging
-from .core.security import sanitize, looks_malicious
-from .core.schemas import ChatRequest, ChatResponse, AgentTrace
-from .agents.router import router_agent
-from .core.redis import redis_client
+from .core.analysis import analyze
+from .core.schemas import (ChatRequest, ChatResponse, AgentTrace, ChatBatchRequest, ChatBatchItem,
+                           ChatBatchResponse)
+from .agents.router import plan, router_agent, router_agent_batch, router_agent_stream
+from .core.convlog import conv_log
+from .core import metrics
+from .core import timing
+from .core.timing import ServerTimingMiddleware, span
+from .core.workers import PoolSaturated
+from .core.ratelimit import Decision, client_ip, rate_limiter
+from .agents.knowledge import knowledge_pool
+from .agents.math import sympy_pool
+from .rag import store
 
-log = setup_logging(settings.LOG_LEVEL)
-app = FastAPI(title="Modular Chatbot (Python, LangChain)")
+log = setup_logging(settings.LOG_LEVEL, settings.LOG_QUEUE_MAX, settings.LOG_SAMPLE_INFO)
+
+async def _warm_store():
+    try:
+        await asyncio.to_thread(store.warmup)
+        log.info({"agent": "KnowledgeStore", "decision": "warm", **store.status()}, _keep=True)
+    except Exception:
+        log.error({"agent": "KnowledgeStore", "decision": "warmup_failed", **store.status()})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Carrega embeddings + Chroma em background: /health responde já, /ready só quando aquecido.
+    task = asyncio.create_task(_warm_store())
+    yield
+    task.cancel()
+    await conv_log.stop()
+    knowledge_pool.shutdown()
+    sympy_pool.shutdown()
+
+app = FastAPI(title="Modular Chatbot (Python, LangChain)", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,40 +49,216 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After", "RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset"],
+)
+app.add_middleware(ServerTimingMiddleware)
+
+BLOCKED = ChatResponse(
+    response="Sua mensagem parece insegura. Por favor, reformule.",
+    source_agent_response="Blocked by prompt-injection guard.",
+    agent_workflow=[AgentTrace(agent="RouterAgent", decision="blocked")]
 )
 
+def _decision_entry(payload: ChatRequest, decision: str) -> dict:
+    return {
+        "timestamp": __import__("datetime").datetime.utcnow().isoformat()+"Z",
+        "level": "INFO",
+        "agent": "RouterAgent",
+        "conversation_id": payload.conversation_id,
+        "user_id": payload.user_id,
+        "decision": decision,
+    }
+
+def _log_decision(payload: ChatRequest, decision: str) -> None:
+    with span("log"):
+        conv_log.enqueue(payload.conversation_id, _decision_entry(payload, decision))
+
+def _begin(payload: ChatRequest) -> float:
+    reqlog.begin(conversation_id=payload.conversation_id, user_id=payload.user_id)
+    return time.perf_counter()
+
+def _finish(t0: float, **fields) -> None:
+    """Emite o registro único da requisição (campos anotados pelos agentes + estes)."""
+    spans = timing.current() or {}
+    reqlog.finish(log, execution_time=int((time.perf_counter()-t0)*1000),
+                  spans={k: round(v * 1000, 1) for k, v in spans.items()}, **fields)
+
+def _overloaded(t0: float) -> None:
+    _finish(t0, agent="RouterAgent", decision="overloaded", level="warning", **knowledge_pool.stats())
+
+def _bucket(analysis, cands) -> str:
+    # Mensagem bloqueada também paga (do RouterAgent): injeção em loop cai no 429.
+    return "RouterAgent" if analysis.blocked else cands[0][0].name
+
+async def _admit(request: Request, items, t0: Optional[float] = None) -> Decision:
+    """
+    Rate limit por (user_id, agente previsto pelo router), IP e agente; acima
+    do orçamento, 429 com Retry-After antes de gastar CPU com a mensagem; lote
+    que custa mais que a capacidade de um bucket, 413.
+    """
+    with span("ratelimit"):
+        decision = await rate_limiter.check_many(items, client_ip(request))
+    if decision.oversized:
+        raise HTTPException(status_code=413, detail=f"Lote maior que o limite por {decision.scope}: "
+                                                    f"no máximo {decision.limit} itens.")
+    if not decision.allowed:
+        if t0 is not None:
+            _finish(t0, agent="RouterAgent", decision="rate_limited", level="warning", scope=decision.scope)
+        raise HTTPException(status_code=429, detail="Muitas requisições, tente novamente em instantes.",
+                            headers=decision.headers())
+    return decision
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(payload: ChatRequest):
-    cleaned = sanitize(payload.message)
-    if looks_malicious(cleaned):
-        return ChatResponse(
-            response="Sua mensagem parece insegura. Por favor, reformule.",
-            source_agent_response="Blocked by prompt-injection guard.",
-            agent_workflow=[AgentTrace(agent="RouterAgent", decision="blocked")]
-        )
+async def chat(payload: ChatRequest, request: Request, response: Response):
+    t0 = _begin(payload)
+    with span("sanitize"):
+        analysis = analyze(payload.message)
+    cands = None if analysis.blocked else await plan(analysis)
+    admitted = await _admit(request, [(payload.user_id, _bucket(analysis, cands))], t0)
+    response.headers.update(admitted.headers())
+    if analysis.blocked:
+        _finish(t0, agent="RouterAgent", decision="blocked", level="warning")
+        return BLOCKED
     try:
         reply, source, workflow = await router_agent(
-            cleaned, payload.user_id, payload.conversation_id, log
+            analysis, payload.user_id, payload.conversation_id, log, cands
         )
-        item = {
-            "timestamp": __import__("datetime").datetime.utcnow().isoformat()+"Z",
-            "level": "INFO",
-            "agent": "RouterAgent",
-            "conversation_id": payload.conversation_id,
-            "user_id": payload.user_id,
-            "decision": workflow[0]["decision"],
-        }
-        log.info(item)
-        await redis_client.rpush(f"logs:{payload.conversation_id}", str(item))
+        _log_decision(payload, workflow[0]["decision"])
+        _finish(t0, agent=workflow[-1]["agent"], decision=workflow[-1].get("decision"))
         return ChatResponse(
             response=reply,
             source_agent_response=source,
             agent_workflow=[AgentTrace(**w) for w in workflow]
         )
-    except Exception:
+    except PoolSaturated:
+        _overloaded(t0)
+        raise HTTPException(status_code=503, detail="Servidor ocupado, tente novamente.",
+                            headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        _finish(t0, agent="RouterAgent", decision="timeout", level="warning")
+        raise HTTPException(status_code=504, detail="Tempo de resposta esgotado.")
+    except Exception as e:
+        _finish(t0, agent="RouterAgent", decision="error", level="error", error=type(e).__name__)
         raise HTTPException(status_code=500, detail="Internal error")
 
+def _batch_error(e: BaseException) -> ChatBatchItem:
+    if isinstance(e, PoolSaturated):
+        return ChatBatchItem(status=503, detail="Servidor ocupado, tente novamente.")
+    if isinstance(e, asyncio.TimeoutError):
+        return ChatBatchItem(status=504, detail="Tempo de resposta esgotado.")
+    return ChatBatchItem(status=500, detail="Internal error")
+
+@app.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch(payload: ChatBatchRequest, request: Request, response: Response):
+    """
+    Vários ChatRequest numa chamada. Os itens são agrupados pela decisão do
+    router e cada agente resolve o seu grupo de uma vez (um forward de
+    embedding e uma busca vetorial para todo o KnowledgeAgent). Os resultados
+    voltam na ordem, cada um com o status que o /chat daria; o log de
+    conversa sai num único pipeline e o log estruturado num registro só.
+    """
+    items = payload.items
+    if len(items) > settings.CHAT_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"No máximo {settings.CHAT_BATCH_MAX} itens por lote.")
+    t0 = time.perf_counter()
+    with span("sanitize"):
+        analyses = [analyze(it.message) for it in items]
+    todo = [i for i, a in enumerate(analyses) if not a.blocked]
+    plans = {i: await plan(analyses[i]) for i in todo}
+    # O lote inteiro passa ou leva 429 (413 se nem com os buckets cheios caberia): cada item,
+    # bloqueado ou não, custa um token do seu usuário e agente.
+    admitted = await _admit(request, [(it.user_id, _bucket(a, plans.get(i)))
+                                      for i, (it, a) in enumerate(zip(items, analyses))])
+    response.headers.update(admitted.headers())
+    results = [ChatBatchItem(result=BLOCKED) for _ in items]
+    solved = await router_agent_batch([analyses[i] for i in todo], [items[i].conversation_id for i in todo],
+                                      [plans[i] for i in todo])
+    entries = []
+    for i, out in zip(todo, solved):
+        if isinstance(out, BaseException):
+            results[i] = _batch_error(out)
+            continue
+        reply, source, workflow = out
+        results[i] = ChatBatchItem(result=ChatResponse(
+            response=reply, source_agent_response=source,
+            agent_workflow=[AgentTrace(**w) for w in workflow]))
+        entries.append((items[i].conversation_id, _decision_entry(items[i], workflow[0]["decision"])))
+    with span("log"):
+        await conv_log.write_many(entries)
+    # O registro começa só agora: annotate() dos agentes durante o lote não se mistura.
+    reqlog.begin(items=len(items))
+    statuses = Counter(r.status for r in results)
+    _finish(t0, agent="RouterAgent", decision="batch",
+            level="warning" if len(statuses) > 1 or 200 not in statuses else "info",
+            agents=dict(Counter(r.result.agent_workflow[0].decision for r in results if r.result)),
+            statuses={str(k): v for k, v in statuses.items()})
+    return ChatBatchResponse(results=results)
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(payload: ChatRequest, request: Request):
+    """
+    Mesmo fluxo do /chat em Server-Sent Events: route → sources → token... → done
+    (com especulação, route sai antes do despacho e reroute corrige se outro agente venceu).
+    Falhas viram um evento "error" com o status que o /chat devolveria; o
+    rate limit responde 429 antes de abrir o stream.
+    """
+    with span("sanitize"):
+        analysis = analyze(payload.message)
+    cands = None if analysis.blocked else await plan(analysis)
+    admitted = await _admit(request, [(payload.user_id, _bucket(analysis, cands))])
+
+    async def events():
+        t0 = _begin(payload)
+        if analysis.blocked:
+            _finish(t0, agent="RouterAgent", decision="blocked", level="warning")
+            yield _sse("route", {"agent": "RouterAgent", "decision": "blocked"})
+            yield _sse("done", BLOCKED.model_dump())
+            return
+        try:
+            async for event, data in router_agent_stream(
+                analysis, payload.user_id, payload.conversation_id, log, cands
+            ):
+                if event == "done":
+                    _log_decision(payload, data["agent_workflow"][0]["decision"])
+                    _finish(t0, agent=data["agent_workflow"][-1]["agent"],
+                            decision=data["agent_workflow"][-1].get("decision"))
+                    data = ChatResponse(**data).model_dump()
+                yield _sse(event, data)
+        except PoolSaturated:
+            _overloaded(t0)
+            yield _sse("error", {"status": 503, "detail": "Servidor ocupado, tente novamente."})
+        except asyncio.TimeoutError:
+            _finish(t0, agent="RouterAgent", decision="timeout", level="warning")
+            yield _sse("error", {"status": 504, "detail": "Tempo de resposta esgotado."})
+        except Exception as e:
+            _finish(t0, agent="RouterAgent", decision="error", level="error", error=type(e).__name__)
+            yield _sse("error", {"status": 500, "detail": "Internal error"})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no",
+                                      **admitted.headers()})
+
 @app.get("/logs/{conversation_id}")
-async def get_logs(conversation_id: str):
-    entries = await redis_client.lrange(f"logs:{conversation_id}", 0, -1)
-    return {"logs": entries}
+async def get_logs(conversation_id: str, cursor: Optional[str] = None,
+                   limit: int = Query(50, ge=1, le=500)):
+    try:
+        entries, next_cursor = await conv_log.read(conversation_id, cursor, limit)
+    except Exception:
+        raise HTTPException(status_code=503, detail="Logs indisponíveis no momento.")
+    return {"logs": entries, "next_cursor": next_cursor}
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    st = {**store.status(), "knowledge_pool": knowledge_pool.stats()}
+    return JSONResponse(st, status_code=200 if st["ready"] else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,115 @@
+import os, queue, threading, time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+
+_STOP = object()
+
+class MicroBatcher:
+    """
+    Junta textos que chegam dentro de `max_wait_ms` (até `max_batch`) e codifica
+    todos numa única chamada de `encode`. Cada chamador recebe o seu vetor.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], List[List[float]]],
+                 max_batch: int = 16, max_wait_ms: float = 5.0):
+        self._encode = encode
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_seen = 0
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="embed-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        fut: Future = Future()
+        self._ensure_thread()
+        self._queue.put((text, fut))
+        return fut
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        return self.submit(text).result(timeout)
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+            texts = [t for t, _ in batch]
+            try:
+                vectors = self._encode(texts)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            self.max_seen = max(self.max_seen, len(batch))
+            for (_, fut), vec in zip(batch, vectors):
+                fut.set_result(vec)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_seen": self.max_seen,
+            "pending": self._queue.qsize(),
+        }
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(_STOP)
+
+class BatchedEmbeddings(Embeddings):
+    """Embeddings cujo embed_query passa pelo MicroBatcher; embed_documents vai direto."""
+
+    def __init__(self, base: Embeddings, max_batch: int = 16, max_wait_ms: float = 5.0):
+        self.base = base
+        self.batcher = MicroBatcher(base.embed_documents, max_batch=max_batch, max_wait_ms=max_wait_ms)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.embed(text)
+
+    def close(self) -> None:
+        self.batcher.close()
+
+def batch_config() -> Dict[str, float]:
+    return {
+        "max_batch": int(os.getenv("EMBED_BATCH_MAX", "16") or "16"),
+        "max_wait_ms": float(os.getenv("EMBED_BATCH_WAIT_MS", "5") or "5"),
+    }
+
+def wrap(base: Embeddings) -> Embeddings:
+    cfg = batch_config()
+    if cfg["max_batch"] <= 1:
+        return base
+    return BatchedEmbeddings(base, max_batch=int(cfg["max_batch"]), max_wait_ms=cfg["max_wait_ms"])
@@ -0,0 +1,145 @@
+import os, re, json, math
+from typing import List, Optional, Sequence, Tuple
+
+from .extract import Section
+
+_SENTENCE = re.compile(r"(?<=[.!?;:])\s+")
+_WORDS = re.compile(r"\w+|[^\w\s]")
+
+class ApproxTokenizer:
+    """
+    Contagem aproximada quando não há tokenizer.json local: palavras e
+    pontuação × 1.4 (WordPiece quebra palavras em português em ~1.3–1.5 peças).
+    """
+
+    ratio = 1.4
+
+    def count_batch(self, texts: Sequence[str]) -> List[int]:
+        return [math.ceil(len(_WORDS.findall(t)) * self.ratio) for t in texts]
+
+class HFTokenizer:
+    """Contagem exata com o tokenizer do modelo de embeddings (sem [CLS]/[SEP])."""
+
+    def __init__(self, tokenizer):
+        tokenizer.no_truncation()
+        tokenizer.no_padding()
+        self.tokenizer = tokenizer
+
+    def count_batch(self, texts: Sequence[str]) -> List[int]:
+        if not texts:
+            return []
+        return [len(e.ids) for e in self.tokenizer.encode_batch(list(texts), add_special_tokens=False)]
+
+class TokenChunker:
+    """
+    Chunks de até `max_tokens` tokens do modelo de embeddings, que nunca
+    cruzam um título: cada seção é fatiada por linhas (e frases, e palavras,
+    quando uma linha sozinha não cabe), com `overlap` tokens de linhas
+    repetidas entre chunks vizinhos. A continuação de uma seção começa com
+    o título dela, para o chunk não perder o assunto.
+    """
+
+    def __init__(self, counter, max_tokens: int = 254, overlap: int = 32, model: str = ""):
+        self.counter = counter
+        self.max_tokens = max(16, max_tokens)
+        self.overlap = max(0, min(overlap, self.max_tokens // 4))
+        self.model = model
+
+    @property
+    def version(self) -> str:
+        """Modelo, contagem, tamanho e overlap: mudou qualquer um, os chunks antigos não valem mais."""
+        return f"{self.model}|{type(self.counter).__name__}|{self.max_tokens}|{self.overlap}"
+
+    def count(self, text: str) -> int:
+        return self.counter.count_batch([text])[0]
+
+    def _units(self, lines: Sequence[str], limit: int) -> List[Tuple[str, int]]:
+        units: List[Tuple[str, int]] = []
+        for line, n in zip(lines, self.counter.count_batch(lines)):
+            if n <= limit:
+                units.append((line, n))
+                continue
+            sentences = [s for s in _SENTENCE.split(line) if s]
+            for sent, m in zip(sentences, self.counter.count_batch(sentences)):
+                if m <= limit:
+                    units.append((sent, m))
+                else:
+                    units.extend(self._words(sent, limit))
+        return units
+
+    def _words(self, text: str, limit: int) -> List[Tuple[str, int]]:
+        # Frase maior que a janela: fatias de palavras dimensionadas pela média de tokens por palavra.
+        words = text.split()
+        per_word = max(1.0, self.count(text) / max(1, len(words)))
+        step = max(1, int(limit / per_word * 0.9))
+        pieces = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+        return list(zip(pieces, self.counter.count_batch(pieces)))
+
+    def split_section(self, section: Section) -> List[str]:
+        lines = [ln for ln in section.lines if ln]
+        if not lines:
+            return []
+        head = section.heading.rsplit(" > ", 1)[-1] if section.heading else ""
+        head_n = self.count(head) + 1 if head else 0
+        units = self._units(lines, self.max_tokens - head_n)
+        chunks: List[str] = []
+        cur: List[Tuple[str, int]] = []
+        size = 0
+        for unit in units:
+            budget = self.max_tokens - (head_n if chunks and head else 0)
+            if cur and size + unit[1] > budget:
+                chunks.append(self._join(head if chunks else "", cur))
+                keep: List[Tuple[str, int]] = []
+                kept = 0
+                for u in reversed(cur):
+                    if kept + u[1] > self.overlap:
+                        break
+                    keep.insert(0, u)
+                    kept += u[1]
+                cur, size = keep, kept
+                budget = self.max_tokens - (head_n if head else 0)
+                while cur and size + unit[1] > budget:
+                    size -= cur.pop(0)[1]
+            cur.append(unit)
+            size += unit[1]
+        if cur:
+            chunks.append(self._join(head if chunks else "", cur))
+        return chunks
+
+    @staticmethod
+    def _join(head: str, units: List[Tuple[str, int]]) -> str:
+        body = "\n".join(u for u, _ in units)
+        return f"{head}\n{body}" if head and not body.startswith(head) else body
+
+    def split_sections(self, sections: Sequence[Section]) -> List[Tuple[str, str]]:
+        """(texto do chunk, caminho de títulos) de todas as seções, na ordem."""
+        return [(chunk, s.heading) for s in sections for chunk in self.split_section(s)]
+
+    def split_text(self, text: str) -> List[str]:
+        return self.split_section(Section("", tuple(text.splitlines())))
+
+def model_window(model_dir: Optional[str]) -> int:
+    """max_seq_length do sentence-transformers (256 no MiniLM), ou EMBEDDING_MAX_LENGTH."""
+    default = int(os.getenv("EMBEDDING_MAX_LENGTH", "256") or "256")
+    if model_dir:
+        try:
+            with open(os.path.join(model_dir, "sentence_bert_config.json"), "r", encoding="utf-8") as f:
+                return min(default, int(json.load(f)["max_seq_length"]))
+        except (OSError, ValueError, KeyError):
+            pass
+    return default
+
+def for_model(model: str) -> TokenChunker:
+    """
+    Chunker dimensionado para o modelo: CHUNK_TOKENS (padrão: a janela do
+    modelo menos [CLS]/[SEP]) e CHUNK_OVERLAP_TOKENS. Conta com o
+    tokenizer.json da pasta local do modelo; sem ela, aproxima.
+    """
+    model_dir = model if os.path.isdir(model) else None
+    counter = ApproxTokenizer()
+    if model_dir and os.path.exists(os.path.join(model_dir, "tokenizer.json")):
+        from tokenizers import Tokenizer
+        counter = HFTokenizer(Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json")))
+    max_tokens = int(os.getenv("CHUNK_TOKENS", "0") or "0") or model_window(model_dir) - 2
+    overlap = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32") or "32")
+    return TokenChunker(counter, max_tokens, overlap, model=os.path.basename(model.rstrip("/\\")))
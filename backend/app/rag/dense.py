@@ -0,0 +1,213 @@
+import os, json, shutil
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+DENSE_DIR = "dense"
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    m = np.asarray(m, dtype=np.float32)
+    return m / np.maximum(np.linalg.norm(m, axis=-1, keepdims=True), 1e-12)
+
+def kmeans(x: np.ndarray, k: int, iters: int = 20, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """k-means esférico (produto interno em vetores normalizados); devolve (centroides, rótulos)."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    labels = np.zeros(len(x), dtype=np.int64)
+    for _ in range(iters):
+        labels = np.argmax(x @ centroids.T, axis=1)
+        for c in range(k):
+            members = x[labels == c]
+            # Cluster vazio: recomeça no ponto pior atendido pelos centroides atuais.
+            centroids[c] = members.mean(axis=0) if len(members) else x[np.argmin(np.max(x @ centroids.T, axis=1))]
+        centroids = _normalize(centroids)
+    return centroids, np.argmax(x @ centroids.T, axis=1)
+
+def _scores(m: np.ndarray, q: np.ndarray, block: int = 4096) -> np.ndarray:
+    if m.dtype == np.float32:
+        return m @ q
+    # float16 não tem BLAS no numpy: converte em blocos para float32 antes do produto.
+    return np.concatenate([m[i:i + block].astype(np.float32) @ q for i in range(0, len(m), block)])
+
+class DenseIndex(VectorStore):
+    """
+    Índice vetorial somente leitura, alternativa ao Chroma nas réplicas. Os
+    embeddings (normalizados, float32 ou float16) ficam numa matriz contígua
+    em .npy e os textos num blob UTF-8 com offsets, ambos abertos com mmap:
+    workers do mesmo nó compartilham as páginas. Busca top-k por produto
+    interno; acima de DENSE_IVF_MIN chunks o build agrupa as linhas por
+    cluster (IVF) e a busca só varre as `nprobe` listas mais próximas.
+    """
+
+    def __init__(self, ids: List[str], vectors: np.ndarray, texts: np.ndarray, text_offsets: np.ndarray,
+                 metadatas: List[Dict[str, Any]], embedding: Optional[Embeddings] = None,
+                 centroids: Optional[np.ndarray] = None, list_offsets: Optional[np.ndarray] = None,
+                 nprobe: int = 8):
+        self.ids = ids
+        self.vectors = vectors
+        self.texts = texts
+        self.text_offsets = text_offsets
+        self.metadatas = metadatas
+        self.embedding = embedding
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.nprobe = max(1, nprobe)
+        self.n = len(ids)
+        self._rows = {doc_id: i for i, doc_id in enumerate(ids)}
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding
+
+    @classmethod
+    def build(cls, ids: Sequence[str], vectors, texts: Sequence[str], metadatas: Sequence[Optional[Dict]],
+              dtype: str = "float32", ivf_min: int = 4096, nlist: Optional[int] = None,
+              embedding: Optional[Embeddings] = None, dim: Optional[int] = None) -> "DenseIndex":
+        # Coleção vazia: matriz (0, dim), com dim do modelo de embeddings quando não vem.
+        if len(ids):
+            x = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+        else:
+            x = np.zeros((0, dim or (len(embedding.embed_query("dim")) if embedding is not None else 0)),
+                         dtype=np.float32)
+        ids, texts = list(ids), list(texts)
+        metadatas = [dict(m or {}) for m in metadatas]
+        centroids = list_offsets = None
+        if len(ids) >= max(2, ivf_min):
+            nlist = min(len(ids), nlist or int(4 * np.sqrt(len(ids))))
+            centroids, labels = kmeans(x, nlist)
+            # Linhas ordenadas por cluster: cada lista do IVF vira uma fatia contígua.
+            order = np.argsort(labels, kind="stable")
+            x = x[order]
+            ids = [ids[i] for i in order]
+            texts = [texts[i] for i in order]
+            metadatas = [metadatas[i] for i in order]
+            list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+            list_offsets[1:] = np.cumsum(np.bincount(labels, minlength=nlist))
+        blobs = [(t or "").encode("utf-8") for t in texts]
+        text_offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+        text_offsets[1:] = np.cumsum([len(b) for b in blobs])
+        blob = np.frombuffer(b"".join(blobs), dtype=np.uint8)
+        return cls(ids, x.astype(dtype), blob, text_offsets, metadatas, embedding, centroids, list_offsets)
+
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "metadatas": self.metadatas}, f, ensure_ascii=False)
+        np.save(os.path.join(tmp, "vectors.npy"), np.asarray(self.vectors))
+        np.save(os.path.join(tmp, "text_offsets.npy"), np.asarray(self.text_offsets))
+        with open(os.path.join(tmp, "texts.bin"), "wb") as f:
+            f.write(np.asarray(self.texts).tobytes())
+        if self.centroids is not None:
+            np.save(os.path.join(tmp, "centroids.npy"), np.asarray(self.centroids))
+            np.save(os.path.join(tmp, "list_offsets.npy"), np.asarray(self.list_offsets))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, embedding: Optional[Embeddings] = None, mmap: bool = True,
+             nprobe: int = 8) -> "DenseIndex":
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        mode = "r" if mmap else None
+        npy = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+        texts_path = os.path.join(path, "texts.bin")
+        if os.path.getsize(texts_path):
+            texts = np.memmap(texts_path, dtype=np.uint8, mode="r") if mmap else np.fromfile(texts_path, dtype=np.uint8)
+        else:
+            texts = np.zeros(0, dtype=np.uint8)
+        ivf = os.path.exists(os.path.join(path, "centroids.npy"))
+        return cls(meta["ids"], npy("vectors"), texts, npy("text_offsets"), meta["metadatas"], embedding,
+                   np.asarray(npy("centroids")) if ivf else None,
+                   np.asarray(npy("list_offsets")) if ivf else None, nprobe=nprobe)
+
+    def _text(self, i: int) -> str:
+        return bytes(self.texts[int(self.text_offsets[i]):int(self.text_offsets[i + 1])]).decode("utf-8")
+
+    def _doc(self, i: int) -> Document:
+        return Document(page_content=self._text(i), metadata=dict(self.metadatas[i]), id=self.ids[i])
+
+    def search_vector(self, vector, k: int = 4) -> List[Tuple[int, float]]:
+        """Linhas e scores (cosseno) dos k vizinhos mais próximos."""
+        if not self.n:
+            return []
+        q = _normalize(np.asarray(vector, dtype=np.float32).reshape(-1))
+        if self.centroids is None:
+            rows = None
+            scores = _scores(self.vectors, q)
+        else:
+            probe = np.argsort(-(self.centroids @ q))[:self.nprobe]
+            spans = [(int(self.list_offsets[c]), int(self.list_offsets[c + 1])) for c in probe]
+            rows = np.concatenate([np.arange(lo, hi) for lo, hi in spans])
+            scores = np.concatenate([_scores(self.vectors[lo:hi], q) for lo, hi in spans])
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        hits = top if rows is None else rows[top]
+        return [(int(i), float(s)) for i, s in zip(hits, scores[top])]
+
+    def search_vectors(self, vectors, k: int = 4) -> List[List[Tuple[int, float]]]:
+        """Várias consultas de uma vez: no índice flat é um único produto matriz × matriz."""
+        q = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1))
+        if self.centroids is not None or not self.n or not len(q):
+            return [self.search_vector(v, k) for v in q]
+        scores = _scores(self.vectors, q.T)
+        k = min(k, self.n)
+        top = np.argpartition(-scores, k - 1, axis=0)[:k]
+        out = []
+        for j in range(top.shape[1]):
+            col = top[np.argsort(-scores[top[:, j], j]), j]
+            out.append([(int(i), float(scores[i, j])) for i in col])
+        return out
+
+    def similarity_search_by_vectors(self, vectors, k: int = 4) -> List[List[Document]]:
+        return [[self._doc(i) for i, _ in hits] for hits in self.search_vectors(vectors, k)]
+
+    def rank_ids(self, vector, ids: Sequence[str], k: int = 4) -> List[Tuple[Document, float]]:
+        """Só os chunks `ids`, ordenados pelo cosseno com `vector` (re-rank sem varrer o índice)."""
+        rows = [self._rows[i] for i in dict.fromkeys(ids) if i in self._rows]
+        if not rows:
+            return []
+        scores = _scores(np.asarray(self.vectors[rows]), _normalize(np.asarray(vector).reshape(-1)))
+        order = np.argsort(-scores)[:k]
+        return [(self._doc(rows[i]), float(scores[i])) for i in order]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        return [(self._doc(i), s) for i, s in self.search_vector(embedding, k)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [self._doc(i) for i, _ in self.search_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k)
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        return [self._doc(self._rows[i]) for i in ids if i in self._rows]
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise TypeError("DenseIndex é somente leitura; use indexer.build_dense")
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   *, ids: Optional[List[str]] = None, **kwargs: Any) -> "DenseIndex":
+        ids = ids or [str(i) for i in range(len(texts))]
+        return cls.build(ids, embedding.embed_documents(list(texts)), texts,
+                         metadatas or [{}] * len(texts), embedding=embedding, **kwargs)
+
+def load(persist_dir: str, embedding: Optional[Embeddings] = None, nprobe: int = 8) -> Optional[DenseIndex]:
+    path = os.path.join(persist_dir, DENSE_DIR)
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    return DenseIndex.load(path, embedding, nprobe=nprobe)
@@ -0,0 +1,199 @@
+import os, json, struct
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# EMBEDDING_BACKEND: torch (sentence-transformers), onnx, onnx-int8 ou numpy.
+BACKENDS = ("torch", "onnx", "onnx-int8", "numpy")
+
+# Arquivos ONNX do repositório sentence-transformers (pasta onnx/ do modelo).
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model_quint8_avx2.onnx"}
+
+def backend() -> str:
+    name = (os.getenv("EMBEDDING_BACKEND", "torch") or "torch").strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"EMBEDDING_BACKEND inválido: {name!r} (use {', '.join(BACKENDS)})")
+    return name
+
+def _max_length() -> int:
+    return int(os.getenv("EMBEDDING_MAX_LENGTH", "256") or "256")
+
+def _batch_size() -> int:
+    return int(os.getenv("EMBEDDING_BATCH", "32") or "32")
+
+def onnx_file(name: str) -> str:
+    return os.getenv("EMBEDDING_ONNX_FILE") or ONNX_FILES[name]
+
+def load_tokenizer(model_dir: str, max_length: int):
+    from tokenizers import Tokenizer
+    tok = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+    tok.enable_truncation(max_length)
+    tok.enable_padding()
+    return tok
+
+def mean_pool(hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Média dos tokens válidos (máscara) + normalização L2, como o Pooling/Normalize do MiniLM."""
+    m = mask[..., None].astype(np.float32)
+    v = (hidden * m).sum(axis=1) / np.maximum(m.sum(axis=1), 1e-9)
+    return v / np.maximum(np.linalg.norm(v, axis=1, keepdims=True), 1e-12)
+
+class EncoderEmbeddings(Embeddings, ABC):
+    """
+    Tokenizer do HF (tokenizers, Rust) + um forward que devolve o last_hidden_state.
+    As subclasses só implementam `_forward(ids, mask, types)`.
+    """
+
+    def __init__(self, tokenizer, batch_size: int = 32):
+        self.tokenizer = tokenizer
+        self.batch_size = max(1, batch_size)
+
+    @abstractmethod
+    def _forward(self, ids: np.ndarray, mask: np.ndarray, types: np.ndarray) -> np.ndarray:
+        """last_hidden_state (lote, tokens, dim) do encoder."""
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        out = []
+        for i in range(0, len(texts), self.batch_size):
+            enc = self.tokenizer.encode_batch(texts[i:i + self.batch_size])
+            ids = np.array([e.ids for e in enc], dtype=np.int64)
+            mask = np.array([e.attention_mask for e in enc], dtype=np.int64)
+            types = np.array([e.type_ids for e in enc], dtype=np.int64)
+            out.append(mean_pool(self._forward(ids, mask, types), mask))
+        return np.concatenate(out) if out else np.zeros((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+class OnnxEmbeddings(EncoderEmbeddings):
+    """Modelo exportado para ONNX (fp32 ou int8 quantizado) rodando no onnxruntime, sem torch."""
+
+    def __init__(self, model_dir: str, file: str = "model.onnx", threads: int = 0,
+                 max_length: int = 256, batch_size: int = 32):
+        import onnxruntime as ort
+        super().__init__(load_tokenizer(model_dir, max_length), batch_size)
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(os.path.join(model_dir, "onnx", file), opts,
+                                            providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def _forward(self, ids, mask, types):
+        feed = {"input_ids": ids, "attention_mask": mask, "token_type_ids": types}
+        return self.session.run(None, {k: v for k, v in feed.items() if k in self._inputs})[0]
+
+_DTYPES = {"F32": np.float32, "F16": np.float16, "BF16": np.uint16}
+
+def read_safetensors(path: str) -> Dict[str, np.ndarray]:
+    """Lê um .safetensors com mmap (formato: u64 tamanho do header, header JSON, buffer)."""
+    with open(path, "rb") as f:
+        (n,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(n))
+    buf = np.memmap(path, dtype=np.uint8, mode="r", offset=8 + n)
+    tensors = {}
+    for name, meta in header.items():
+        if name == "__metadata__":
+            continue
+        start, end = meta["data_offsets"]
+        raw = buf[start:end].view(_DTYPES[meta["dtype"]])
+        if meta["dtype"] == "BF16":
+            raw = (raw.astype(np.uint32) << 16).view(np.float32)
+        tensors[name] = raw.reshape(meta["shape"]).astype(np.float32, copy=False)
+    return tensors
+
+def _erf(x: np.ndarray) -> np.ndarray:
+    # Abramowitz–Stegun 7.1.26 (erro < 1.5e-7): numpy não tem erf.
+    s = np.sign(x)
+    x = np.abs(x)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    y = 1.0 - (((((1.061405429 * t - 1.453152027) * t) + 1.421413741) * t - 0.284496736) * t
+                + 0.254829592) * t * np.exp(-x * x)
+    return s * y
+
+def _gelu(x: np.ndarray) -> np.ndarray:
+    return 0.5 * x * (1.0 + _erf(x / np.sqrt(2.0)).astype(x.dtype))
+
+def _layer_norm(x: np.ndarray, w: np.ndarray, b: np.ndarray, eps: float) -> np.ndarray:
+    mu = x.mean(axis=-1, keepdims=True)
+    var = ((x - mu) ** 2).mean(axis=-1, keepdims=True)
+    return (x - mu) / np.sqrt(var + eps) * w + b
+
+class NumpyEmbeddings(EncoderEmbeddings):
+    """
+    Forward do BERT (MiniLM) em NumPy puro sobre os pesos do model.safetensors:
+    sem torch nem onnxruntime, útil onde só há numpy. Mais lento que o ONNX.
+    """
+
+    def __init__(self, tokenizer, weights: Dict[str, np.ndarray], config: Dict,
+                 batch_size: int = 32):
+        super().__init__(tokenizer, batch_size)
+        self.w = {k[5:] if k.startswith("bert.") else k: v for k, v in weights.items()}
+        self.layers = int(config["num_hidden_layers"])
+        self.heads = int(config["num_attention_heads"])
+        self.eps = float(config.get("layer_norm_eps", 1e-12))
+
+    @classmethod
+    def from_dir(cls, model_dir: str, max_length: int = 256, batch_size: int = 32) -> "NumpyEmbeddings":
+        with open(os.path.join(model_dir, "config.json"), "r", encoding="utf-8") as f:
+            config = json.load(f)
+        max_length = min(max_length, int(config.get("max_position_embeddings", max_length)))
+        return cls(load_tokenizer(model_dir, max_length),
+                   read_safetensors(os.path.join(model_dir, "model.safetensors")), config, batch_size)
+
+    def _linear(self, x: np.ndarray, name: str) -> np.ndarray:
+        # Linear do torch guarda [saída, entrada]; o .T é só uma view sobre o mmap.
+        return x @ self.w[name + ".weight"].T + self.w[name + ".bias"]
+
+    def _forward(self, ids, mask, types):
+        w = self.w
+        n, length = ids.shape
+        x = (w["embeddings.word_embeddings.weight"][ids]
+             + w["embeddings.position_embeddings.weight"][:length][None]
+             + w["embeddings.token_type_embeddings.weight"][types])
+        x = _layer_norm(x, w["embeddings.LayerNorm.weight"], w["embeddings.LayerNorm.bias"], self.eps)
+        d = x.shape[-1] // self.heads
+        bias = ((1.0 - mask[:, None, None, :].astype(np.float32)) * -1e9).astype(np.float32)
+
+        def split(t):
+            return t.reshape(n, length, self.heads, d).transpose(0, 2, 1, 3)
+
+        for i in range(self.layers):
+            p = f"encoder.layer.{i}."
+            q = split(self._linear(x, p + "attention.self.query"))
+            k = split(self._linear(x, p + "attention.self.key"))
+            v = split(self._linear(x, p + "attention.self.value"))
+            scores = q @ k.transpose(0, 1, 3, 2) / np.sqrt(d) + bias
+            scores = np.exp(scores - scores.max(axis=-1, keepdims=True))
+            scores /= scores.sum(axis=-1, keepdims=True)
+            ctx = (scores @ v).transpose(0, 2, 1, 3).reshape(n, length, -1)
+            x = _layer_norm(x + self._linear(ctx, p + "attention.output.dense"),
+                            w[p + "attention.output.LayerNorm.weight"],
+                            w[p + "attention.output.LayerNorm.bias"], self.eps)
+            h = _gelu(self._linear(x, p + "intermediate.dense"))
+            x = _layer_norm(x + self._linear(h, p + "output.dense"),
+                            w[p + "output.LayerNorm.weight"], w[p + "output.LayerNorm.bias"], self.eps)
+        return x
+
+def _torch(model: str) -> Embeddings:
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=model)
+
+def create(model: str, name: Optional[str] = None) -> Embeddings:
+    """
+    Embeddings do backend configurado. `model` é o nome no Hub ou a pasta
+    local gravada pelo warmup; onnx/onnx-int8/numpy exigem a pasta local.
+    """
+    name = name or backend()
+    if name == "torch":
+        return _torch(model)
+    if not os.path.isdir(model):
+        raise FileNotFoundError(f"EMBEDDING_BACKEND={name} precisa do modelo local "
+                                f"(rode python -m app.rag.warmup); não achei {model!r}")
+    if name == "numpy":
+        return NumpyEmbeddings.from_dir(model, _max_length(), _batch_size())
+    threads = int(os.getenv("EMBEDDING_THREADS", "0") or "0")
+    return OnnxEmbeddings(model, onnx_file(name), threads, _max_length(), _batch_size())
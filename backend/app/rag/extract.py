@@ -0,0 +1,98 @@
+import re
+from typing import List, NamedTuple, Tuple
+
+SKIP = {"script", "style", "noscript", "template", "svg", "iframe", "head"}
+HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+BLOCKS = {"p", "div", "section", "article", "main", "header", "footer", "aside", "nav", "ul", "ol", "li",
+          "dl", "dt", "dd", "table", "thead", "tbody", "tr", "td", "th", "blockquote", "pre", "figure",
+          "figcaption", "br", "hr", "form", "details", "summary", *HEADINGS}
+_SPACE = re.compile(r"\s+")
+
+class Section(NamedTuple):
+    # Caminho dos títulos acima do trecho ("Taxas > Crédito"); vazio antes do primeiro título.
+    heading: str
+    # Uma linha por bloco; a primeira é o próprio título, quando há.
+    lines: Tuple[str, ...]
+
+class Page(NamedTuple):
+    title: str
+    text: str
+    sections: Tuple[Section, ...]
+
+def _container(root):
+    for tag in ("article", "main", "body"):
+        for el in root.iter(tag):
+            return el
+    return root
+
+def extract(html: str) -> Page:
+    """
+    Título, texto e seções (por título h1–h6) da página num único parse do
+    lxml: o conteúdo vem do <article> (ou <main>, ou <body>), sem
+    script/style, uma linha por bloco.
+    """
+    if not html or not html.strip():
+        return Page("", "", ())
+    try:
+        from lxml import etree, html as lxml_html
+        root = lxml_html.document_fromstring(html)
+    except Exception:
+        return _fallback(html)
+
+    title = _SPACE.sub(" ", root.findtext(".//title") or "").strip()
+    sections: List[Section] = []
+    stack: List[Tuple[int, str]] = []
+    lines: List[str] = []
+    buf: List[str] = []
+
+    def flush() -> str:
+        line = _SPACE.sub(" ", "".join(buf)).strip()
+        buf.clear()
+        return line
+
+    def close_section() -> None:
+        line = flush()
+        if line:
+            lines.append(line)
+        if lines:
+            sections.append(Section(" > ".join(t for _, t in stack), tuple(lines)))
+            lines.clear()
+
+    container = _container(root)
+    walker = etree.iterwalk(container, events=("start", "end"))
+    for event, el in walker:
+        tag = el.tag if isinstance(el.tag, str) else ""
+        if event == "start":
+            if tag in SKIP or not tag:
+                walker.skip_subtree()
+                continue
+            if tag in HEADINGS:
+                close_section()
+            elif tag in BLOCKS:
+                line = flush()
+                if line:
+                    lines.append(line)
+            if el.text:
+                buf.append(el.text)
+            continue
+        if tag in HEADINGS:
+            heading = flush()
+            if heading:
+                level = HEADINGS[tag]
+                stack = [(lv, t) for lv, t in stack if lv < level] + [(level, heading)]
+                lines.append(heading)
+        elif tag in BLOCKS:
+            line = flush()
+            if line:
+                lines.append(line)
+        if el.tail and el is not container:
+            buf.append(el.tail)
+    close_section()
+    text = "\n".join(line for s in sections for line in s.lines)
+    return Page(title, text, tuple(sections))
+
+def _fallback(html: str) -> Page:
+    txt = re.sub(r"(?is)<(script|style|noscript).*?>.*?(</\1>)", " ", html)
+    txt = re.sub(r"(?s)<[^>]+>", " ", txt)
+    txt = _SPACE.sub(" ", txt).strip()
+    return Page("", txt, (Section("", (txt,)),) if txt else ())
@@ -1,14 +1,31 @@
-import os, sys, time, json, typing as t, requests
+import os, sys, time, json, hashlib, threading, multiprocessing, typing as t, requests
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from urllib.parse import urlparse
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.documents import Document
 
 if __package__ is None:
     sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
+try:
+    from .store import mark_index_built, model_path
+    from .embeddings import create as create_embeddings, backend as embedding_backend
+    from .text import normalize_url
+    from .sparse import SparseIndex, SPARSE_DIR
+    from .dense import DenseIndex, DENSE_DIR
+    from .extract import extract
+    from . import chunking
+except ImportError:
+    from app.rag.store import mark_index_built, model_path
+    from app.rag.embeddings import create as create_embeddings, backend as embedding_backend
+    from app.rag.text import normalize_url
+    from app.rag.sparse import SparseIndex, SPARSE_DIR
+    from app.rag.dense import DenseIndex, DENSE_DIR
+    from app.rag.extract import extract
+    from app.rag import chunking
+
 def _try_import_pages() -> t.List[str]:
     try:
         from .pages_auto import PAGES
@@ -60,39 +77,280 @@ def load_pages() -> t.List[str]:
     ]
 
 def html_to_text(html: str) -> str:
-    try:
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(html, "lxml")
-        for tag in soup(["script","style","noscript"]):
-            tag.decompose()
-        main = soup.find("article") or soup.find("main") or soup
-        txt = main.get_text(separator="\n", strip=True)
-        lines = [ln.strip() for ln in txt.splitlines()]
-        return "\n".join([ln for ln in lines if ln])
-    except Exception:
-        import re
-        txt = re.sub(r"(?is)<(script|style|noscript).*?>.*?(</\1>)", " ", html)
-        txt = re.sub(r"(?s)<[^>]+>", " ", txt)
-        txt = re.sub(r"\s+", " ", txt).strip()
-        return txt
+    return extract(html).text
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; RAG-Indexer/1.0)",
+    "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8",
+}
+MANIFEST = "manifest.json"
+MIN_TEXT_CHARS = 80
+
+def _title_and_text(html: str) -> tuple[str, str]:
+    page = extract(html)
+    return page.title, page.text
 
 def fetch(url: str, timeout: int) -> tuple[str, str]:
-    headers = {
-        "User-Agent": "Mozilla/5.0 (compatible; RAG-Indexer/1.0)",
-        "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8",
-    }
-    r = requests.get(url, headers=headers, timeout=timeout)
+    r = requests.get(url, headers=HEADERS, timeout=timeout)
     r.raise_for_status()
-    html = r.text
-    title = ""
+    return _title_and_text(r.text)
+
+class HostRateLimiter:
+    """Espaça as requisições para no máximo `rps` por host, entre todas as threads."""
+
+    def __init__(self, rps: float):
+        self.interval = 1.0 / rps if rps > 0 else 0.0
+        self._next: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host: str) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, 0.0))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+@dataclass
+class FetchResult:
+    url: str
+    status: str  # ok | not_modified | error
+    title: str = ""
+    text: str = ""
+    etag: t.Optional[str] = None
+    last_modified: t.Optional[str] = None
+    hash: str = ""
+    error: str = ""
+    html: str = ""
+    # (texto, caminho de títulos) de cada chunk, preenchido por parse_page.
+    chunks: t.List[t.Tuple[str, str]] = field(default_factory=list)
+
+def parse_page(html: str, splitter) -> tuple:
+    """
+    Extrai (um parse só) e fatia a página: (título, texto, hash, chunks).
+    Roda nos processos do fetch_all; `splitter` é um chunking.TokenChunker
+    ou qualquer splitter com split_text.
+    """
+    page = extract(html)
+    if hasattr(splitter, "split_sections"):
+        chunks = splitter.split_sections(page.sections)
+    else:
+        chunks = [(c, "") for c in splitter.split_text(page.text)] if splitter is not None else []
+    return page.title, page.text, hashlib.sha256(page.text.encode("utf-8")).hexdigest(), chunks
+
+# Splitter de cada processo do fetch_all: chega uma vez no initializer, não a cada página.
+_SPLITTER = None
+
+def _init_parser(splitter) -> None:
+    global _SPLITTER
+    _SPLITTER = splitter
+
+def _parse_in_worker(html: str) -> tuple:
+    return parse_page(html, _SPLITTER)
+
+def make_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+def fetch_page(session: requests.Session, url: str, timeout: int, limiter: HostRateLimiter,
+               prev: t.Optional[dict] = None) -> FetchResult:
+    headers = {}
+    if prev and prev.get("etag"):
+        headers["If-None-Match"] = prev["etag"]
+    if prev and prev.get("last_modified"):
+        headers["If-Modified-Since"] = prev["last_modified"]
+    limiter.wait(urlparse(url).netloc)
     try:
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(html, "lxml")
-        if soup.title and soup.title.string:
-            title = soup.title.string.strip()
-    except Exception:
-        pass
-    return title, html_to_text(html)
+        r = session.get(url, headers=headers, timeout=timeout)
+        if r.status_code == 304:
+            return FetchResult(url, "not_modified")
+        r.raise_for_status()
+        return FetchResult(url, "ok", etag=r.headers.get("ETag"),
+                           last_modified=r.headers.get("Last-Modified"), html=r.text)
+    except Exception as e:
+        return FetchResult(url, "error", error=str(e))
+
+def fetch_all(urls: t.List[str], manifest: dict, timeout: int = 25, concurrency: int = 8,
+              rps: float = 4.0, splitter=None, workers: int = 1) -> t.List[FetchResult]:
+    """
+    Baixa em threads (I/O) e, conforme as páginas chegam, extrai e fatia em
+    `workers` processos (CPU); com workers=1, no próprio processo.
+    """
+    limiter = HostRateLimiter(rps)
+    # spawn, não fork: os processos nascem com as threads do fetch rodando (e locks possivelmente presos).
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_parser, initargs=(splitter,)) if workers > 1 else None
+    try:
+        with make_session(concurrency) as session, ThreadPoolExecutor(concurrency) as ex:
+            futures = {ex.submit(fetch_page, session, u, timeout, limiter, manifest.get(u)): i
+                       for i, u in enumerate(urls)}
+            results: t.List[t.Any] = [None] * len(urls)
+            jobs: dict = {}
+            for f in as_completed(futures):
+                res = results[futures[f]] = f.result()
+                if res.status == "ok":
+                    jobs[futures[f]] = pool.submit(_parse_in_worker, res.html) if pool else None
+        for i, job in jobs.items():
+            res = results[i]
+            res.title, res.text, res.hash, res.chunks = job.result() if job else parse_page(res.html, splitter)
+            res.html = ""
+        return results
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+def load_manifest(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(path: str, manifest: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def _chunk_ids(url: str, n: int) -> t.List[str]:
+    base = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    return [f"{base}-{i}" for i in range(n)]
+
+def chunker_version(splitter) -> str:
+    """Versão do chunker gravada em cada página do manifesto (splitters do LangChain: classe e tamanhos)."""
+    if hasattr(splitter, "version"):
+        return splitter.version
+    return (f"{type(splitter).__name__}|{getattr(splitter, '_chunk_size', '')}"
+            f"|{getattr(splitter, '_chunk_overlap', '')}")
+
+def _manifest_from_collection(vs: Chroma) -> dict:
+    """Manifesto mínimo (só chunk_ids por URL) a partir dos metadados da coleção; chunks sem URL ficam em ""."""
+    data = vs.get(include=["metadatas"])
+    manifest: dict = {}
+    for cid, md in zip(data["ids"], data["metadatas"]):
+        url = (md or {}).get("url") or (md or {}).get("source") or ""
+        manifest.setdefault(url, {"chunk_ids": []})["chunk_ids"].append(cid)
+    return manifest
+
+def sync_index(urls: t.List[str], vs: Chroma, splitter, manifest_path: str, timeout: int = 25,
+               concurrency: int = 8, rps: float = 4.0, full: bool = False, workers: int = 1) -> dict:
+    """
+    Atualiza a coleção só com o que mudou desde a última execução:
+    páginas com 304 ou mesmo hash de conteúdo são puladas, páginas alteradas têm
+    os chunks antigos substituídos e páginas que saíram da lista são apagadas.
+    Páginas fatiadas por outra versão do chunker são baixadas e fatiadas de novo.
+    """
+    manifest = {} if full else load_manifest(manifest_path)
+    if not manifest:
+        # Sem manifesto (primeira execução, índice legado ou FULL_REINDEX): refaz todas
+        # as páginas, mas os chunks antigos de cada uma só saem quando ela for baixada de novo.
+        manifest = _manifest_from_collection(vs)
+    chunker = chunker_version(splitter)
+    # Só as páginas da versão atual do chunker podem ser puladas (304 ou mesmo hash).
+    current = {u: e for u, e in manifest.items() if e.get("chunker") == chunker}
+    stale: t.List[str] = []
+
+    stats = {"changed": 0, "unchanged": 0, "removed": 0, "errors": 0, "short": 0}
+    new_manifest: dict = {}
+    docs: t.List[Document] = []
+    ids: t.List[str] = []
+    t0 = time.perf_counter()
+    results = fetch_all(urls, current, timeout=timeout, concurrency=concurrency, rps=rps,
+                        splitter=splitter, workers=workers)
+    stats["pages_per_s"] = round(len(results) / max(time.perf_counter() - t0, 1e-9), 1)
+    for i, res in enumerate(results, 1):
+        prev = manifest.get(res.url)
+        tag = f"[indexer] [{i}/{len(results)}]"
+        if res.status == "error":
+            stats["errors"] += 1
+            if prev:
+                new_manifest[res.url] = prev
+            print(f"{tag} ERROR {res.url} → {res.error}")
+            continue
+        if res.status == "not_modified" and res.url in current:
+            stats["unchanged"] += 1
+            new_manifest[res.url] = prev
+            continue
+        if not res.text or len(res.text) < MIN_TEXT_CHARS:
+            stats["short"] += 1
+            if prev:
+                stale.extend(prev.get("chunk_ids", []))
+            print(f"[indexer] WARN: short content → {res.url}")
+            continue
+        if res.url in current and prev.get("hash") == res.hash:
+            stats["unchanged"] += 1
+            new_manifest[res.url] = {**prev, "etag": res.etag, "last_modified": res.last_modified}
+            continue
+        if prev:
+            stale.extend(prev.get("chunk_ids", []))
+        chunks = res.chunks
+        cids = _chunk_ids(res.url, len(chunks))
+        meta = {"url": res.url, "norm_url": normalize_url(res.url), "title": res.title}
+        for ch, heading in chunks:
+            docs.append(Document(page_content=ch, metadata={**meta, "heading": heading}))
+        ids.extend(cids)
+        new_manifest[res.url] = {
+            "etag": res.etag, "last_modified": res.last_modified, "hash": res.hash,
+            "title": res.title, "chunk_ids": cids, "chunker": chunker,
+        }
+        stats["changed"] += 1
+        print(f"{tag} OK {res.url} → {len(chunks)} chunks")
+
+    if stats["errors"] == len(results) and manifest:
+        # Nenhuma página baixada (rede fora?): não apaga nada nem mexe no manifesto.
+        print("[indexer] WARN: no page fetched, keeping the collection as is")
+        stats.update(chunks_embedded=0, chunks_deleted=0)
+        return stats
+
+    current = set(urls)
+    for url, prev in manifest.items():
+        if url not in current:
+            stale.extend(prev.get("chunk_ids", []))
+            stats["removed"] += 1
+            print(f"[indexer] REMOVED {url}")
+
+    stale = list(dict.fromkeys(stale))
+    if stale:
+        vs.delete(ids=stale)
+    if docs:
+        print(f"[indexer] building embeddings for {len(docs)} chunks ...")
+        vs.add_documents(docs, ids=ids)
+    save_manifest(manifest_path, new_manifest)
+    stats["chunks_embedded"] = len(docs)
+    stats["chunks_deleted"] = len(stale)
+    return stats
+
+def build_sparse(vs: Chroma, persist_dir: str) -> SparseIndex:
+    """Reconstrói o índice BM25 a partir de todos os chunks da coleção."""
+    data = vs.get(include=["documents"])
+    index = SparseIndex.build(data["ids"], data["documents"])
+    index.save(os.path.join(persist_dir, SPARSE_DIR))
+    return index
+
+def build_dense(vs: Chroma, persist_dir: str) -> DenseIndex:
+    """
+    Exporta os embeddings da coleção para o índice mmap (VECTOR_STORE=dense).
+    DENSE_DTYPE escolhe float32/float16; a partir de DENSE_IVF_MIN chunks vira IVF.
+    """
+    data = vs.get(include=["embeddings", "documents", "metadatas"])
+    if not data["ids"]:
+        print("[indexer] WARN: empty collection, writing an empty dense index")
+    index = DenseIndex.build(
+        data["ids"], data["embeddings"], data["documents"], data["metadatas"],
+        dtype=os.getenv("DENSE_DTYPE", "float32") or "float32",
+        ivf_min=int(os.getenv("DENSE_IVF_MIN", "4096") or "4096"),
+        embedding=vs.embeddings,
+    )
+    index.save(os.path.join(persist_dir, DENSE_DIR))
+    return index
 
 def main():
     pages = load_pages()
@@ -120,51 +378,45 @@ def main():
     persist_dir = os.getenv("PERSIST_DIR") or os.path.join(os.path.dirname(__file__), "chroma_db")
     timeout = int(os.getenv("TIMEOUT","25") or "25")
     emb_model = os.getenv("EMBEDDING_MODEL") or "all-MiniLM-L6-v2"
+    concurrency = int(os.getenv("FETCH_CONCURRENCY","8") or "8")
+    rps = float(os.getenv("RATE_LIMIT_RPS","4") or "4")
+    full = (os.getenv("FULL_REINDEX","0") or "0") == "1"
+    workers = int(os.getenv("INDEX_WORKERS", "0") or "0") or (os.cpu_count() or 1)
 
     print(f"[indexer] URLs={len(filtered)} | collection={collection} | persist={persist_dir}")
-    print(f"[indexer] EMBEDDING_MODEL={emb_model}")
+    print(f"[indexer] EMBEDDING_MODEL={emb_model} ({embedding_backend()}) | concurrency={concurrency} | rps/host={rps}")
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1500,
-        chunk_overlap=200,
-        separators=["\n\n","\n",". "," ",""]
-    )
-    docs: t.List[Document] = []
-    ok=err=0
-
-    for i, url in enumerate(filtered, 1):
-        try:
-            title, text = fetch(url, timeout)
-            if not text or len(text) < 80:
-                print(f"[indexer] WARN: short content → {url}")
-                continue
-            chunks = splitter.split_text(text)
-            for ch in chunks:
-                docs.append(Document(page_content=ch, metadata={"url": url, "title": title}))
-            ok += 1
-            print(f"[indexer] [{i}/{len(filtered)}] OK {url} → {len(chunks)} chunks")
-        except Exception as e:
-            err += 1
-            print(f"[indexer] [{i}/{len(filtered)}] ERROR {url} → {e}")
-
-    if not docs:
-        print("[indexer] ERROR: 0 chunks produced."); sys.exit(2)
-
-    print(f"[indexer] building embeddings for {len(docs)} chunks ...")
+    splitter = chunking.for_model(model_path(emb_model))
+    print(f"[indexer] chunks up to {splitter.max_tokens} tokens, overlap {splitter.overlap} "
+          f"({type(splitter.counter).__name__}) | workers={workers}")
     t0 = time.time()
-    emb = HuggingFaceEmbeddings(model_name=emb_model)
-    vs = Chroma.from_documents(
-        documents=docs,
-        embedding=emb,
+    emb = create_embeddings(model_path(emb_model))
+    vs = Chroma(
+        embedding_function=emb,
         collection_name=collection,
         persist_directory=persist_dir,
     )
-    try:
-        vs.persist()
-    except Exception:
-        pass
+    stats = sync_index(filtered, vs, splitter, os.path.join(persist_dir, MANIFEST),
+                       timeout=timeout, concurrency=concurrency, rps=rps, full=full, workers=workers)
+    total = len(vs.get(include=[])["ids"])
+    if not total:
+        print("[indexer] ERROR: 0 chunks produced."); sys.exit(2)
+
+    changed = bool(stats["changed"] or stats["removed"] or stats["chunks_deleted"])
+    if changed or not os.path.exists(os.path.join(persist_dir, SPARSE_DIR)):
+        changed = True
+        sp = build_sparse(vs, persist_dir)
+        print(f"[indexer] BM25 index: {sp.n} chunks, {len(sp.vocab)} terms")
+    if (os.getenv("DENSE_INDEX", "1") or "1") == "1" and (
+            changed or not os.path.exists(os.path.join(persist_dir, DENSE_DIR))):
+        changed = True
+        dn = build_dense(vs, persist_dir)
+        print(f"[indexer] dense index: {dn.n} chunks, {'IVF' if dn.centroids is not None else 'flat'}")
+    if changed:
+        version = mark_index_built(persist_dir)
+        print(f"[indexer] index version={version}")
     dt = int((time.time()-t0)*1000)
-    print(f"[indexer] DONE: {len(docs)} chunks from {ok} pages (errors={err}) in {dt} ms.")
+    print(f"[indexer] DONE: {stats} | {total} chunks in collection | {dt} ms.")
     print(f"[indexer] store at: {persist_dir}")
 
 if __name__ == "__main__":
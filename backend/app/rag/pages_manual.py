@@ -1,4 +1,6 @@
-import sys, time, argparse
+import sys, time, json, codecs, random, asyncio, argparse
+from dataclasses import dataclass, asdict
+from html.parser import HTMLParser
 from urllib.parse import urljoin, urlparse, urlunparse, parse_qs, urlencode
 import requests
 from bs4 import BeautifulSoup
@@ -55,6 +57,120 @@ def collect_all_articles() -> list[str]:
             if "/collections/" in lk: to_visit.add(lk)
     return sorted(articles)
 
+class LinkExtractor(HTMLParser):
+    """Extrai hrefs de <a> à medida que o HTML chega, sem montar a árvore."""
+
+    def __init__(self, base: str):
+        super().__init__(convert_charrefs=True)
+        self.base = base
+        self.links: set[str] = set()
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a":
+            return
+        for name, value in attrs:
+            if name == "href" and value:
+                href = urljoin(self.base, value)
+                if urlparse(href).netloc == DOMAIN:
+                    self.links.add(normalize(href))
+                return
+
+@dataclass
+class CrawlStats:
+    pages: int = 0
+    bytes: int = 0
+    retries: int = 0
+    errors: int = 0
+    skipped_depth: int = 0
+    elapsed_s: float = 0.0
+
+    def report(self) -> dict:
+        out = asdict(self)
+        out["pages_per_s"] = round(self.pages / self.elapsed_s, 2) if self.elapsed_s else 0.0
+        out["elapsed_s"] = round(self.elapsed_s, 3)
+        return out
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+async def http_links(client, url: str, stats: CrawlStats, retries: int = 4,
+                     backoff: float = 0.5, max_backoff: float = 10.0):
+    """GET em streaming alimentando o LinkExtractor; backoff exponencial com jitter."""
+    for attempt in range(retries):
+        try:
+            async with client.stream("GET", url) as r:
+                if r.status_code == 200:
+                    parser = LinkExtractor(url)
+                    decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")(errors="replace")
+                    async for chunk in r.aiter_bytes():
+                        stats.bytes += len(chunk)
+                        parser.feed(decoder.decode(chunk))
+                    parser.feed(decoder.decode(b"", final=True))
+                    parser.close()
+                    stats.pages += 1
+                    return parser.links
+                if r.status_code not in RETRY_STATUS:
+                    stats.errors += 1
+                    return None
+        except Exception:
+            pass
+        if attempt + 1 < retries:
+            stats.retries += 1
+            delay = min(max_backoff, backoff * (2 ** attempt))
+            await asyncio.sleep(random.uniform(0, delay))
+    stats.errors += 1
+    return None
+
+async def crawl_async(start: str = BASE, concurrency: int = 8, max_depth: int = 50,
+                      max_pages: int = 5000, client=None):
+    """
+    Mesmo resultado de collect_all_articles, com uma fila de fronteira e
+    `concurrency` workers compartilhando um httpx.AsyncClient (keep-alive).
+    Retorna (artigos ordenados, CrawlStats).
+    """
+    import httpx
+    stats = CrawlStats()
+    t0 = time.perf_counter()
+    own = client is None
+    if own:
+        client = httpx.AsyncClient(
+            headers=HEADERS, timeout=25, follow_redirects=True,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+    frontier: asyncio.Queue = asyncio.Queue()
+    seen, articles = {start}, set()
+    frontier.put_nowait((start, 0))
+
+    async def worker():
+        while True:
+            url, depth = await frontier.get()
+            try:
+                if stats.pages >= max_pages:
+                    continue
+                links = await http_links(client, url, stats)
+                for lk in links or ():
+                    if "/articles/" in lk and depth > 0:
+                        articles.add(lk)
+                    if "/collections/" in lk and lk not in seen:
+                        if depth + 1 > max_depth:
+                            stats.skipped_depth += 1
+                            continue
+                        seen.add(lk)
+                        frontier.put_nowait((lk, depth + 1))
+            finally:
+                frontier.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    try:
+        await frontier.join()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        if own:
+            await client.aclose()
+    stats.elapsed_s = time.perf_counter() - t0
+    return sorted(articles), stats
+
 def write_pages_py(urls: list[str], out_path: str):
     with open(out_path, "w", encoding="utf-8") as f:
         f.write("PAGES = [\n")
@@ -73,8 +189,25 @@ def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--out", default="app/rag/pages_auto.py")
     ap.add_argument("--json", default="")
+    ap.add_argument("--async", dest="use_async", action="store_true",
+                    help="crawler assíncrono (fronteira + workers concorrentes)")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--max-depth", type=int, default=50)
+    ap.add_argument("--max-pages", type=int, default=5000)
+    ap.add_argument("--stats", default="", help="grava o relatório do crawl (JSON) neste caminho")
     args = ap.parse_args()
-    urls = collect_all_articles()
+    if args.use_async:
+        urls, stats = asyncio.run(crawl_async(
+            concurrency=args.concurrency, max_depth=args.max_depth, max_pages=args.max_pages))
+        report = stats.report()
+        if not stats.pages:
+            print("ERRO: não consegui baixar a home.", file=sys.stderr); sys.exit(2)
+        print(f"[OK] crawl: {report}")
+        if args.stats:
+            with open(args.stats, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+    else:
+        urls = collect_all_articles()
     if not urls:
         print("ATENÇÃO: 0 URLs encontradas.", file=sys.stderr); sys.exit(1)
     write_pages_py(urls, args.out)
@@ -0,0 +1,113 @@
+import os, json, math, shutil
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from .text import tokenize
+
+SPARSE_DIR = "sparse"
+
+class SparseIndex:
+    """
+    Índice invertido BM25 sobre os chunks, com os mesmos tokens de `tokenize`.
+    Postings ficam em arrays contíguos (offsets/docs/tf) salvos como .npy e
+    abertos com mmap, então várias réplicas/processos compartilham as páginas.
+    """
+
+    def __init__(self, ids: List[str], terms: List[str], offsets: np.ndarray, docs: np.ndarray,
+                 tf: np.ndarray, doc_len: np.ndarray, k1: float = 1.2, b: float = 0.75):
+        self.ids = ids
+        self.vocab: Dict[str, int] = {t: i for i, t in enumerate(terms)}
+        self.offsets = offsets
+        self.docs = docs
+        self.tf = tf
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self.n = len(ids)
+        self.avgdl = float(doc_len.mean()) if self.n else 0.0
+
+    @classmethod
+    def build(cls, ids: Sequence[str], texts: Sequence[str], k1: float = 1.2, b: float = 0.75) -> "SparseIndex":
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_len = np.zeros(len(ids), dtype=np.float32)
+        for i, text in enumerate(texts):
+            counts = Counter(tokenize(text or ""))
+            doc_len[i] = sum(counts.values())
+            for term, c in counts.items():
+                postings.setdefault(term, []).append((i, c))
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for j, term in enumerate(terms):
+            offsets[j + 1] = offsets[j] + len(postings[term])
+        docs = np.empty(int(offsets[-1]), dtype=np.uint32)
+        tf = np.empty(int(offsets[-1]), dtype=np.uint16)
+        for j, term in enumerate(terms):
+            plist = postings[term]
+            docs[offsets[j]:offsets[j + 1]] = [d for d, _ in plist]
+            tf[offsets[j]:offsets[j + 1]] = [min(c, 65535) for _, c in plist]
+        return cls(list(ids), terms, offsets, docs, tf, doc_len, k1=k1, b=b)
+
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        terms = sorted(self.vocab, key=self.vocab.get)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "terms": terms, "k1": self.k1, "b": self.b}, f, ensure_ascii=False)
+        for name in ("offsets", "docs", "tf", "doc_len"):
+            np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(getattr(self, name)))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "SparseIndex":
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        mode = "r" if mmap else None
+        arrays = {n: np.load(os.path.join(path, f"{n}.npy"), mmap_mode=mode)
+                  for n in ("offsets", "docs", "tf", "doc_len")}
+        return cls(meta["ids"], meta["terms"], k1=meta["k1"], b=meta["b"], **arrays)
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        if not self.n:
+            return []
+        scores = np.zeros(self.n, dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query or "")):
+            j = self.vocab.get(term)
+            if j is None:
+                continue
+            lo, hi = int(self.offsets[j]), int(self.offsets[j + 1])
+            docs = self.docs[lo:hi]
+            tf = self.tf[lo:hi].astype(np.float32)
+            idf = math.log(1.0 + (self.n - (hi - lo) + 0.5) / ((hi - lo) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[docs] / self.avgdl)
+            scores[docs] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+            matched = True
+        if not matched:
+            return []
+        k = min(k, self.n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+def load(persist_dir: str) -> Optional[SparseIndex]:
+    path = os.path.join(persist_dir, SPARSE_DIR)
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    return SparseIndex.load(path)
+
+def rrf_fuse(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """Reciprocal-rank fusion: soma 1/(k + posição) de cada lista."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda d: -scores[d])
+
+def is_confident(hits: List[Tuple[str, float]], min_score: float, margin: float) -> bool:
+    """BM25 decide sozinho quando o 1º colocado é forte e se destaca do 2º."""
+    if not hits or hits[0][1] < min_score:
+        return False
+    return len(hits) == 1 or hits[0][1] >= hits[1][1] * margin
@@ -1,6 +1,17 @@
-import os
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+import os, threading, time, uuid
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from ..core.timing import span
+from . import batcher, dense, embeddings, sparse
+
+if TYPE_CHECKING:
+    # chromadb/langchain_chroma e sentence-transformers só carregam no warmup do store.
+    from langchain_chroma import Chroma
+    from langchain_core.vectorstores import VectorStore
+
+# Arquivo gravado pelo indexer a cada rebuild; seu conteúdo é a versão do índice.
+INDEX_MARKER = ".index_version"
 
 def _persist_dir() -> str:
     return os.getenv("PERSIST_DIR", os.path.join(os.path.dirname(__file__), "chroma_db"))
@@ -8,22 +19,352 @@ def _persist_dir() -> str:
 def _collection() -> str:
     return (os.getenv("COLLECTION_NAME", "infinitepay") or "infinitepay").strip()
 
+def _model_name() -> str:
+    return os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+def _model_dir() -> str:
+    return os.getenv("EMBEDDING_MODEL_DIR", "")
+
+def model_path(name: Optional[str] = None) -> str:
+    """Cópia local gravada pelo warmup (EMBEDDING_MODEL_DIR/<modelo>) se existir; senão o nome no Hub."""
+    name = name or _model_name()
+    base = _model_dir()
+    if base:
+        local = os.path.join(base, name.replace("/", "__"))
+        if os.path.isdir(local):
+            return local
+    return name
+
+def _check_interval() -> float:
+    return float(os.getenv("STORE_RELOAD_CHECK_S", "2") or "2")
+
+def _rag_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)) or str(default))
+
+def _rag_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)) or str(default))
+
 def _embedding():
-    model = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
-    return HuggingFaceEmbeddings(model_name=model)
+    return embeddings.create(model_path())
+
+def _vector_store() -> str:
+    """VECTOR_STORE: chroma (padrão) ou dense (matriz mmap gerada pelo indexer, sem chromadb)."""
+    kind = (os.getenv("VECTOR_STORE", "chroma") or "chroma").strip().lower()
+    if kind not in ("chroma", "dense"):
+        raise ValueError(f"VECTOR_STORE inválido: {kind!r} (use chroma ou dense)")
+    return kind
 
-def get_store() -> Chroma:
-    persist_dir = _persist_dir()
-    collection = _collection()
-    emb = _embedding()
+def open_store(persist_dir: str, collection: str, emb) -> "Chroma":
+    from langchain_chroma import Chroma
     return Chroma(
         embedding_function=emb,
         collection_name=collection,
         persist_directory=persist_dir,
     )
 
+def mark_index_built(persist_dir: Optional[str] = None) -> str:
+    """Grava uma nova versão do índice; réplicas com o store aquecido recarregam."""
+    persist_dir = persist_dir or _persist_dir()
+    os.makedirs(persist_dir, exist_ok=True)
+    version = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    with open(os.path.join(persist_dir, INDEX_MARKER), "w", encoding="utf-8") as f:
+        f.write(version)
+    return version
+
+def _read_marker(persist_dir: str) -> str:
+    try:
+        with open(os.path.join(persist_dir, INDEX_MARKER), "r", encoding="utf-8") as f:
+            return f.read().strip() or "0"
+    except OSError:
+        return "0"
+
+class WarmStore:
+    """
+    Mantém o modelo de embeddings e o vector store (Chroma ou DenseIndex,
+    conforme VECTOR_STORE) carregados no processo.
+    A cada STORE_RELOAD_CHECK_S segundos confere PERSIST_DIR/COLLECTION_NAME/
+    EMBEDDING_MODEL e a versão do índice; se algo mudou, recarrega.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._emb = None
+        self._emb_model: Optional[str] = None
+        self._store: Optional["VectorStore"] = None
+        self._sparse: Optional[sparse.SparseIndex] = None
+        self._key: Optional[Tuple[str, str, str, str, str]] = None
+        self._checked = 0.0
+        self.loaded_at: Optional[float] = None
+        self.load_ms: Optional[int] = None
+        self.last_error: Optional[str] = None
+
+    def _current_key(self) -> Tuple[str, str, str, str, str]:
+        persist_dir = _persist_dir()
+        model = f"{_model_name()}@{embeddings.backend()}"
+        return (persist_dir, _collection(), model, _read_marker(persist_dir), _vector_store())
+
+    def _load(self, key: Tuple[str, str, str, str, str], probe: bool = True) -> None:
+        t0 = time.perf_counter()
+        persist_dir, collection, model, _, kind = key
+        try:
+            if self._emb is None or self._emb_model != model:
+                old = self._emb
+                # Consultas concorrentes são codificadas em lote (EMBED_BATCH_MAX/EMBED_BATCH_WAIT_MS).
+                self._emb = batcher.wrap(_embedding())
+                self._emb_model = model
+                if isinstance(old, batcher.BatchedEmbeddings):
+                    old.close()
+            if kind == "dense":
+                vs = dense.load(persist_dir, self._emb, nprobe=_rag_int("DENSE_NPROBE", 8))
+                if vs is None:
+                    raise FileNotFoundError(f"VECTOR_STORE=dense sem {dense.DENSE_DIR}/ em {persist_dir} (rode o indexer)")
+                self._store = vs
+            else:
+                self._store = open_store(persist_dir, collection, self._emb)
+            self._sparse = sparse.load(persist_dir)
+            if probe:
+                # Consulta de aquecimento antes de ficar pronto: o primeiro /chat não paga a inicialização do modelo.
+                self._emb.embed_query("warmup")
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            raise
+        self._key = key
+        self.loaded_at = time.time()
+        self.load_ms = int((time.perf_counter()-t0)*1000)
+        self.last_error = None
+
+    def get(self) -> "VectorStore":
+        store = self._store
+        now = time.monotonic()
+        if store is not None and now - self._checked < _check_interval():
+            return store
+        key = self._current_key()
+        self._checked = now
+        if store is not None and key == self._key:
+            return store
+        with self._lock:
+            if self._store is None or self._key != key:
+                self._load(key)
+            return self._store
+
+    @property
+    def embeddings(self):
+        self.get()
+        return self._emb
+
+    @property
+    def sparse(self) -> Optional[sparse.SparseIndex]:
+        return self._sparse
+
+    @property
+    def version(self) -> str:
+        return self._key[3] if self._key else _read_marker(_persist_dir())
+
+    def reload(self) -> "VectorStore":
+        with self._lock:
+            self._load(self._current_key())
+            self._checked = time.monotonic()
+            return self._store
+
+    def preload(self) -> None:
+        """
+        No master, antes do fork: carrega modelo e índice sem rodar inferência
+        (OpenMP/onnxruntime não atravessam fork), para os workers herdarem as
+        páginas por copy-on-write. Backends ONNX carregam em cada worker.
+        """
+        key = self._current_key()
+        if key[2].endswith(("@onnx", "@onnx-int8")):
+            return
+        with self._lock:
+            self._load(key, probe=False)
+
+    def after_fork(self) -> None:
+        """
+        No worker: o modelo herdado do master fica (compartilhado); batcher e
+        store reabrem no warmup do worker: o Chroma tem SQLite e threads, e o
+        índice denso só remapeia os mesmos arquivos.
+        """
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        if isinstance(self._emb, batcher.BatchedEmbeddings):
+            self._emb = batcher.wrap(self._emb.base)
+        self._store = None
+        self._key = None
+
+    @property
+    def ready(self) -> bool:
+        return self._store is not None
+
+    def status(self) -> Dict[str, Any]:
+        key = self._key or (None, None, None, None, None)
+        return {
+            "ready": self.ready,
+            "persist_dir": key[0],
+            "collection": key[1],
+            "embedding_model": key[2],
+            "index_version": key[3],
+            "vector_store": key[4],
+            "loaded_at": self.loaded_at,
+            "load_ms": self.load_ms,
+            "error": self.last_error,
+            "sparse_chunks": self._sparse.n if self._sparse is not None else None,
+            "embed_batcher": self._emb.batcher.stats() if isinstance(self._emb, batcher.BatchedEmbeddings) else None,
+        }
+
+_warm = WarmStore()
+
+def _after_fork() -> None:
+    _warm.after_fork()
+
+os.register_at_fork(after_in_child=_after_fork)
+
+def warmup() -> "VectorStore":
+    return _warm.get()
+
+def preload() -> None:
+    _warm.preload()
+
+def reload() -> "VectorStore":
+    return _warm.reload()
+
+def is_ready() -> bool:
+    return _warm.ready
+
+def status() -> Dict[str, Any]:
+    return _warm.status()
+
+def index_version() -> str:
+    return _warm.version
+
+def embed_query(text: str):
+    with span("embed"):
+        return _warm.embeddings.embed_query(text)
+
+def embed_queries(texts: List[str]) -> List[List[float]]:
+    """Várias consultas num único forward (embed_documents direto, sem o micro-batcher)."""
+    with span("embed"):
+        return _warm.embeddings.embed_documents(list(texts)) if texts else []
+
+def get_store() -> "VectorStore":
+    return _warm.get()
+
 def retriever(k: int = 4):
     return get_store().as_retriever(search_kwargs={"k": k})
 
 def similarity_search(query: str, k: int = 4):
     return get_store().similarity_search(query, k=k)
+
+def similarity_search_by_vector(vector, k: int = 4):
+    return get_store().similarity_search_by_vector(vector, k=k)
+
+def keyword_hits(query: str, k: int = 4):
+    """Ids dos chunks pelo BM25 quando ele é confiante o bastante; senão None."""
+    sp = _warm.sparse
+    if sp is None or _rag_int("BM25_FASTPATH", 1) != 1:
+        return None
+    hits = sp.search(query, k=max(k, 2))
+    if not sparse.is_confident(hits, _rag_float("BM25_MIN_SCORE", 6.0), _rag_float("BM25_MARGIN", 1.5)):
+        return None
+    return [doc_id for doc_id, _ in hits[:k]]
+
+def keyword_confident(query: str) -> bool:
+    return keyword_hits(query) is not None
+
+def hybrid_search(query: str, k: int = 4, vector=None):
+    """
+    Retorna (docs, modo). Sem índice esparso: busca vetorial pura ("vector").
+    BM25 confiante: só palavras-chave, sem embedding ("bm25"). Caso contrário,
+    BM25 e vetores são combinados por reciprocal-rank fusion ("hybrid").
+    """
+    vs = get_store()
+    sp = _warm.sparse
+    if sp is None:
+        if vector is None:
+            vector = embed_query(query)
+        with span("search"):
+            return vs.similarity_search_by_vector(vector, k=k), "vector"
+
+    with span("search"):
+        ids = keyword_hits(query, k)
+        if ids is not None:
+            return _ordered(vs.get_by_ids(ids), ids), "bm25"
+
+    depth = max(k, _rag_int("RRF_DEPTH", 20))
+    if vector is None:
+        vector = embed_query(query)
+    with span("search"):
+        vdocs = vs.similarity_search_by_vector(vector, k=depth)
+        return _fuse(vs, sp, query, vdocs, k, depth), "hybrid"
+
+def rerank_ids(vector, ids: List[str], k: int = 4):
+    """
+    [(doc, cosseno)] dos chunks `ids` pelo vetor, melhor primeiro: o re-rank
+    dos candidatos de uma conversa, sem busca no índice inteiro.
+    """
+    if not ids:
+        return []
+    vs = get_store()
+    with span("search"):
+        if isinstance(vs, dense.DenseIndex):
+            return vs.rank_ids(vector, ids, k)
+        data = vs.get(ids=list(ids), include=["embeddings", "documents", "metadatas"])
+        if not len(data["ids"]):
+            return []
+        m = np.asarray(data["embeddings"], dtype=np.float32)
+        m /= np.linalg.norm(m, axis=1, keepdims=True).clip(min=1e-12)
+        q = np.asarray(vector, dtype=np.float32)
+        scores = m @ (q / (np.linalg.norm(q) or 1.0))
+        order = np.argsort(-scores)[:k]
+        return [(Document(page_content=data["documents"][i] or "", metadata=data["metadatas"][i] or {},
+                          id=data["ids"][i]), float(scores[i])) for i in order]
+
+def _fuse(vs, sp: sparse.SparseIndex, query: str, vdocs, k: int, depth: int):
+    sparse_ids = [doc_id for doc_id, _ in sp.search(query, k=depth)]
+    fused = sparse.rrf_fuse([[d.id for d in vdocs], sparse_ids], k=_rag_int("RRF_K", 60))[:k]
+    by_id = {d.id: d for d in vdocs}
+    missing = [i for i in fused if i not in by_id]
+    if missing:
+        by_id.update({d.id: d for d in vs.get_by_ids(missing)})
+    return [by_id[i] for i in fused if i in by_id]
+
+def _search_many(vs, vectors, k: int):
+    """
+    Busca vetorial de várias consultas: um produto matriz × matriz no
+    DenseIndex; no Chroma, uma consulta por vetor pela API pública do wrapper.
+    """
+    if not vectors:
+        return []
+    if isinstance(vs, dense.DenseIndex):
+        return vs.similarity_search_by_vectors(vectors, k=k)
+    return [vs.similarity_search_by_vector(list(v), k=k) for v in vectors]
+
+def hybrid_search_many(queries: List[str], k: int = 4, vectors: Optional[List] = None):
+    """
+    hybrid_search para um lote: BM25 por consulta, um único forward para as
+    que ainda não têm embedding e uma única busca vetorial para todas.
+    Retorna [(docs, modo), ...] na ordem das consultas.
+    """
+    vs = get_store()
+    sp = _warm.sparse
+    vectors = list(vectors) if vectors is not None else [None] * len(queries)
+    out: List[Any] = [None] * len(queries)
+    pending = []
+    with span("search"):
+        for i, q in enumerate(queries):
+            ids = keyword_hits(q, k) if sp is not None else None
+            if ids is not None:
+                out[i] = (_ordered(vs.get_by_ids(ids), ids), "bm25")
+            else:
+                pending.append(i)
+    todo = [i for i in pending if vectors[i] is None]
+    for i, vec in zip(todo, embed_queries([queries[i] for i in todo])):
+        vectors[i] = vec
+    depth = k if sp is None else max(k, _rag_int("RRF_DEPTH", 20))
+    with span("search"):
+        for i, vdocs in zip(pending, _search_many(vs, [vectors[i] for i in pending], depth)):
+            out[i] = (vdocs[:k], "vector") if sp is None else (_fuse(vs, sp, queries[i], vdocs, k, depth), "hybrid")
+    return out
+
+def _ordered(docs, ids):
+    by_id = {d.id: d for d in docs}
+    return [by_id[i] for i in ids if i in by_id]
@@ -0,0 +1,35 @@
+import re
+from functools import lru_cache
+from typing import List
+from urllib.parse import urlparse, urlunparse
+
+STOPWORDS_PT = {
+    "a","o","os","as","um","uma","de","da","do","das","dos","em","no","na","nos","nas",
+    "para","por","com","e","ou","se","que","qual","quais","como","quando","onde","porque",
+    "porquê","sobre","ao","à","às","aos","minha","meu","meus","minhas","sua","seu","seus",
+    "suas","esse","essa","isso","este","esta","isto","aquele","aquela","aquilo","já","não",
+    "sim","também","mais","menos","até","sem","muito","pouco"
+}
+STOPWORDS_EN = {
+    "the","a","an","and","or","to","for","of","in","on","at","by","with","from","as","is",
+    "are","be","been","this","that","these","those","it","its","your","you","we","our"
+}
+STOPWORDS = STOPWORDS_PT | STOPWORDS_EN
+_NON_WORD = re.compile(r"[^0-9a-zá-úà-ùâ-ûã-õç]+", re.IGNORECASE)
+
+@lru_cache(maxsize=8192)
+def normalize_url(u: str) -> str:
+    """URL sem query/fragment e sem barra final; chave do allowlist de fontes."""
+    if not u:
+        return ""
+    p = urlparse(u)
+    p = p._replace(query="", fragment="")
+    norm = urlunparse(p)
+    if norm.endswith("/"):
+        norm = norm[:-1]
+    return norm
+
+def tokenize(text: str) -> List[str]:
+    text = text.lower()
+    text = _NON_WORD.sub(" ", text)
+    return [t for t in text.split() if t and t not in STOPWORDS and len(t) > 1]
@@ -0,0 +1,72 @@
+"""
+Aquece a imagem do backend no build: grava o modelo de embeddings em
+EMBEDDING_MODEL_DIR (pesos torch/safetensors e os ONNX fp32/int8; o store
+carrega dali, sem Hub) e confere o índice carregando o store com o
+EMBEDDING_BACKEND configurado. Com --index roda o indexer
+antes quando o índice ainda não existe; sem o índice denso (dense/), exporta
+o do Chroma.
+
+    python -m app.rag.warmup --model-dir /app/models [--index]
+"""
+import os, sys, json, time, argparse
+
+if __package__ is None:
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+try:
+    from . import dense, store
+except ImportError:
+    from app.rag import dense, store
+
+def _indexer():
+    try:
+        from . import indexer
+    except ImportError:
+        from app.rag import indexer
+    return indexer
+
+# Só o necessário para os backends (torch, onnx, onnx-int8, numpy): sem pesos TF/Flax/OpenVINO.
+MODEL_FILES = ["*.json", "*.txt", "1_Pooling/*", "model.safetensors", "onnx/model.onnx",
+               "onnx/model_quint8_avx2.onnx"]
+
+def _repo_id(name: str) -> str:
+    return name if "/" in name else f"sentence-transformers/{name}"
+
+def save_model(name: str, model_dir: str) -> str:
+    """Baixa o modelo do Hub (ou do cache do HF) para model_dir/<modelo>, pasta que o store usa."""
+    from huggingface_hub import snapshot_download
+    path = os.path.join(model_dir, name.replace("/", "__"))
+    os.makedirs(model_dir, exist_ok=True)
+    snapshot_download(_repo_id(name), local_dir=path, allow_patterns=MODEL_FILES)
+    print(f"[warmup] model {name} saved to {path}")
+    return path
+
+def _has_index(persist_dir: str) -> bool:
+    return os.path.exists(os.path.join(persist_dir, "chroma.sqlite3"))
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pre-warm the embedding model and index for the backend image.")
+    ap.add_argument("--model-dir", default=os.getenv("EMBEDDING_MODEL_DIR") or "/app/models")
+    ap.add_argument("--index", action="store_true", help="run the indexer when there is no index yet")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    save_model(store._model_name(), args.model_dir)
+    os.environ["EMBEDDING_MODEL_DIR"] = args.model_dir
+
+    persist_dir = store._persist_dir()
+    if not _has_index(persist_dir):
+        if not args.index:
+            print(f"[warmup] ERROR: no index at {persist_dir} (use --index to build it)"); sys.exit(1)
+        _indexer().main()
+    if not os.path.exists(os.path.join(persist_dir, dense.DENSE_DIR)):
+        # Índice antigo, só com o Chroma: exporta a matriz mmap para VECTOR_STORE=dense.
+        vs = store.open_store(persist_dir, store._collection(), store._embedding())
+        print(f"[warmup] dense index: {_indexer().build_dense(vs, persist_dir).n} chunks")
+
+    store.warmup()
+    print(f"[warmup] store: {json.dumps(store.status(), default=str)}")
+    print(f"[warmup] DONE in {int((time.perf_counter()-t0)*1000)} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Servidor pré-forkado: um socket, N workers uvicorn (WEB_CONCURRENCY).
+
+O master importa o app e, com PRELOAD_STORE, carrega modelo e índice antes
+do fork: os workers herdam as páginas por copy-on-write (o índice denso e o
+BM25 já são mmap). Cada worker roda o próprio event loop, pool do Redis,
+thread de log e batcher. Worker que morre é substituído com backoff
+exponencial; mais de WORKER_RESTART_MAX reinícios em WORKER_RESTART_WINDOW_S
+derrubam o master com código 1 (o orquestrador reinicia o pod). SIGTERM/SIGINT
+encerram todos.
+
+    python -m app.serve --workers 4 --port 8080
+"""
+import os, sys, time, signal, socket, argparse
+from collections import deque
+from typing import Callable, Optional
+
+from .core.config import settings
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def _worker(app, sock: socket.socket, log_level: str) -> None:
+    import uvicorn
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_config=None, log_level=log_level, access_log=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+def _spawn(app, sock: socket.socket, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _worker(app, sock, log_level)
+        except BaseException:
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+class Restarts:
+    """Backoff exponencial entre reinícios, com teto de reinícios por janela deslizante."""
+
+    def __init__(self, max_restarts: int, window_s: float, base_s: float, cap_s: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_restarts = max_restarts
+        self.window_s = window_s
+        self.base_s = base_s
+        self.cap_s = cap_s
+        self.clock = clock
+        self._times: deque = deque()
+
+    def next_delay(self) -> Optional[float]:
+        """Espera antes do próximo reinício, ou None quando a janela estourou o teto."""
+        now = self.clock()
+        while self._times and now - self._times[0] > self.window_s:
+            self._times.popleft()
+        if len(self._times) >= self.max_restarts:
+            return None
+        delay = min(self.cap_s, self.base_s * 2 ** (len(self._times) - 1)) if self._times else 0.0
+        self._times.append(now)
+        return delay
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pre-forked multi-worker server for the chat backend.")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=settings.APP_PORT)
+    ap.add_argument("--workers", type=int, default=settings.WEB_CONCURRENCY)
+    ap.add_argument("--no-preload", action="store_true", help="each worker loads the model and index itself")
+    args = ap.parse_args(argv)
+
+    sock = _bind(args.host, args.port)
+    from .main import app, log
+    from .rag import store
+    if settings.PRELOAD_STORE and not args.no_preload:
+        t0 = time.perf_counter()
+        try:
+            store.preload()
+            log.info({"agent": "Server", "decision": "preloaded",
+                      "ms": int((time.perf_counter()-t0)*1000), **store.status()}, _keep=True)
+        except Exception:
+            log.error({"agent": "Server", "decision": "preload_failed", **store.status()})
+
+    workers = {_spawn(app, sock, settings.LOG_LEVEL): i for i in range(max(1, args.workers))}
+    log.info({"agent": "Server", "decision": "started", "workers": len(workers), "port": args.port}, _keep=True)
+
+    restarts = Restarts(settings.WORKER_RESTART_MAX, settings.WORKER_RESTART_WINDOW_S,
+                        settings.WORKER_RESTART_BACKOFF_S)
+    stopping = failed = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        i = workers.pop(pid, None)
+        if i is None or stopping:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        delay = restarts.next_delay()
+        if delay is None:
+            # Worker em crash loop: para tudo e sai com erro em vez de reforkar sem fim.
+            log.error({"agent": "Server", "decision": "restart_limit", "worker": i, "exit": code,
+                       "max": settings.WORKER_RESTART_MAX, "window_s": settings.WORKER_RESTART_WINDOW_S})
+            failed = True
+            stop(None, None)
+            continue
+        log.warning({"agent": "Server", "decision": "worker_restarted", "worker": i, "exit": code,
+                     "delay_ms": int(delay * 1000)})
+        time.sleep(delay)
+        if not stopping:
+            workers[_spawn(app, sock, settings.LOG_LEVEL)] = i
+    sock.close()
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Per-request source-validation overhead in knowledge_answer.
+
+before: _load_pages() + normalizing every allowed URL on each request.
+after:  the cached _allowlist() index + metadata["norm_url"] set lookups.
+
+    python benchmarks/bench_allowlist.py --runs 2000
+"""
+import os, sys, time, argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from app.agents import knowledge
+from app.rag.pages_auto import PAGES
+from app.rag.text import normalize_url
+
+class _Doc:
+    def __init__(self, url):
+        self.metadata = {"url": url, "norm_url": normalize_url(url)}
+
+def _before(docs):
+    norm_pages = {normalize_url.__wrapped__(u): u for u in knowledge._load_pages()}
+    return [norm_pages[n] for d in docs if (n := normalize_url.__wrapped__(d.metadata["url"])) in norm_pages]
+
+def _after(docs):
+    allow = knowledge._allowlist()
+    return [allow[n] for d in docs if (n := d.metadata["norm_url"]) in allow]
+
+def _time(fn, docs, runs):
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        fn(docs)
+    return (time.perf_counter()-t0) / runs * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=2000)
+    args = ap.parse_args()
+    docs = [_Doc(u) for u in PAGES[:4]]
+    assert _before(docs) == _after(docs)
+    b, a = _time(_before, docs, args.runs), _time(_after, docs, args.runs)
+    print(f"pages={len(PAGES)} docs/request={len(docs)}")
+    print(f"before: {b:.1f}us/request")
+    print(f" after: {a:.1f}us/request ({b/a:.0f}x)")
+
+if __name__ == "__main__":
+    main()
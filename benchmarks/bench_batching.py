@@ -0,0 +1,60 @@
+"""
+Query-embedding throughput/latency with and without micro-batching.
+
+For each concurrency level, C threads embed --queries queries in total,
+once through HuggingFaceEmbeddings.embed_query (one forward pass each) and
+once through BatchedEmbeddings (queries within --wait-ms share a pass).
+
+    python benchmarks/bench_batching.py --levels 1 2 4 8 16 32
+"""
+import os, sys, time, argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from app.rag import store
+from app.rag.batcher import BatchedEmbeddings
+
+QUERIES = [
+    "qual a taxa da maquininha?", "taxas maquininha", "como funciona o link de pagamento",
+    "infinitetap no celular", "prazo de entrega da maquininha smart", "chargeback",
+    "posso vender como MEI?", "como alterar o idioma do app",
+]
+
+def _pct(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples)-1, int(q*len(samples)))]
+
+def _run(embed, concurrency, n):
+    lat = []
+    def one(i):
+        t0 = time.perf_counter()
+        embed(QUERIES[i % len(QUERIES)] + f" {i}")
+        lat.append((time.perf_counter()-t0)*1000)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as ex:
+        list(ex.map(one, range(n)))
+    return n / (time.perf_counter()-t0), _pct(lat, .5), _pct(lat, .95)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    ap.add_argument("--queries", type=int, default=256)
+    ap.add_argument("--max-batch", type=int, default=16)
+    ap.add_argument("--wait-ms", type=float, default=5.0)
+    args = ap.parse_args()
+
+    base = store._embedding()
+    base.embed_query("warmup")
+    batched = BatchedEmbeddings(base, max_batch=args.max_batch, max_wait_ms=args.wait_ms)
+
+    print(f"{'conc':>4} | {'single q/s':>10} {'p50':>7} {'p95':>7} | {'batched q/s':>11} {'p50':>7} {'p95':>7}")
+    for c in args.levels:
+        s = _run(base.embed_query, c, args.queries)
+        b = _run(batched.embed_query, c, args.queries)
+        print(f"{c:>4} | {s[0]:>10.1f} {s[1]:>6.1f}ms {s[2]:>6.1f}ms | {b[0]:>11.1f} {b[1]:>6.1f}ms {b[2]:>6.1f}ms")
+    print("batcher:", batched.batcher.stats())
+    batched.close()
+
+if __name__ == "__main__":
+    main()
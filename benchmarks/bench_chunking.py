@@ -0,0 +1,97 @@
+"""
+Indexer extraction + chunking: old pipeline vs the new one, on synthetic
+Help Center pages (--pages, each with nav, scripts and --sections h2/h3
+sections).
+
+before: BeautifulSoup parses each page twice (title, then text) and
+        RecursiveCharacterTextSplitter(1500/200) cuts by characters.
+after:  one lxml parse (rag.extract) and rag.chunking.TokenChunker sized to
+        the model window, never crossing a heading.
+
+Reports pages/s (serial and with --workers processes) and the embedded
+tokens wasted: tokens past the model window are truncated by the encoder
+and never reach the embedding. Token counts use tokenizer.json from
+--model-dir when given, otherwise the same approximation as the indexer.
+
+    python benchmarks/bench_chunking.py --pages 300 --workers 4 --model-dir /app/models/all-MiniLM-L6-v2
+"""
+import os, sys, time, random, argparse
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from app.rag import chunking
+from app.rag.indexer import parse_page
+
+WORDS = ("taxa maquininha crédito débito parcelado pix link pagamento cliente venda conta digital "
+         "recebimento prazo antecipação cartão boleto transferência aproximação celular smart "
+         "juros valor cobrança estorno chargeback contestação atendimento suporte").split()
+
+def _sentence(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 22))).capitalize() + "."
+
+def make_page(i, sections, rng):
+    body = [f"<h1>Artigo {i}: {_sentence(rng)}</h1>", f"<p>{' '.join(_sentence(rng) for _ in range(3))}</p>"]
+    for s in range(sections):
+        body.append(f"<h{2 + s % 2}>Seção {s}: {rng.choice(WORDS)} e {rng.choice(WORDS)}</h{2 + s % 2}>")
+        for _ in range(rng.randint(1, 4)):
+            body.append(f"<p>{' '.join(_sentence(rng) for _ in range(rng.randint(1, 6)))}</p>")
+        if rng.random() < 0.5:
+            body.append("<ul>" + "".join(f"<li>{_sentence(rng)}</li>" for _ in range(rng.randint(2, 6))) + "</ul>")
+    return ("<html><head><title>Artigo %d | Central de Ajuda</title><script>window.x = {a: 1};</script>"
+            "<style>.a{color:red}</style></head><body><nav>Início Produtos Ajuda</nav><article>%s</article>"
+            "<footer>© InfinitePay</footer></body></html>" % (i, "".join(body)))
+
+def before(html, splitter):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "lxml")
+    title = soup.title.string.strip() if soup.title and soup.title.string else ""
+    soup = BeautifulSoup(html, "lxml")
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    main = soup.find("article") or soup.find("main") or soup
+    lines = [ln.strip() for ln in main.get_text(separator="\n", strip=True).splitlines()]
+    text = "\n".join(ln for ln in lines if ln)
+    return title, [(c, "") for c in splitter.split_text(text)]
+
+def after(html, splitter):
+    title, _, _, chunks = parse_page(html, splitter)
+    return title, chunks
+
+def _run(fn, pages, splitter, workers):
+    t0 = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as ex:
+            out = list(ex.map(fn, pages, [splitter] * len(pages), chunksize=8))
+    else:
+        out = [fn(p, splitter) for p in pages]
+    return out, len(pages) / (time.perf_counter() - t0)
+
+def _tokens(out, counter, window):
+    counts = counter.count_batch([text for _, chunks in out for text, _ in chunks])
+    return len(counts), sum(counts), sum(max(0, n - window) for n in counts), max(counts)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=300)
+    ap.add_argument("--sections", type=int, default=8)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--model-dir", default="")
+    args = ap.parse_args()
+
+    rng = random.Random(1)
+    pages = [make_page(i, args.sections, rng) for i in range(args.pages)]
+    new = chunking.for_model(args.model_dir)
+    old = RecursiveCharacterTextSplitter(chunk_size=1500, chunk_overlap=200, separators=["\n\n", "\n", ". ", " ", ""])
+    window = new.max_tokens
+    print(f"pages={len(pages)} window={window + 2} tokens ({type(new.counter).__name__}) workers={args.workers}")
+    for name, fn, splitter in (("before", before, old), ("after", after, new)):
+        out, serial = _run(fn, pages, splitter, 1)
+        _, pooled = _run(fn, pages, splitter, args.workers) if args.workers > 1 else (out, serial)
+        n, total, wasted, biggest = _tokens(out, new.counter, window)
+        print(f"{name:>6}: {serial:7.1f} pages/s serial {pooled:7.1f} pages/s x{args.workers} | "
+              f"chunks={n} tokens={total} max/chunk={biggest} truncated={wasted} ({wasted / max(total, 1):.1%})")
+
+if __name__ == "__main__":
+    main()
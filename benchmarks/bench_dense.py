@@ -0,0 +1,91 @@
+"""
+Chroma (SQLite + HNSW) vs the memory-mapped DenseIndex (flat and IVF) on a
+synthetic corpus of --chunks random unit vectors: open time, RSS growth after
+opening, and single-query top-k latency. Both stores are written to a temp
+dir first, as the indexer would. Chroma's RSS figure excludes the chromadb
+import and client, already paid while building it in this process.
+
+    python benchmarks/bench_dense.py --chunks 5000 --dim 384 --queries 500
+"""
+import os, sys, time, argparse, tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from langchain_core.embeddings import Embeddings
+from app.rag.dense import DenseIndex
+
+class _Fixed(Embeddings):
+    def __init__(self, dim):
+        self.dim = dim
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+    def embed_query(self, text):
+        return np.random.default_rng(abs(hash(text)) % 2**32).normal(size=self.dim).tolist()
+
+def _rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def _pct(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples)-1, int(q*len(samples)))]
+
+def _measure(name, open_fn, queries, k):
+    rss0 = _rss_mb()
+    t0 = time.perf_counter()
+    vs = open_fn()
+    vs.similarity_search_by_vector(queries[0].tolist(), k=k)
+    open_ms = (time.perf_counter() - t0) * 1000
+    lat = []
+    for q in queries:
+        t0 = time.perf_counter()
+        vs.similarity_search_by_vector(q.tolist(), k=k)
+        lat.append((time.perf_counter() - t0) * 1000)
+    print(f"{name:>14} | open {open_ms:>7.0f}ms | RSS +{_rss_mb() - rss0:>6.1f}MB | "
+          f"p50 {_pct(lat, .5):>6.2f}ms p95 {_pct(lat, .95):>6.2f}ms")
+    return vs
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunks", type=int, default=5000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=20)
+    ap.add_argument("--nprobe", type=int, default=8)
+    ap.add_argument("--skip-chroma", action="store_true")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(args.chunks, args.dim)).astype(np.float32)
+    ids = [f"c{i}" for i in range(args.chunks)]
+    texts = [f"chunk {i} " * 40 for i in range(args.chunks)]
+    metas = [{"url": f"https://ajuda.example/{i // 8}"} for i in range(args.chunks)]
+    queries = x[rng.integers(0, args.chunks, args.queries)] + rng.normal(scale=0.5, size=(args.queries, args.dim))
+    emb = _Fixed(args.dim)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        DenseIndex.build(ids, x, texts, metas, ivf_min=10**9).save(os.path.join(tmp, "flat"))
+        DenseIndex.build(ids, x, texts, metas, ivf_min=1).save(os.path.join(tmp, "ivf"))
+        DenseIndex.build(ids, x, texts, metas, dtype="float16", ivf_min=10**9).save(os.path.join(tmp, "f16"))
+        print(f"dense build (flat + IVF + f16): {(time.perf_counter() - t0) * 1000:.0f}ms")
+        _measure("dense flat", lambda: DenseIndex.load(os.path.join(tmp, "flat"), emb), queries, args.k)
+        _measure("dense flat f16", lambda: DenseIndex.load(os.path.join(tmp, "f16"), emb), queries, args.k)
+        _measure("dense IVF", lambda: DenseIndex.load(os.path.join(tmp, "ivf"), emb, nprobe=args.nprobe),
+                 queries, args.k)
+        if args.skip_chroma:
+            return
+        from app.rag import store
+        vs = store.open_store(os.path.join(tmp, "chroma"), "bench", emb)
+        for i in range(0, args.chunks, 1000):
+            vs._collection.add(ids=ids[i:i+1000], embeddings=x[i:i+1000].tolist(),
+                               documents=texts[i:i+1000], metadatas=metas[i:i+1000])
+        del vs
+        _measure("chroma", lambda: store.open_store(os.path.join(tmp, "chroma"), "bench", emb), queries, args.k)
+
+if __name__ == "__main__":
+    main()
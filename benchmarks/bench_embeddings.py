@@ -0,0 +1,76 @@
+"""
+Memory and latency of each embedding backend (EMBEDDING_BACKEND): torch,
+onnx, onnx-int8 and numpy. Each backend runs in a fresh interpreter so RSS
+is comparable: load time, RSS after load, single-query p50/p95 and batch
+throughput. Needs the local model written by `python -m app.rag.warmup`.
+
+    python benchmarks/bench_embeddings.py --model-dir /app/models/all-MiniLM-L6-v2
+"""
+import os, sys, json, time, argparse, subprocess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from app.rag import embeddings
+
+QUERIES = [
+    "qual a taxa da maquininha?", "taxas maquininha", "como funciona o link de pagamento",
+    "infinitetap no celular", "prazo de entrega da maquininha smart", "chargeback",
+    "posso vender como MEI?", "como alterar o idioma do app",
+]
+
+def _rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def _pct(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples)-1, int(q*len(samples)))]
+
+def _child(name, model_dir, queries, batch):
+    rss0 = _rss_mb()
+    t0 = time.perf_counter()
+    emb = embeddings.create(model_dir, name)
+    emb.embed_query("warmup")
+    load_ms = (time.perf_counter() - t0) * 1000
+    rss = _rss_mb() - rss0
+    lat = []
+    for i in range(queries):
+        t0 = time.perf_counter()
+        emb.embed_query(QUERIES[i % len(QUERIES)])
+        lat.append((time.perf_counter() - t0) * 1000)
+    docs = [QUERIES[i % len(QUERIES)] * 8 for i in range(batch)]
+    t0 = time.perf_counter()
+    emb.embed_documents(docs)
+    docs_s = batch / (time.perf_counter() - t0)
+    print(json.dumps({"backend": name, "load_ms": load_ms, "rss_mb": rss,
+                      "p50": _pct(lat, .5), "p95": _pct(lat, .95), "docs_s": docs_s}))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model-dir", required=True)
+    ap.add_argument("--backends", nargs="+", default=list(embeddings.BACKENDS))
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--batch", type=int, default=64)
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        return _child(args.child, args.model_dir, args.queries, args.batch)
+
+    print(f"{'backend':>10} | {'load':>7} | {'RSS':>8} | {'query p50':>9} {'p95':>7} | {'docs/s':>7}")
+    for name in args.backends:
+        out = subprocess.run([sys.executable, __file__, "--child", name, "--model-dir", args.model_dir,
+                              "--queries", str(args.queries), "--batch", str(args.batch)],
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            err = out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "failed"
+            print(f"{name:>10} | unavailable: {err}")
+            continue
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{name:>10} | {r['load_ms']:>5.0f}ms | {r['rss_mb']:>6.0f}MB | "
+              f"{r['p50']:>7.1f}ms {r['p95']:>5.1f}ms | {r['docs_s']:>7.1f}")
+
+if __name__ == "__main__":
+    main()
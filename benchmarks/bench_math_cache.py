@@ -0,0 +1,81 @@
+"""
+Replays a calculator-style expression mix through math_answer, uncached
+(MATH_CACHE=0) vs cached, and reports per-call latency and cache hit rates.
+
+The mix is installment/fee arithmetic: a few popular amounts and rates
+(Zipf-like) plus a random long tail, so both the result LRU and the
+template cache get realistic traffic.
+
+    python benchmarks/bench_math_cache.py --requests 20000
+"""
+import os, sys, io, time, random, asyncio, argparse, contextlib
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from app.agents.math import math_answer
+from app.agents import math_cache as cache
+
+TEMPLATES = [
+    (40, "{a} * {r}"),
+    (25, "{a} x {n}"),
+    (15, "{a} / {n}"),
+    (10, "{a} * (1 + {r})^{n}"),
+    (10, "({a} - {b}) * {r}"),
+]
+AMOUNTS = [100, 250, 500, 1000, 1500, 2000, 2500, 5000, 10000]
+RATES = ["0.0349", "0.0199", "0.0459", "0.0099", "0.0299"]
+
+def _zipf(rng: random.Random, items):
+    weights = [1.0 / (i + 1) for i in range(len(items))]
+    return rng.choices(items, weights=weights)[0]
+
+def _amount(rng: random.Random, tail: float) -> str:
+    if rng.random() < tail:
+        return f"{rng.randint(1, 100000) / 100:.2f}"
+    return str(_zipf(rng, AMOUNTS))
+
+def workload(n: int, tail: float, seed: int = 7):
+    rng = random.Random(seed)
+    weights, forms = zip(*TEMPLATES)
+    out = []
+    for _ in range(n):
+        form = rng.choices(forms, weights=weights)[0]
+        out.append(form.format(a=_amount(rng, tail), b=_amount(rng, tail),
+                               r=_zipf(rng, RATES), n=rng.randint(2, 12)))
+    return out
+
+async def _replay(exprs):
+    lat = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for e in exprs:
+            t0 = time.perf_counter()
+            await math_answer(e)
+            lat.append(time.perf_counter() - t0)
+    lat.sort()
+    return sum(lat) / len(lat) * 1e6, lat[len(lat) // 2] * 1e6, lat[int(len(lat) * 0.99)] * 1e6
+
+def _rate(tier: str) -> str:
+    hit = cache.REQUESTS.value(tier=tier, result="hit")
+    total = hit + cache.REQUESTS.value(tier=tier, result="miss")
+    return f"{hit / total:.1%}" if total else "-"
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=20000)
+    ap.add_argument("--tail", type=float, default=0.2, help="fraction of long-tail (unique) amounts")
+    args = ap.parse_args()
+    exprs = workload(args.requests, args.tail)
+    print(f"requests={len(exprs)} distinct={len(set(exprs))}")
+
+    os.environ["MATH_CACHE"] = "0"
+    mean, p50, p99 = asyncio.run(_replay(exprs))
+    print(f"uncached: mean={mean:.1f}us p50={p50:.1f}us p99={p99:.1f}us")
+
+    os.environ["MATH_CACHE"] = "1"
+    cmean, p50, p99 = asyncio.run(_replay(exprs))
+    print(f"  cached: mean={cmean:.1f}us p50={p50:.1f}us p99={p99:.1f}us ({mean/cmean:.1f}x)")
+    print(f"hit rate: results={_rate('local')} templates={_rate('template')} "
+          f"{cache.math_cache.stats()}")
+
+if __name__ == "__main__":
+    main()
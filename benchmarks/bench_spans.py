@@ -0,0 +1,37 @@
+"""
+Cost of the always-on instrumentation: one timing.span() (two perf_counter
+calls, a histogram observe and the per-request dict update) vs a bare block.
+
+    python benchmarks/bench_spans.py --runs 200000
+"""
+import os, sys, time, argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from app.core import timing
+
+def _loop(runs, instrumented):
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        if instrumented:
+            with timing.span("bench"):
+                pass
+        else:
+            pass
+    return (time.perf_counter() - t0) / runs * 1e9
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=200000)
+    args = ap.parse_args()
+    base = _loop(args.runs, False)
+    timing.detach()
+    bg = _loop(args.runs, True) - base
+    timing.start()
+    req = _loop(args.runs, True) - base
+    print(f"span outside a request: {bg:.0f}ns")
+    print(f"span inside a request:  {req:.0f}ns "
+          f"(~{req * 12 / 1000:.1f}us for the ~12 spans of a KnowledgeAgent request)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Cold-start cost of the backend: `import app.main` in a fresh interpreter
+(what uvicorn pays before /health answers) vs the same import with the RAG
+stack loaded eagerly (the old behaviour), plus the time until the warm store
+is ready (/ready flips) when the embedding model is available.
+
+    python benchmarks/bench_startup.py --runs 5
+    EMBEDDING_MODEL_DIR=/app/models python benchmarks/bench_startup.py --ready
+"""
+import os, sys, json, time, argparse, statistics, subprocess
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+EAGER = "import langchain_chroma, langchain_huggingface; "
+
+def _time(code, runs):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=BACKEND, check=True,
+                       env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"})
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), max(samples)
+
+def _ready():
+    code = ("import time, json; t0 = time.perf_counter(); import app.main; from app.rag import store; "
+            "t1 = time.perf_counter(); store.warmup(); t2 = time.perf_counter(); "
+            "print(json.dumps([t1 - t0, t2 - t1]))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, capture_output=True, text=True)
+    if out.returncode != 0:
+        print(f"warm store: unavailable ({out.stderr.strip().splitlines()[-1] if out.stderr else 'error'})")
+        return
+    imp, warm = json.loads(out.stdout.strip().splitlines()[-1])
+    print(f"import: {imp * 1000:.0f}ms | store warmup (model + index + probe query): {warm * 1000:.0f}ms")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--ready", action="store_true", help="also measure the time until the store is warm")
+    args = ap.parse_args()
+    lazy = _time("import app.main", args.runs)
+    eager = _time(EAGER + "import app.main", args.runs)
+    print(f"import app.main (lazy RAG):  p50={lazy[0]:.0f}ms max={lazy[1]:.0f}ms")
+    print(f"import app.main (eager RAG): p50={eager[0]:.0f}ms max={eager[1]:.0f}ms")
+    if args.ready:
+        _ready()
+
+if __name__ == "__main__":
+    main()
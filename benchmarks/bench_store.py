@@ -0,0 +1,57 @@
+"""
+Cold vs warm retrieval latency for the KnowledgeAgent store.
+
+cold: builds HuggingFaceEmbeddings + Chroma on every query (old behaviour).
+warm: reuses the process-wide store loaded by store.warmup().
+
+    python benchmarks/bench_store.py --runs 20
+"""
+import os, sys, time, argparse, statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from app.rag import store
+
+QUERIES = [
+    "qual a taxa da maquininha?",
+    "como funciona o link de pagamento",
+    "infinitetap no celular",
+    "prazo de entrega da maquininha smart",
+]
+
+def _summary(name, samples):
+    samples = sorted(samples)
+    p = lambda q: samples[min(len(samples)-1, int(q*len(samples)))]
+    print(f"{name:>5}: n={len(samples)} mean={statistics.mean(samples):.1f}ms "
+          f"p50={p(0.50):.1f}ms p95={p(0.95):.1f}ms max={samples[-1]:.1f}ms")
+
+def cold(runs: int, k: int):
+    out = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        s = store.open_store(store._persist_dir(), store._collection(), store._embedding())
+        s.similarity_search(QUERIES[i % len(QUERIES)], k=k)
+        out.append((time.perf_counter()-t0)*1000)
+    return out
+
+def warm(runs: int, k: int):
+    t0 = time.perf_counter()
+    store.warmup()
+    print(f"warmup: {(time.perf_counter()-t0)*1000:.0f}ms")
+    out = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        store.similarity_search(QUERIES[i % len(QUERIES)], k=k)
+        out.append((time.perf_counter()-t0)*1000)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=20)
+    ap.add_argument("--k", type=int, default=4)
+    args = ap.parse_args()
+    _summary("cold", cold(args.runs, args.k))
+    _summary("warm", warm(args.runs, args.k))
+
+if __name__ == "__main__":
+    main()
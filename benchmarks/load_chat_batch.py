@@ -0,0 +1,64 @@
+"""
+/chat one by one vs /chat/batch.
+
+Sends the same mixed workload (knowledge questions and math) as --items
+concurrent /chat calls and as a single /chat/batch, and reports the
+wall time and throughput of each. The batch embeds all knowledge queries
+in one forward pass and runs one vector search for the whole group.
+
+    uvicorn app.main:app --app-dir backend --port 8080
+    python benchmarks/load_chat_batch.py --url http://localhost:8080 --items 64
+"""
+import asyncio, argparse, time, statistics
+import httpx
+
+QUESTIONS = [
+    "qual a taxa da maquininha?",
+    "como funciona o link de pagamento?",
+    "como contestar um chargeback?",
+    "dá pra usar o celular como maquininha?",
+    "quanto tempo para a maquininha chegar?",
+]
+
+def _items(n, round_=0):
+    # Mensagens novas a cada rodada: o answer_cache e o math_cache não mascaram o custo.
+    out = []
+    for i in range(n):
+        msg = f"{i} * 7 + {round_}" if i % 4 == 3 else f"{QUESTIONS[i % len(QUESTIONS)]} ({round_}.{i})"
+        out.append({"message": msg, "user_id": "bench", "conversation_id": f"batch-{i}"})
+    return out
+
+async def _singles(client, items):
+    t0 = time.perf_counter()
+    rs = await asyncio.gather(*(client.post("/chat", json=it) for it in items))
+    return time.perf_counter() - t0, [r.status_code for r in rs]
+
+async def _batch(client, items):
+    t0 = time.perf_counter()
+    r = await client.post("/chat/batch", json={"items": items})
+    r.raise_for_status()
+    return time.perf_counter() - t0, [x["status"] for x in r.json()["results"]]
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://localhost:8080")
+    ap.add_argument("--items", type=int, default=64)
+    ap.add_argument("--rounds", type=int, default=5)
+    args = ap.parse_args()
+
+    limits = httpx.Limits(max_connections=args.items + 4)
+    async with httpx.AsyncClient(base_url=args.url, timeout=120, limits=limits) as client:
+        await _batch(client, _items(args.items, -1))
+        for name, fn in (("/chat x N", _singles), ("/chat/batch", _batch)):
+            times, codes = [], {}
+            for r in range(args.rounds):
+                elapsed, statuses = await fn(client, _items(args.items, r if fn is _batch else args.rounds + r))
+                times.append(elapsed)
+                for s in statuses:
+                    codes[s] = codes.get(s, 0) + 1
+            mean = statistics.mean(times)
+            print(f"{name:>12}: items={args.items} mean={mean*1000:.0f}ms "
+                  f"throughput={args.items/mean:.0f} items/s status={codes}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
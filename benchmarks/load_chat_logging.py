@@ -0,0 +1,92 @@
+"""
+/chat latency vs. Redis round-trip time for the conversation log.
+
+Runs the app in-process (httpx ASGITransport) against a fake Redis whose
+every command/pipeline takes --redis-ms. "inline" awaits the write inside
+the request like the old rpush did; "background" is the ConversationLogWriter.
+
+    python benchmarks/load_chat_logging.py --requests 500 --concurrency 20 --redis-ms 5
+"""
+import os, sys, time, asyncio, argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+# Um user_id só em todas as requisições: mede o log de conversa, não o rate limiter.
+os.environ.setdefault("RATE_LIMIT", "0")
+
+import fakeredis
+import httpx
+from app import main
+from app.agents.context_cache import context_cache
+from app.agents.math_cache import math_cache
+from app.core.convlog import conv_log
+
+class SlowRedis:
+    """Proxy que soma `delay` segundos a cada comando e a cada pipeline.execute()."""
+
+    def __init__(self, inner, delay):
+        self._inner, self._delay = inner, delay
+
+    def pipeline(self, *a, **kw):
+        pipe, delay = self._inner.pipeline(*a, **kw), self._delay
+        execute = pipe.execute
+        async def slow_execute(*ea, **ekw):
+            await asyncio.sleep(delay)
+            return await execute(*ea, **ekw)
+        pipe.execute = slow_execute
+        return pipe
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+        async def slow(*a, **kw):
+            await asyncio.sleep(self._delay)
+            return await attr(*a, **kw)
+        return slow
+
+def _pct(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples)-1, int(q*len(samples)))]
+
+@main.app.post("/bench/chat-inline")
+async def chat_inline(payload: main.ChatRequest):
+    # Handler antigo: a gravação no Redis acontece dentro da requisição.
+    reply, source, workflow = await main.router_agent(
+        main.analyze(payload.message), payload.user_id, payload.conversation_id, main.log)
+    await conv_log.client.rpush(f"logs:{payload.conversation_id}", str(workflow[0]))
+    return {"response": reply}
+
+async def _run(path, n, concurrency):
+    sem, lat = asyncio.Semaphore(concurrency), []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            async with sem:
+                t0 = time.perf_counter()
+                r = await client.post(path, json={"message": f"{i} * 3", "user_id": "bench",
+                                                  "conversation_id": f"c{i % 50}"})
+                lat.append((time.perf_counter()-t0)*1000)
+                r.raise_for_status()
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n)))
+        elapsed = time.perf_counter() - t0
+    return n / elapsed, lat
+
+async def main_async():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, default=20)
+    ap.add_argument("--redis-ms", type=float, default=5.0)
+    args = ap.parse_args()
+    conv_log.client = SlowRedis(fakeredis.FakeAsyncRedis(decode_responses=True), args.redis_ms / 1000)
+    # Os outros clientes Redis do /chat num fake sem atraso: só o log de conversa é medido.
+    math_cache.client = context_cache.client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    for mode, path in (("inline", "/bench/chat-inline"), ("background", "/chat")):
+        rps, lat = await _run(path, args.requests, args.concurrency)
+        await conv_log.flush()
+        print(f"{mode:>10}: {rps:7.1f} req/s  p50={_pct(lat,.5):.2f}ms  p95={_pct(lat,.95):.2f}ms  "
+              f"p99={_pct(lat,.99):.2f}ms  (redis rtt={args.redis_ms}ms)")
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
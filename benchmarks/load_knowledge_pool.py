@@ -0,0 +1,66 @@
+"""
+Math latency under KnowledgeAgent saturation.
+
+Measures /chat latency for math messages alone, then again while
+--knowledge-concurrency clients keep hammering knowledge questions.
+With the knowledge pool off the event loop both numbers should match;
+knowledge requests over KNOWLEDGE_WORKERS + KNOWLEDGE_QUEUE get 503.
+
+    uvicorn app.main:app --app-dir backend --port 8080
+    python benchmarks/load_knowledge_pool.py --url http://localhost:8080
+"""
+import asyncio, argparse, time, statistics
+from collections import Counter
+import httpx
+
+def _pct(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples)-1, int(q*len(samples)))] if samples else float("nan")
+
+async def _math_probe(client, n, interval):
+    out = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        r = await client.post("/chat", json={"message": f"{i} + 12", "user_id": "bench", "conversation_id": "math"})
+        out.append((time.perf_counter()-t0)*1000)
+        r.raise_for_status()
+        await asyncio.sleep(interval)
+    return out
+
+async def _knowledge_load(client, stop, codes):
+    while not stop.is_set():
+        r = await client.post("/chat", json={"message": "qual a taxa da maquininha?",
+                                             "user_id": "bench", "conversation_id": "kb"})
+        codes[r.status_code] += 1
+        if r.status_code == 503:
+            await asyncio.sleep(0.05)
+
+def _report(name, samples):
+    print(f"{name:>14}: n={len(samples)} mean={statistics.mean(samples):.1f}ms "
+          f"p50={_pct(samples, .5):.1f}ms p95={_pct(samples, .95):.1f}ms p99={_pct(samples, .99):.1f}ms")
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://localhost:8080")
+    ap.add_argument("--math-requests", type=int, default=100)
+    ap.add_argument("--interval", type=float, default=0.02)
+    ap.add_argument("--knowledge-concurrency", type=int, default=32)
+    args = ap.parse_args()
+
+    limits = httpx.Limits(max_connections=args.knowledge_concurrency + 4)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits) as client:
+        idle = await _math_probe(client, args.math_requests, args.interval)
+        stop, codes = asyncio.Event(), Counter()
+        load = [asyncio.create_task(_knowledge_load(client, stop, codes))
+                for _ in range(args.knowledge_concurrency)]
+        await asyncio.sleep(1.0)
+        loaded = await _math_probe(client, args.math_requests, args.interval)
+        stop.set()
+        await asyncio.gather(*load)
+
+    _report("math idle", idle)
+    _report("math + kb load", loaded)
+    print(f"knowledge status codes: {dict(codes)}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
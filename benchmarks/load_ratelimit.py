@@ -0,0 +1,122 @@
+"""
+Well-behaved users vs one abusive client, with and without rate limiting.
+
+Open-loop polite traffic (--users user_ids, each on its own IP, Poisson
+arrivals at --rate req/s in total, knowledge questions and math) runs
+three times against the app in-process: alone, next to an abusive client
+(knowledge questions at --abuse-rate req/s from one user_id and one IP,
+ignoring Retry-After) with RATE_LIMIT off, and the same with RATE_LIMIT on. Reports
+p50/p95/p99 and status codes of the polite users and the status codes of
+the abuser. With the limiter on, the abuser gets 429 after its burst and
+the polite latency should stay close to the "alone" run.
+
+Uses the suite fixture index and fakeredis for the caches and buckets
+(--redis-url for a local Redis). Client and app share the process, so
+the abuser's own send cost also lands on the polite numbers; keep
+--abuse-rate within what one core can send.
+
+    python benchmarks/load_ratelimit.py --rate 8 --duration 10 --users 20
+"""
+import os, sys, time, random, asyncio, argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from suite import KNOWLEDGE, MATH, _pct, fixture, use_redis  # noqa: E402 (suite põe backend no sys.path)
+
+import tempfile  # noqa: E402
+
+async def _polite(client, rate, duration, users, math_ratio, seed=7):
+    rng = random.Random(seed)
+    arrivals, t = [], 0.0
+    while True:
+        t += rng.expovariate(rate)
+        if t >= duration:
+            break
+        pool = MATH if rng.random() < math_ratio else KNOWLEDGE
+        arrivals.append((t, rng.choice(pool), rng.randrange(users)))
+
+    samples, codes = [], Counter()
+
+    async def one(scheduled, message, u):
+        r = await client.post("/chat", json={"message": message, "user_id": f"user{u}", "conversation_id": f"c{u}"},
+                              headers={"X-Forwarded-For": f"10.0.0.{u}"})
+        codes[r.status_code] += 1
+        if r.status_code == 200:
+            samples.append((time.perf_counter() - scheduled) * 1000)
+
+    start = time.perf_counter()
+    tasks = []
+    for at, message, u in arrivals:
+        delay = start + at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(start + at, message, u)))
+    await asyncio.gather(*tasks)
+    return samples, codes
+
+async def _abuse(client, rate, stop, codes):
+    # Malha aberta a `rate` req/s, sem olhar Retry-After nem esperar as respostas.
+    tasks, i = [], 0
+    start = time.perf_counter()
+
+    async def one(n):
+        r = await client.post("/chat", json={"message": f"{KNOWLEDGE[n % len(KNOWLEDGE)]} #{n}",
+                                             "user_id": "abuser", "conversation_id": "abuse"},
+                              headers={"X-Forwarded-For": "203.0.113.9"})
+        codes[r.status_code] += 1
+
+    while not stop.is_set():
+        i += 1
+        tasks.append(asyncio.create_task(one(i)))
+        await asyncio.sleep(max(0.0, start + i / rate - time.perf_counter()))
+    await asyncio.gather(*tasks)
+
+async def _run(client, args, abuse: bool):
+    stop, abuse_codes = asyncio.Event(), Counter()
+    abuser = asyncio.create_task(_abuse(client, args.abuse_rate, stop, abuse_codes)) if abuse else None
+    samples, codes = await _polite(client, args.rate, args.duration, args.users, args.math_ratio)
+    stop.set()
+    if abuser:
+        await abuser
+    return samples, codes, abuse_codes
+
+def _report(name, samples, codes, abuse_codes):
+    print(f"{name:>13}: n={len(samples)} p50={_pct(samples, .5):.1f}ms p95={_pct(samples, .95):.1f}ms "
+          f"p99={_pct(samples, .99):.1f}ms polite={dict(codes)} abuser={dict(abuse_codes)}")
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rate", type=float, default=8.0, help="polite arrival rate, req/s in total")
+    ap.add_argument("--duration", type=float, default=10.0)
+    ap.add_argument("--users", type=int, default=20)
+    ap.add_argument("--math-ratio", type=float, default=0.3)
+    ap.add_argument("--abuse-rate", type=float, default=100.0, help="abusive client req/s")
+    ap.add_argument("--redis-url")
+    args = ap.parse_args()
+
+    os.environ.update({"ANSWER_CACHE": "0", "RATE_TRUST_PROXY": "1", "LOG_LEVEL": "error"})
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture(tmp)
+        use_redis(args.redis_url)
+        import fakeredis
+        import httpx
+        import redis.asyncio as redis
+        from app.main import app
+        from app.core.config import settings
+        from app.core.ratelimit import rate_limiter
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for name, abuse, limited in (("alone", False, True), ("abuse, off", True, False),
+                                         ("abuse, on", True, True)):
+                settings.RATE_LIMIT = limited
+                # Buckets zerados a cada rodada.
+                rate_limiter.client = (redis.from_url(args.redis_url, decode_responses=True) if args.redis_url
+                                       else fakeredis.FakeAsyncRedis(decode_responses=True))
+                if args.redis_url:
+                    await rate_limiter.client.flushdb()
+                _report(name, *await _run(client, args, abuse))
+        from app.core.convlog import conv_log
+        await conv_log.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
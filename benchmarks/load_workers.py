@@ -0,0 +1,104 @@
+"""
+RSS and throughput of the pre-forked server at 1, 2, 4 and 8 workers.
+
+For each worker count it starts `python -m app.serve`, waits for /health,
+drives /chat with --concurrency clients for --seconds, then sums RSS and PSS
+(proportional set size: shared pages split between processes, so copy-on-
+write sharing shows up here) over the master and its workers.
+
+    python benchmarks/load_workers.py --workers 1 2 4 8 --message "qual a taxa da maquininha?"
+"""
+import os, sys, time, asyncio, argparse, signal, subprocess
+import httpx
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+def _mem_mb(pid):
+    rss = pss = 0
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Rss:"):
+                    rss = int(line.split()[1])
+                elif line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+    except OSError:
+        pass
+    return rss / 1024, pss / 1024
+
+async def _drive(url, message, concurrency, seconds):
+    done = errors = 0
+    stop = time.perf_counter() + seconds
+
+    async def client_loop(client, c):
+        nonlocal done, errors
+        i = 0
+        while time.perf_counter() < stop:
+            msg = message.format(i=i, c=c)
+            r = await client.post("/chat", json={"message": msg, "user_id": "bench", "conversation_id": f"w{c}"})
+            done += 1
+            errors += r.status_code >= 500
+            i += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=30, limits=limits) as client:
+        await asyncio.gather(*(client_loop(client, c) for c in range(concurrency)))
+    return done / seconds, errors
+
+def _wait_healthy(url, proc, timeout=120):
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return time.perf_counter() - t0
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError("server did not answer /health")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--port", type=int, default=18080)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--settle", type=float, default=3.0, help="wait after /health for the workers' warmup")
+    ap.add_argument("--message", default="{i} * 7 + {c}", help="format with {i} (request) and {c} (client)")
+    ap.add_argument("--no-preload", action="store_true")
+    args = ap.parse_args()
+
+    cores = os.cpu_count() or 1
+    url = f"http://127.0.0.1:{args.port}"
+    print(f"{'workers':>7} | {'req/s':>8} {'req/s/core':>10} {'5xx':>5} | {'RSS':>8} {'PSS':>8} | {'boot':>6}")
+    for n in args.workers:
+        cmd = [sys.executable, "-m", "app.serve", "--workers", str(n), "--port", str(args.port)]
+        if args.no_preload:
+            cmd.append("--no-preload")
+        proc = subprocess.Popen(cmd, cwd=BACKEND, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            boot = _wait_healthy(url, proc)
+            time.sleep(args.settle)
+            rps, errors = asyncio.run(_drive(url, args.message, args.concurrency, args.seconds))
+            pids = [proc.pid] + _children(proc.pid)
+            mem = [_mem_mb(p) for p in pids]
+            rss, pss = sum(m[0] for m in mem), sum(m[1] for m in mem)
+            print(f"{n:>7} | {rps:>8.0f} {rps / min(n, cores):>10.0f} {errors:>5} | "
+                  f"{rss:>6.0f}MB {pss:>6.0f}MB | {boot:>5.1f}s")
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+if __name__ == "__main__":
+    main()
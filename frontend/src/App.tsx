@@ -17,6 +17,28 @@ type Conversation = {
 const API_URL = (import.meta as any).env?.VITE_API_URL || 'http://localhost:8080'
 function uid(){ return Math.random().toString(36).slice(2,9) }
 
+// Lê um corpo text/event-stream e devolve cada evento SSE já com o JSON de `data` parseado.
+async function* readSSE(body: ReadableStream<Uint8Array>){
+  const reader = body.getReader()
+  const decoder = new TextDecoder()
+  let buf = ''
+  while(true){
+    const { value, done } = await reader.read()
+    if(done) break
+    buf += decoder.decode(value, { stream: true })
+    let sep
+    while((sep = buf.indexOf('\n\n')) >= 0){
+      const raw = buf.slice(0, sep); buf = buf.slice(sep + 2)
+      let event = 'message', data = ''
+      for(const line of raw.split('\n')){
+        if(line.startsWith('event:')) event = line.slice(6).trim()
+        else if(line.startsWith('data:')) data += line.slice(5).trim()
+      }
+      if(data) yield { event, data: JSON.parse(data) }
+    }
+  }
+}
+
 export default function App(){
   const [convs, setConvs] = useState<Conversation[]>([{
     id: 'conv-' + uid(),
@@ -44,26 +66,43 @@ export default function App(){
     const userMsg: ChatMessage = { id: uid(), who:'user', text: msg }
     setConvs(prev => prev.map((c,i)=> i===current? ({...c, messages:[...c.messages, userMsg]}):c))
 
+    const botId = uid()
+    const patchBot = (patch: (m: ChatMessage) => ChatMessage) =>
+      setConvs(prev => prev.map((c,i)=> i===current? ({...c, messages: c.messages.map(m => m.id === botId ? patch(m) : m)}):c))
+    const scroll = () => listRef.current?.scrollTo({ top: 1e9 })
+
     try{
-      const res = await fetch(API_URL + '/chat', {
+      const res = await fetch(API_URL + '/chat/stream', {
         method:'POST',
-        headers:{'Content-Type':'application/json'},
+        headers:{'Content-Type':'application/json', 'Accept':'text/event-stream'},
         body: JSON.stringify({ message: msg, user_id: userId, conversation_id: conv.id })
       })
-      if(!res.ok) throw new Error('HTTP '+res.status)
-      const data = await res.json()
-
-      const agent = Array.isArray(data.agent_workflow) && data.agent_workflow.length
-        ? data.agent_workflow[data.agent_workflow.length - 1].agent
-        : 'KnowledgeAgent'
+      if(!res.ok || !res.body) throw new Error('HTTP '+res.status)
 
-      const botMsg: ChatMessage = { id: uid(), who:'bot', text: data.response ?? '(sem resposta)', meta: data.source_agent_response ?? '', agent }
+      const botMsg: ChatMessage = { id: botId, who:'bot', text: '', meta: '...', agent: 'RouterAgent' }
       setConvs(prev => prev.map((c,i)=> i===current? ({...c, messages:[...c.messages, botMsg]}):c))
 
+      for await (const { event, data } of readSSE(res.body)){
+        if(event === 'route' || event === 'reroute'){
+          patchBot(m => ({...m, agent: data.decision === 'MathAgent' ? 'MathAgent' : data.decision === 'KnowledgeAgent' ? 'KnowledgeAgent' : 'RouterAgent'}))
+        }else if(event === 'sources'){
+          patchBot(m => ({...m, meta: data.sources?.length ? `Fontes: ${data.sources.length}` : m.meta}))
+        }else if(event === 'token'){
+          patchBot(m => ({...m, text: m.text + data.text}))
+          scroll()
+        }else if(event === 'done'){
+          const agent = Array.isArray(data.agent_workflow) && data.agent_workflow.length
+            ? data.agent_workflow[data.agent_workflow.length - 1].agent
+            : 'KnowledgeAgent'
+          patchBot(m => ({...m, text: data.response ?? m.text ?? '(sem resposta)', meta: data.source_agent_response ?? '', agent}))
+        }else if(event === 'error'){
+          throw new Error('HTTP ' + data.status)
+        }
+      }
       setTimeout(()=>{ listRef.current?.scrollTo({ top: 1e9, behavior:'smooth' }) }, 50)
     }catch(err:any){
       const botMsg: ChatMessage = { id: uid(), who:'bot', text: 'Falha ao falar com o backend. Verifique a API.', meta: err?.message, agent: 'RouterAgent' }
-      setConvs(prev => prev.map((c,i)=> i===current? ({...c, messages:[...c.messages, botMsg]}):c))
+      setConvs(prev => prev.map((c,i)=> i===current? ({...c, messages:[...c.messages.filter(m => m.id !== botId || m.text), botMsg]}):c))
     }finally{
       setBusy(false)
     }
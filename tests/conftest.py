@@ -0,0 +1,7 @@
+import pytest
+from backend.app.core.config import settings
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    # Os testes repetem user_id e IP; o test_ratelimit liga o limite de novo.
+    monkeypatch.setattr(settings, "RATE_LIMIT", False)
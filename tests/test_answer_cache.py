@@ -0,0 +1,63 @@
+import pytest
+import fakeredis
+from backend.app.agents.answer_cache import AnswerCache, REQUESTS
+
+@pytest.fixture
+def cache():
+    return AnswerCache(client=fakeredis.FakeAsyncRedis(decode_responses=True))
+
+@pytest.mark.asyncio
+async def test_exact_and_semantic_tiers(cache):
+    await cache.put("taxa maquininha", [1.0, 0.0, 0.0], "resp", "det", "v1", ["https://x/1"])
+    assert (await cache.get_exact("taxa maquininha", "v1"))[:2] == ("resp", "det")
+    assert await cache.get_exact("taxas maquininha", "v1") is None
+    assert (await cache.get_semantic([0.99, 0.05, 0.0], "v1"))[:2] == ("resp", "det")
+    assert await cache.get_semantic([0.0, 1.0, 0.0], "v1") is None
+    assert REQUESTS.value(tier="semantic", result="hit") >= 1
+    assert (await cache.get_exact("taxa maquininha", "v1")).sources == ("https://x/1",)
+
+@pytest.mark.asyncio
+async def test_new_index_version_invalidates(cache):
+    await cache.put("taxa maquininha", [1.0, 0.0], "resp", "det", "v1")
+    assert await cache.get_exact("taxa maquininha", "v2") is None
+    assert await cache.get_semantic([1.0, 0.0], "v2") is None
+
+@pytest.mark.asyncio
+async def test_size_limit_evicts_least_recently_used(cache, monkeypatch):
+    monkeypatch.setenv("ANSWER_CACHE_MAX", "2")
+    await cache.put("a", [1.0, 0.0], "ra", "d", "v1")
+    await cache.put("b", [0.0, 1.0], "rb", "d", "v1")
+    await cache.get_exact("a", "v1")
+    await cache.put("c", [-1.0, 0.0], "rc", "d", "v1")
+    assert await cache.get_exact("b", "v1") is None
+    assert (await cache.get_exact("a", "v1"))[:2] == ("ra", "d")
+    assert await cache.get_semantic([0.0, 1.0], "v1") is None
+
+@pytest.mark.asyncio
+async def test_redis_errors_are_misses():
+    cache = AnswerCache(client=fakeredis.FakeAsyncRedis(decode_responses=True, connected=False))
+    await cache.put("a", [1.0], "r", "d", "v1")
+    assert await cache.get_exact("a", "v1") is None
+    assert await cache.get_semantic([1.0], "v1") is None
+
+@pytest.mark.asyncio
+async def test_replicas_load_new_entries_without_full_reload(cache):
+    other = AnswerCache(client=cache.client)
+    await cache.put("a", [1.0, 0.0], "ra", "d", "v1")
+    assert (await other.get_semantic([1.0, 0.0], "v1"))[:2] == ("ra", "d")
+    calls = []
+    reload = other._reload
+
+    async def spy(version):
+        calls.append(version)
+        return await reload(version)
+
+    other._reload = spy
+    await cache.put("b", [0.0, 1.0], "rb", "d", "v1")
+    assert (await other.get_semantic([0.0, 1.0], "v1"))[:2] == ("rb", "d")
+    assert (await other.get_semantic([1.0, 0.0], "v1"))[:2] == ("ra", "d")
+    assert calls == []
+    # Remoção (evicção) muda a geração: aí sim recarrega tudo.
+    await cache._drop("v1", ["x"])
+    await other.get_semantic([1.0, 0.0], "v1")
+    assert calls == ["v1"]
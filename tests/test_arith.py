@@ -0,0 +1,37 @@
+from fractions import Fraction
+import pytest
+from backend.app.agents import arith
+from backend.app.agents.math import math_answer
+
+@pytest.mark.parametrize("expr,expected", [
+    ("70+12", "82"),
+    ("65 x 3.11", "202.15"),
+    ("2^3^2", "512"),
+    ("-2^2", "-4"),
+    ("2(3+4)", "14"),
+    ("1000 * 0.0349", "34.9"),
+    ("0.1 + 0.2", "0.3"),
+])
+def test_fast_path_exact(expr, expected):
+    assert arith.to_text(arith.calc(expr)) == expected
+
+def test_rational_result():
+    assert arith.calc("1/3") == Fraction(1, 3)
+    assert arith.to_text(Fraction(1, 3)) == "0.3333333333333333"
+
+def test_limits():
+    with pytest.raises(arith.LimitExceeded):
+        arith.calc("2^99999999")
+    with pytest.raises(arith.LimitExceeded):
+        arith.calc("9^900 * 9^900")
+    with pytest.raises(arith.LimitExceeded):
+        arith.calc("1+" * 200 + "1")
+    with pytest.raises(arith.Unsupported):
+        arith.calc("2^0.5")
+
+@pytest.mark.asyncio
+async def test_math_answer_engines():
+    text, meta = await math_answer("2^99999999")
+    assert "failed" in meta
+    text, meta = await math_answer("2^0.5")
+    assert text.startswith("1.414") and "engine=sympy" in meta
@@ -0,0 +1,29 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from backend.app.rag.batcher import MicroBatcher
+
+def test_concurrent_queries_share_one_forward_pass():
+    calls = []
+    gate = threading.Barrier(8)
+    def encode(texts):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+    b = MicroBatcher(encode, max_batch=8, max_wait_ms=200)
+    def one(i):
+        gate.wait()
+        return b.embed("q" * (i + 1), timeout=5)
+    with ThreadPoolExecutor(8) as ex:
+        out = list(ex.map(one, range(8)))
+    assert out == [[float(i + 1)] for i in range(8)]
+    assert len(calls) < 8
+    assert max(len(c) for c in calls) > 1
+    b.close()
+
+def test_encode_errors_reach_every_caller():
+    def encode(texts):
+        raise RuntimeError("boom")
+    b = MicroBatcher(encode, max_batch=4, max_wait_ms=1)
+    with pytest.raises(RuntimeError):
+        b.embed("x", timeout=5)
+    b.close()
@@ -0,0 +1,45 @@
+import pytest
+from backend.app.rag.chunking import ApproxTokenizer, HFTokenizer, TokenChunker
+from backend.app.rag.extract import Section, extract
+
+HTML = """<html><head><title> Taxas | Ajuda </title><script>var taxa = 1;</script></head><body>
+<nav>Menu</nav><article><h1>Taxas da <b>maquininha</b></h1><p>Valores para MEI e CNPJ.</p>
+<h2>Crédito</h2><p>À vista 3,15%.</p><ul><li>2x: 4,5%</li><li>12x: 12%</li></ul>
+<h3>Parcelado</h3><p>Até 12x<br>sem juros para o cliente.</p><style>.x{}</style>
+<h2>Débito</h2><p>1,37%</p></article></body></html>"""
+
+def test_extract_keeps_heading_path_in_one_parse():
+    page = extract(HTML)
+    assert page.title == "Taxas | Ajuda"
+    assert "Menu" not in page.text and "var taxa" not in page.text and ".x{}" not in page.text
+    assert [s.heading for s in page.sections] == [
+        "Taxas da maquininha", "Taxas da maquininha > Crédito",
+        "Taxas da maquininha > Crédito > Parcelado", "Taxas da maquininha > Débito"]
+    assert page.sections[1].lines == ("Crédito", "À vista 3,15%.", "2x: 4,5%", "12x: 12%")
+    assert page.sections[2].lines[1:] == ("Até 12x", "sem juros para o cliente.")
+
+def _wordpiece():
+    from tokenizers import Tokenizer
+    from tokenizers.models import WordPiece
+    from tokenizers.pre_tokenizers import BertPreTokenizer
+    words = "taxa de da do para o a maquininha crédito débito parcelado pix link pagamento cliente".split()
+    vocab = {w: i for i, w in enumerate(["[UNK]"] + words + ["##s", "##x", "##ão", "##ento"])}
+    tok = Tokenizer(WordPiece(vocab, unk_token="[UNK]"))
+    tok.pre_tokenizer = BertPreTokenizer()
+    return tok
+
+@pytest.mark.parametrize("counter", [ApproxTokenizer(), "wordpiece"])
+def test_chunks_fit_the_window_and_stay_in_their_section(counter):
+    counter = HFTokenizer(_wordpiece()) if counter == "wordpiece" else counter
+    chunker = TokenChunker(counter, max_tokens=40, overlap=8)
+    long_line = " ".join(["taxas do crédito parcelado para o cliente."] * 30)
+    sections = [Section("Taxas", ("Taxas", "débito e pix") + tuple(f"link de pagamento {i}" for i in range(40))),
+                Section("Taxas > Crédito", ("Crédito", long_line))]
+    chunks = chunker.split_sections(sections)
+    assert all(chunker.count(text) <= 40 for text, _ in chunks)
+    credit = [text for text, heading in chunks if heading == "Taxas > Crédito"]
+    assert len(credit) > 1 and all(text.startswith("Crédito") for text in credit)
+    assert not any("link de pagamento" in text for text in credit)
+    # Nenhuma linha se perde entre chunks.
+    joined = "\n".join(text for text, _ in chunks)
+    assert all(f"link de pagamento {i}\n" in joined + "\n" for i in range(40))
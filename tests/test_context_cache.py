@@ -0,0 +1,132 @@
+import json
+import fakeredis
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from backend.app.core.analysis import analyze
+from backend.app.agents import context_cache as context, knowledge
+from backend.app.agents.context_cache import Context, ContextCache
+from backend.app.rag import store
+
+TEXTS = {
+    "a": "Quais são as taxas da maquininha para MEI e CNPJ",
+    "b": "Como contestar um chargeback na InfinitePay",
+    "c": "InfiniteTap: use o celular como maquininha",
+}
+
+@pytest.fixture
+def cache(monkeypatch):
+    c = ContextCache(fakeredis.FakeAsyncRedis(decode_responses=True))
+    monkeypatch.setattr(context, "context_cache", c)
+    monkeypatch.setattr(knowledge, "context_cache", c)
+    return c
+
+@pytest.mark.asyncio
+async def test_roundtrip_is_compact_capped_and_expires(cache, monkeypatch):
+    monkeypatch.setenv("CONTEXT_MAX_IDS", "3")
+    vec = np.linspace(-1, 1, 384)
+    await cache.put("c1", "KnowledgeAgent", vec, ["x", "y"], "v1")
+    ctx = await cache.get("c1")
+    await cache.put("c1", "KnowledgeAgent", vec, ["z", "x"], "v1", previous=ctx)
+    ctx = await cache.get("c1")
+    assert ctx.chunk_ids == ["z", "x", "y"] and ctx.version == "v1"
+    assert np.allclose(ctx.vector, vec, atol=1e-3)
+    # float16: 2 bytes por dimensão (+ base64), não a lista JSON de floats.
+    assert len(await cache.client.hget("ctx:c1", "v")) <= 384 * 2 * 4 // 3 + 4
+    assert 0 < await cache.client.ttl("ctx:c1") <= 1800
+
+    await cache.put("c1", "MathAgent")
+    assert (await cache.get("c1")).route == "MathAgent"
+
+def test_followup_detection():
+    ctx = Context("KnowledgeAgent", "v1", None, ["a"])
+    assert context.is_followup(analyze("e para CNPJ?"), ctx, "v1")
+    assert context.is_followup(analyze("no débito?"), ctx, "v1")
+    assert not context.is_followup(analyze("Como contestar um chargeback na InfinitePay"), ctx, "v1")
+    assert not context.is_followup(analyze("e para CNPJ?"), ctx, "v2")
+    assert not context.is_followup(analyze("e para CNPJ?"), ctx._replace(route="MathAgent"), "v1")
+    assert not context.is_followup(analyze("2 + 2"), ctx, "v1")
+
+def test_followup_vector_rejects_off_topic_short_query():
+    prev = np.array([1.0, 0.0])
+    ctx = Context("KnowledgeAgent", "v1", prev, ["a"])
+    assert context.followup_vector([0.0, 1.0], ctx, marked=False) is None
+    assert np.allclose(context.followup_vector([0.0, 1.0], ctx, marked=True), [2 ** -0.5, 2 ** -0.5])
+
+@pytest.fixture
+def kb(tmp_path, monkeypatch):
+    pages = tmp_path / "pages.json"
+    pages.write_text(json.dumps([f"https://x/{i}" for i in TEXTS]))
+    for k, v in {"PAGES_FILE": str(pages), "PERSIST_DIR": str(tmp_path), "COLLECTION_NAME": "test",
+                 "STORE_RELOAD_CHECK_S": "0", "VECTOR_STORE": "dense", "BM25_FASTPATH": "0",
+                 "ANSWER_CACHE": "0", "RAG_K": "1"}.items():
+        monkeypatch.setenv(k, v)
+    emb = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(store, "_embedding", lambda: emb)
+    vs = store.open_store(str(tmp_path), "test", emb)
+    vs.add_documents([Document(page_content=t, metadata={"url": f"https://x/{i}"}) for i, t in TEXTS.items()],
+                     ids=list(TEXTS))
+    from backend.app.rag import indexer
+    indexer.build_dense(vs, str(tmp_path))
+    monkeypatch.setattr(store, "_warm", store.WarmStore())
+    store.warmup()
+
+def test_rerank_ids_scores_only_candidates(kb):
+    vec = store.embed_query(TEXTS["b"])
+    hits = store.rerank_ids(vec, ["a", "b"], 2)
+    assert [d.id for d, _ in hits] == ["b", "a"] and hits[0][1] == pytest.approx(1.0, abs=1e-3)
+    assert store.rerank_ids(vec, ["nope"], 2) == []
+
+@pytest.mark.asyncio
+async def test_followup_reranks_cached_candidates_without_search(kb, cache, monkeypatch):
+    _, _, decision = await knowledge.aknowledge_solve(TEXTS["a"], "u", "c1", None)
+    assert decision == "vector_rag_validated"
+    ctx = await cache.get("c1")
+    assert ctx.route == "KnowledgeAgent" and ctx.chunk_ids[0] == "a" and set(ctx.chunk_ids) == set(TEXTS)
+
+    def no_search(*args, **kwargs):
+        raise AssertionError("follow-up no assunto não deveria ir ao índice")
+
+    monkeypatch.setattr(store, "hybrid_search", no_search)
+    response, details, decision = await knowledge.aknowledge_solve("e para CNPJ?", "u", "c1", None)
+    assert decision == "vector_rag_validated" and "retrieval=context" in details
+    assert "https://x/a" in response
+    # Outra conversa não herda o contexto: a mesma pergunta curta vai à busca normal.
+    with pytest.raises(AssertionError):
+        await knowledge.aknowledge_solve("e para CNPJ?", "u", "c2", None)
+
+async def _stream(message, conversation_id):
+    return [e async for e in knowledge.knowledge_stream(message, "u", conversation_id, None)]
+
+@pytest.mark.asyncio
+async def test_stream_followup_uses_conversation_context(kb, cache, monkeypatch):
+    events = await _stream(TEXTS["a"], "c1")
+    assert events[-1] == ("result", {**events[-1][1], "decision": "vector_rag_validated"})
+    assert (await cache.get("c1")).chunk_ids[0] == "a"
+
+    def no_search(*args, **kwargs):
+        raise AssertionError("follow-up no assunto não deveria ir ao índice")
+
+    monkeypatch.setattr(store, "hybrid_search", no_search)
+    events = await _stream("e para CNPJ?", "c1")
+    assert events[0] == ("sources", {"sources": ["https://x/a"], "retrieval": "context"})
+    assert "retrieval=context" in events[-1][1]["details"]
+    assert "".join(d["text"] for e, d in events if e == "token") == events[-1][1]["response"]
+
+@pytest.mark.asyncio
+async def test_batch_followup_uses_context_and_skips_answer_cache(kb, cache, monkeypatch):
+    from backend.app.agents.answer_cache import AnswerCache
+    answers = AnswerCache(client=fakeredis.FakeAsyncRedis(decode_responses=True))
+    monkeypatch.setattr(knowledge, "answer_cache", answers)
+    monkeypatch.setenv("ANSWER_CACHE", "1")
+    await knowledge.aknowledge_solve(TEXTS["a"], "u", "c1", None)
+
+    results = await knowledge.aknowledge_solve_many([analyze("e para CNPJ?"), analyze(TEXTS["b"])], ["c1", "c2"])
+    assert "retrieval=context" in results[0][1] and "https://x/a" in results[0][0]
+    assert results[1][2] == "vector_rag_validated"
+    version = store.index_version()
+    # A resposta do follow-up é da conversa c1: não entra no cache compartilhado.
+    assert await answers.get_exact("e para cnpj", version) is None
+    assert await answers.get_exact(" ".join(knowledge._tokenize(TEXTS["b"])), version)
+    assert (await cache.get("c2")).chunk_ids[0] == "b"
@@ -0,0 +1,44 @@
+import fakeredis
+import pytest
+from backend.app.core.convlog import ConversationLogWriter, DROPPED
+
+@pytest.mark.asyncio
+async def test_batches_json_entries_and_paginates():
+    w = ConversationLogWriter(client=fakeredis.FakeAsyncRedis(decode_responses=True), batch_size=4)
+    for i in range(10):
+        w.enqueue("c1", {"agent": "RouterAgent", "n": i})
+    await w.flush()
+    page, cursor = await w.read("c1", limit=4)
+    assert [e["n"] for e in page] == [0, 1, 2, 3]
+    seen = [e["n"] for e in page]
+    while cursor:
+        page, cursor = await w.read("c1", cursor=cursor, limit=4)
+        seen += [e["n"] for e in page]
+    assert seen == list(range(10))
+    assert await w.client.ttl("chatlog:c1") > 0
+    await w.stop()
+
+@pytest.mark.asyncio
+async def test_keeps_entries_while_redis_is_down():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    w = ConversationLogWriter(client=fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+    w.enqueue("c1", {"n": 1})
+    with pytest.raises(Exception):
+        await w.flush()
+    assert w.pending() == 1
+    server.connected = True
+    await w.flush()
+    assert [e["n"] for e in (await w.read("c1"))[0]] == [1]
+    await w.stop()
+
+@pytest.mark.asyncio
+async def test_full_buffer_drops_oldest():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    w = ConversationLogWriter(client=fakeredis.FakeAsyncRedis(server=server, decode_responses=True), max_buffer=2)
+    before = DROPPED.value()
+    for i in range(3):
+        w.enqueue("c1", {"n": i})
+    assert w.pending() == 2 and DROPPED.value() == before + 1
+    await w.stop()
@@ -0,0 +1,48 @@
+import httpx
+import pytest
+from backend.app.rag.pages_manual import crawl_async, BASE
+
+ROOT = "/pt-BR/"
+PAGES = 40
+
+def _site(request: httpx.Request) -> httpx.Response:
+    path, page = request.url.path, int(request.url.params.get("page", "1"))
+    if path == ROOT:
+        body = '<a href="/pt-BR/collections/1-taxas">Taxas</a><a href="/pt-BR/articles/0-home">x</a>'
+    elif path == "/pt-BR/collections/1-taxas":
+        links = [f'<a href="/pt-BR/articles/{page}{i}-artigo">a</a>' for i in range(2)]
+        if page < PAGES:
+            links.append(f'<a href="?page={page + 1}">próxima</a>')
+        links.append('<a href="https://outro.site/pt-BR/collections/x">fora</a>')
+        body = "<ul>" + "".join(links) + "</ul>"
+    else:
+        return httpx.Response(404)
+    return httpx.Response(200, text=f"<html><body>{body}</body></html>")
+
+@pytest.mark.asyncio
+async def test_async_crawler_walks_deep_pagination():
+    async with httpx.AsyncClient(transport=httpx.MockTransport(_site)) as client:
+        urls, stats = await crawl_async(BASE, concurrency=4, client=client)
+    assert len(urls) == PAGES * 2
+    assert not any("/0-home" in u for u in urls)
+    report = stats.report()
+    assert report["pages"] == PAGES + 1 and report["bytes"] > 0 and report["errors"] == 0
+
+@pytest.mark.asyncio
+async def test_async_crawler_depth_cap():
+    async with httpx.AsyncClient(transport=httpx.MockTransport(_site)) as client:
+        urls, stats = await crawl_async(BASE, concurrency=2, max_depth=3, client=client)
+    assert len(urls) == 3 * 2
+    assert stats.skipped_depth == 1
+
+@pytest.mark.asyncio
+async def test_retries_transient_errors(monkeypatch):
+    calls = {"n": 0}
+    def flaky(request):
+        calls["n"] += 1
+        if calls["n"] < 3:
+            return httpx.Response(503)
+        return _site(request)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(flaky)) as client:
+        urls, stats = await crawl_async(BASE, concurrency=1, max_depth=1, client=client)
+    assert stats.retries == 2 and len(urls) == 2
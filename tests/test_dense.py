@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from backend.app.rag import indexer, store
+from backend.app.rag.dense import DenseIndex, DENSE_DIR
+
+TEXTS = {
+    "a": "Quais são as taxas da maquininha para MEI e CNPJ",
+    "b": "Como contestar um chargeback na InfinitePay",
+    "c": "InfiniteTap: use o celular como maquininha",
+    "d": "Taxas do link de pagamento e parcelamento",
+}
+
+def _clustered(n=3000, dim=32, clusters=40, seed=1):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    x = centers[rng.integers(0, clusters, n)] + rng.normal(scale=0.3, size=(n, dim))
+    queries = x[rng.integers(0, n, 50)] + rng.normal(scale=0.3, size=(50, dim))
+    return x.astype(np.float32), queries.astype(np.float32)
+
+def test_flat_roundtrip_keeps_documents(tmp_path):
+    emb = DeterministicFakeEmbedding(size=16)
+    idx = DenseIndex.from_texts(list(TEXTS.values()), emb, [{"url": f"https://x/{i}"} for i in TEXTS],
+                                ids=list(TEXTS))
+    idx.save(str(tmp_path / DENSE_DIR))
+    loaded = DenseIndex.load(str(tmp_path / DENSE_DIR), emb)
+    assert isinstance(loaded.vectors, np.memmap) and loaded.centroids is None
+    doc = loaded.similarity_search(TEXTS["b"], k=1)[0]
+    assert (doc.id, doc.page_content, doc.metadata) == ("b", TEXTS["b"], {"url": "https://x/b"})
+    assert [d.id for d in loaded.get_by_ids(["c", "zz", "a"])] == ["c", "a"]
+    assert loaded.as_retriever(search_kwargs={"k": 2}).invoke(TEXTS["d"])[0].id == "d"
+
+def test_ivf_recall_close_to_flat():
+    x, queries = _clustered()
+    ids = [str(i) for i in range(len(x))]
+    flat = DenseIndex.build(ids, x, ids, [{}] * len(x), ivf_min=10**9)
+    ivf = DenseIndex.build(ids, x, ids, [{}] * len(x), ivf_min=1000)
+    assert ivf.centroids is not None and ivf.list_offsets[-1] == len(x)
+    hits = 0
+    for q in queries:
+        want = {flat.ids[i] for i, _ in flat.search_vector(q, k=10)}
+        got = {ivf.ids[i] for i, _ in ivf.search_vector(q, k=10)}
+        hits += len(want & got)
+    assert hits / (10 * len(queries)) >= 0.9
+
+def test_float16_matches_float32_ranking():
+    x, queries = _clustered(n=500)
+    ids = [str(i) for i in range(len(x))]
+    f32 = DenseIndex.build(ids, x, ids, [{}] * len(x))
+    f16 = DenseIndex.build(ids, x, ids, [{}] * len(x), dtype="float16")
+    assert f16.vectors.dtype == np.float16
+    for q in queries[:10]:
+        assert f16.search_vector(q, k=1)[0][0] == f32.search_vector(q, k=1)[0][0]
+
+@pytest.fixture
+def dense_store(tmp_path, monkeypatch):
+    monkeypatch.setenv("PERSIST_DIR", str(tmp_path))
+    monkeypatch.setenv("COLLECTION_NAME", "test")
+    monkeypatch.setenv("STORE_RELOAD_CHECK_S", "0")
+    monkeypatch.setenv("VECTOR_STORE", "dense")
+    monkeypatch.setenv("BM25_FASTPATH", "0")
+    monkeypatch.setattr(store, "_embedding", lambda: DeterministicFakeEmbedding(size=16))
+    vs = store.open_store(str(tmp_path), "test", DeterministicFakeEmbedding(size=16))
+    vs.add_documents([Document(page_content=t, metadata={"url": f"https://x/{i}"}) for i, t in TEXTS.items()],
+                     ids=list(TEXTS))
+    indexer.build_dense(vs, str(tmp_path))
+    monkeypatch.setattr(store, "_warm", store.WarmStore())
+
+def test_store_serves_from_dense_index(dense_store):
+    assert isinstance(store.warmup(), DenseIndex)
+    assert store.status()["vector_store"] == "dense"
+    docs, mode = store.hybrid_search(TEXTS["c"], k=2)
+    assert mode == "vector" and docs[0].id == "c" and docs[0].metadata["url"] == "https://x/c"
+    assert store.retriever(k=1).invoke(TEXTS["a"])[0].id == "a"
+
+def test_empty_store_builds_empty_index(tmp_path, monkeypatch):
+    monkeypatch.setenv("STORE_RELOAD_CHECK_S", "0")
+    monkeypatch.setenv("VECTOR_STORE", "dense")
+    emb = DeterministicFakeEmbedding(size=16)
+    vs = store.open_store(str(tmp_path), "empty", emb)
+    idx = indexer.build_dense(vs, str(tmp_path))
+    assert idx.n == 0 and idx.vectors.shape == (0, 16)
+    loaded = DenseIndex.load(str(tmp_path / DENSE_DIR), emb)
+    assert loaded.vectors.shape == (0, 16)
+    assert loaded.similarity_search(TEXTS["a"], k=2) == [] and loaded.search_vectors([[1.0] * 16]) == [[]]
+
+def test_add_texts_is_read_only():
+    idx = DenseIndex.from_texts(list(TEXTS.values()), DeterministicFakeEmbedding(size=16), ids=list(TEXTS))
+    with pytest.raises(TypeError, match="somente leitura"):
+        idx.add_texts(["novo"])
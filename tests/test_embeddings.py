@@ -0,0 +1,175 @@
+import json, math, os, struct
+import numpy as np
+import pytest
+from backend.app.rag import embeddings
+
+def _write_safetensors(path, tensors):
+    header, blobs, offset = {}, [], 0
+    for name, arr in tensors.items():
+        raw = np.ascontiguousarray(arr, dtype=np.float32).tobytes()
+        header[name] = {"dtype": "F32", "shape": list(arr.shape), "data_offsets": [offset, offset + len(raw)]}
+        blobs.append(raw)
+        offset += len(raw)
+    h = json.dumps(header).encode()
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(h)) + h + b"".join(blobs))
+
+def _tiny_bert(hidden=8, heads=2, layers=2, inter=16, vocab=32, seed=0):
+    rng = np.random.default_rng(seed)
+    r = lambda *s: rng.normal(0, 0.5, s).astype(np.float32)
+    w = {
+        "embeddings.word_embeddings.weight": r(vocab, hidden),
+        "embeddings.position_embeddings.weight": r(16, hidden),
+        "embeddings.token_type_embeddings.weight": r(2, hidden),
+        "embeddings.LayerNorm.weight": np.ones(hidden, np.float32),
+        "embeddings.LayerNorm.bias": np.zeros(hidden, np.float32),
+    }
+    for i in range(layers):
+        p = f"encoder.layer.{i}."
+        for name, (o, n) in {"attention.self.query": (hidden, hidden), "attention.self.key": (hidden, hidden),
+                             "attention.self.value": (hidden, hidden), "attention.output.dense": (hidden, hidden),
+                             "intermediate.dense": (inter, hidden), "output.dense": (hidden, inter)}.items():
+            w[p + name + ".weight"], w[p + name + ".bias"] = r(o, n), r(o)
+        for ln in ("attention.output.LayerNorm", "output.LayerNorm"):
+            w[p + ln + ".weight"], w[p + ln + ".bias"] = np.ones(hidden, np.float32), np.zeros(hidden, np.float32)
+    config = {"num_hidden_layers": layers, "num_attention_heads": heads, "layer_norm_eps": 1e-12}
+    return w, config
+
+def _tokenizer(words):
+    from tokenizers import Tokenizer
+    from tokenizers.models import WordLevel
+    from tokenizers.pre_tokenizers import Whitespace
+    tok = Tokenizer(WordLevel({w: i for i, w in enumerate(["[PAD]", "[UNK]"] + words)}, unk_token="[UNK]"))
+    tok.pre_tokenizer = Whitespace()
+    tok.enable_padding(pad_id=0, pad_token="[PAD]")
+    return tok
+
+def test_backend_is_validated(monkeypatch):
+    monkeypatch.delenv("EMBEDDING_BACKEND", raising=False)
+    assert embeddings.backend() == "torch"
+    monkeypatch.setenv("EMBEDDING_BACKEND", "ONNX-int8")
+    assert embeddings.backend() == "onnx-int8"
+    monkeypatch.setenv("EMBEDDING_BACKEND", "tensorflow")
+    with pytest.raises(ValueError):
+        embeddings.backend()
+
+def test_local_backends_need_the_warmed_model(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        embeddings.create(str(tmp_path / "missing"), "onnx")
+
+def test_encoder_needs_a_forward():
+    with pytest.raises(TypeError):
+        embeddings.EncoderEmbeddings(tokenizer=None)
+
+def test_safetensors_roundtrip(tmp_path):
+    w, _ = _tiny_bert()
+    _write_safetensors(tmp_path / "model.safetensors", w)
+    loaded = embeddings.read_safetensors(str(tmp_path / "model.safetensors"))
+    assert set(loaded) == set(w)
+    np.testing.assert_array_equal(loaded["encoder.layer.1.intermediate.dense.weight"],
+                                  w["encoder.layer.1.intermediate.dense.weight"])
+
+def test_numpy_encoder_ignores_padding():
+    pytest.importorskip("tokenizers")
+    w, config = _tiny_bert()
+    emb = embeddings.NumpyEmbeddings(_tokenizer("taxa da maquininha link de pagamento pix".split()), w, config)
+    alone = np.array(emb.embed_query("taxa da maquininha"))
+    batch = np.array(emb.embed_documents(["taxa da maquininha", "link de pagamento com pix e taxa"]))
+    assert np.linalg.norm(alone) == pytest.approx(1.0, abs=1e-5)
+    np.testing.assert_allclose(batch[0], alone, atol=1e-5)
+    assert not np.allclose(batch[0], batch[1])
+
+def _reference(w, config, ids):
+    """Forward do BERT token a token, cabeça a cabeça, em float64: a conta do paper, sem broadcast nem máscara."""
+    heads, eps = config["num_attention_heads"], config["layer_norm_eps"]
+    lin = lambda v, name: w[name + ".weight"].astype(np.float64) @ v + w[name + ".bias"]
+
+    def ln(v, name):
+        mu, var = v.mean(), ((v - v.mean()) ** 2).mean()
+        return (v - mu) / math.sqrt(var + eps) * w[name + ".weight"] + w[name + ".bias"]
+
+    xs = [ln(w["embeddings.word_embeddings.weight"][t].astype(np.float64)
+             + w["embeddings.position_embeddings.weight"][i] + w["embeddings.token_type_embeddings.weight"][0],
+             "embeddings.LayerNorm") for i, t in enumerate(ids)]
+    for layer in range(config["num_hidden_layers"]):
+        p = f"encoder.layer.{layer}."
+        q = [lin(x, p + "attention.self.query") for x in xs]
+        k = [lin(x, p + "attention.self.key") for x in xs]
+        v = [lin(x, p + "attention.self.value") for x in xs]
+        d = len(xs[0]) // heads
+        out = []
+        for t in range(len(xs)):
+            ctx = []
+            for h in range(heads):
+                sl = slice(h * d, (h + 1) * d)
+                e = [math.exp(float(q[t][sl] @ k[s][sl]) / math.sqrt(d)) for s in range(len(xs))]
+                ctx.extend(sum(e[s] / sum(e) * v[s][sl] for s in range(len(xs))))
+            x = ln(xs[t] + lin(np.array(ctx), p + "attention.output.dense"), p + "attention.output.LayerNorm")
+            hid = np.array([0.5 * u * (1 + math.erf(u / math.sqrt(2))) for u in lin(x, p + "intermediate.dense")])
+            out.append(ln(x + lin(hid, p + "output.dense"), p + "output.LayerNorm"))
+        xs = out
+    pooled = np.mean(xs, axis=0)
+    return pooled / np.linalg.norm(pooled)
+
+def test_numpy_encoder_matches_reference_forward(tmp_path):
+    pytest.importorskip("tokenizers")
+    words = "taxa da maquininha link de pagamento pix".split()
+    w, config = _tiny_bert()
+    rng = np.random.default_rng(1)
+    for name in w:
+        if "LayerNorm" in name:
+            w[name] = rng.normal(1.0 if name.endswith("weight") else 0.0, 0.2, w[name].shape).astype(np.float32)
+    # Pasta como a do warmup: pesos com prefixo "bert." (BertModel), config e tokenizer.
+    _write_safetensors(tmp_path / "model.safetensors", {"bert." + k: v for k, v in w.items()})
+    (tmp_path / "config.json").write_text(json.dumps({**config, "max_position_embeddings": 16}))
+    _tokenizer(words).save(str(tmp_path / "tokenizer.json"))
+    emb = embeddings.NumpyEmbeddings.from_dir(str(tmp_path))
+    texts = ["taxa da maquininha", "link de pagamento com pix e taxa"]
+    got = np.array(emb.embed_documents(texts))
+    vocab = {t: i for i, t in enumerate(["[PAD]", "[UNK]"] + words)}
+    for text, row in zip(texts, got):
+        want = _reference(w, config, [vocab.get(t, 1) for t in text.split()])
+        np.testing.assert_allclose(row, want, atol=1e-4)
+
+# Consultas → documento esperado, no vocabulário do Help Center.
+DOCS = {
+    "taxas": "Taxas da maquininha: débito, crédito à vista e parcelado para MEI e CNPJ.",
+    "link": "Link de pagamento: crie um link e receba por Pix ou cartão de crédito.",
+    "tap": "InfiniteTap: use o celular como maquininha e aceite pagamentos por aproximação.",
+    "chargeback": "Chargeback: como contestar uma compra não reconhecida pelo portador do cartão.",
+    "conta": "Conta digital: transferências, Pix e boletos sem tarifa.",
+    "entrega": "Prazo de entrega da maquininha Smart depois da compra.",
+}
+QUERIES = [
+    ("qual a taxa do crédito parcelado na maquininha?", "taxas"),
+    ("como receber com link de pagamento", "link"),
+    ("dá pra usar o celular como maquininha?", "tap"),
+    ("cliente contestou a compra no cartão", "chargeback"),
+    ("quanto tempo para a maquininha chegar", "entrega"),
+    ("transferência pix na conta tem tarifa?", "conta"),
+]
+
+def _recall(emb, k):
+    ids = list(DOCS)
+    d = np.array(emb.embed_documents([DOCS[i] for i in ids]))
+    q = np.array(emb.embed_documents([text for text, _ in QUERIES]))
+    top = np.argsort(-(q @ d.T), axis=1)[:, :k]
+    return sum(ids.index(want) in row for row, (_, want) in zip(top, QUERIES)) / len(QUERIES), q
+
+def test_backends_keep_recall_within_tolerance():
+    model_dir = os.getenv("EMBEDDING_TEST_MODEL_DIR", "")
+    if not os.path.isdir(model_dir):
+        pytest.skip("modelo local ausente (python -m app.rag.warmup --model-dir ... e EMBEDDING_TEST_MODEL_DIR)")
+    results = {}
+    for name in embeddings.BACKENDS:
+        try:
+            results[name] = _recall(embeddings.create(model_dir, name), k=2)
+        except ImportError:
+            continue
+    ref_name = "torch" if "torch" in results else "onnx"
+    ref_recall, ref_q = results[ref_name]
+    assert ref_recall >= 0.8
+    for name, (recall, q) in results.items():
+        assert recall >= ref_recall - 0.17, name
+        # Mesma geometria: a consulta de cada backend aponta para o mesmo lugar que a da referência.
+        assert float(np.min(np.sum(q * ref_q, axis=1))) > (0.9 if name == "onnx-int8" else 0.99), name
@@ -0,0 +1,141 @@
+import hashlib, json, os, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from backend.app.rag import chunking, indexer, store
+
+BODY = "<html><head><title>{t}</title></head><body><article><p>{t}: " + "texto da central de ajuda. " * 10 + "</p></article></body></html>"
+
+class _Site(BaseHTTPRequestHandler):
+    pages: dict = {}
+    hits: list = []
+
+    def do_GET(self):
+        html = self.pages.get(self.path)
+        if html is None:
+            self.send_response(404); self.end_headers(); return
+        etag = '"%s"' % hashlib.md5(html.encode()).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.hits.append((self.path, 304))
+            self.send_response(304); self.end_headers(); return
+        self.hits.append((self.path, 200))
+        data = html.encode()
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def site():
+    _Site.pages = {f"/p{i}": BODY.format(t=f"page {i}") for i in range(4)}
+    _Site.hits = []
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Site)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+
+def test_incremental_sync(site, tmp_path):
+    vs = store.open_store(str(tmp_path), "test", DeterministicFakeEmbedding(size=8))
+    splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=0)
+    manifest = str(tmp_path / indexer.MANIFEST)
+    urls = [f"{site}/p{i}" for i in range(4)]
+
+    first = indexer.sync_index(urls, vs, splitter, manifest, concurrency=4, rps=0)
+    assert first["changed"] == 4 and first["chunks_embedded"] > 0
+    total = len(vs.get(include=[])["ids"])
+
+    again = indexer.sync_index(urls, vs, splitter, manifest, concurrency=4, rps=0)
+    assert again["unchanged"] == 4 and again["chunks_embedded"] == 0
+    assert sum(1 for _, code in _Site.hits if code == 304) == 4
+
+    _Site.pages["/p1"] = BODY.format(t="page 1 v2")
+    third = indexer.sync_index(urls[:3], vs, splitter, manifest, concurrency=4, rps=0)
+    assert third["changed"] == 1 and third["removed"] == 1
+    left = vs.get(include=["metadatas"])
+    assert len(left["ids"]) == total * 3 // 4
+    assert all(m["url"] != urls[3] for m in left["metadatas"])
+
+def test_rate_limiter_spaces_requests_per_host():
+    import time
+    lim = indexer.HostRateLimiter(rps=50)
+    t0 = time.monotonic()
+    for _ in range(5):
+        lim.wait("a")
+    lim.wait("b")
+    assert time.monotonic() - t0 >= 4 / 50
+
+def test_pages_are_parsed_in_a_process_pool_with_headings(site, tmp_path):
+    _Site.pages["/h"] = ("<html><head><title>Taxas</title></head><body><article><h1>Taxas</h1>"
+                         "<p>" + "texto da central de ajuda. " * 10 + "</p><h2>Pix</h2><p>Pix sem tarifa.</p>"
+                         "</article></body></html>")
+    vs = store.open_store(str(tmp_path), "test", DeterministicFakeEmbedding(size=8))
+    splitter = chunking.TokenChunker(chunking.ApproxTokenizer(), max_tokens=64, overlap=0)
+    stats = indexer.sync_index([f"{site}/h", f"{site}/p0"], vs, splitter, str(tmp_path / indexer.MANIFEST),
+                               concurrency=2, rps=0, workers=2)
+    assert stats["changed"] == 2 and stats["pages_per_s"] > 0
+    got = vs.get(include=["documents", "metadatas"])
+    by_heading = {m["heading"]: d for d, m in zip(got["documents"], got["metadatas"])}
+    assert by_heading["Taxas > Pix"] == "Pix\nPix sem tarifa."
+    assert all(m["title"] for m in got["metadatas"])
+
+def test_new_chunker_version_rechunks_unchanged_pages(site, tmp_path):
+    vs = store.open_store(str(tmp_path), "test", DeterministicFakeEmbedding(size=8))
+    manifest = str(tmp_path / indexer.MANIFEST)
+    urls = [f"{site}/p{i}" for i in range(4)]
+    indexer.sync_index(urls, vs, chunking.TokenChunker(chunking.ApproxTokenizer(), max_tokens=64, overlap=0),
+                       manifest, concurrency=4, rps=0)
+    # Manifesto antigo, de antes da versão do chunker: nada pode ser pulado.
+    with open(manifest, encoding="utf-8") as f:
+        old = {u: {k: v for k, v in e.items() if k != "chunker"} for u, e in json.load(f).items()}
+    indexer.save_manifest(manifest, old)
+    _Site.hits = []
+    smaller = chunking.TokenChunker(chunking.ApproxTokenizer(), max_tokens=32, overlap=0)
+    stats = indexer.sync_index(urls, vs, smaller, manifest, concurrency=4, rps=0)
+    assert stats["changed"] == 4 and stats["unchanged"] == 0
+    assert all(code == 200 for _, code in _Site.hits)
+    assert all(smaller.count(d) <= 32 for d in vs.get(include=["documents"])["documents"])
+    # Mesma versão: volta a pular tudo.
+    again = indexer.sync_index(urls, vs, smaller, manifest, concurrency=4, rps=0)
+    assert again["unchanged"] == 4 and again["chunks_embedded"] == 0
+
+def test_lost_manifest_keeps_chunks_of_pages_not_fetched(site, tmp_path):
+    vs = store.open_store(str(tmp_path), "test", DeterministicFakeEmbedding(size=8))
+    splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=0)
+    manifest = str(tmp_path / indexer.MANIFEST)
+    urls = [f"{site}/p{i}" for i in range(4)]
+    indexer.sync_index(urls, vs, splitter, manifest, concurrency=4, rps=0)
+    before = set(vs.get(include=[])["ids"])
+
+    # Sem manifesto e sem rede: a coleção fica como está.
+    os.remove(manifest)
+    pages, _Site.pages = _Site.pages, {}
+    stats = indexer.sync_index(urls, vs, splitter, manifest, concurrency=4, rps=0)
+    assert stats["errors"] == 4 and stats["chunks_deleted"] == 0
+    assert set(vs.get(include=[])["ids"]) == before and not os.path.exists(manifest)
+
+    # Só /p0 volta: os chunks das outras páginas continuam, /p0 é refeito.
+    _Site.pages = {"/p0": pages["/p0"]}
+    stats = indexer.sync_index(urls, vs, splitter, manifest, concurrency=4, rps=0)
+    assert stats["changed"] == 1 and stats["errors"] == 3
+    assert set(vs.get(include=[])["ids"]) == before
+    _Site.pages = pages
+
+class _CountingChunker(chunking.TokenChunker):
+    pickles = 0
+
+    def __getstate__(self):
+        type(self).pickles += 1
+        return self.__dict__
+
+def test_splitter_is_sent_once_per_worker(site, tmp_path):
+    _Site.pages.update({f"/q{i}": BODY.format(t=f"page q{i}") for i in range(6)})
+    vs = store.open_store(str(tmp_path), "test", DeterministicFakeEmbedding(size=8))
+    splitter = _CountingChunker(chunking.ApproxTokenizer(), max_tokens=64, overlap=0)
+    stats = indexer.sync_index([f"{site}/q{i}" for i in range(6)], vs, splitter, str(tmp_path / indexer.MANIFEST),
+                               concurrency=3, rps=0, workers=2)
+    assert stats["changed"] == 6 and 0 < _CountingChunker.pickles <= 2
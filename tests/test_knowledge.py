@@ -0,0 +1,43 @@
+import json, os
+import pytest
+from backend.app.agents import knowledge
+
+def test_allowlist_is_cached_until_pages_file_changes(tmp_path, monkeypatch):
+    pages = tmp_path / "pages.json"
+    pages.write_text(json.dumps(["https://ajuda.x/pt-BR/articles/1-taxas/?utm=a"]))
+    monkeypatch.setenv("PAGES_FILE", str(pages))
+
+    first = knowledge._allowlist()
+    assert dict(first) == {"https://ajuda.x/pt-BR/articles/1-taxas": "https://ajuda.x/pt-BR/articles/1-taxas/?utm=a"}
+    assert knowledge._allowlist() is first
+
+    pages.write_text(json.dumps(["https://ajuda.x/pt-BR/articles/2-pix"]))
+    st = os.stat(pages)
+    os.utime(pages, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    second = knowledge._allowlist()
+    assert second is not first
+    assert "https://ajuda.x/pt-BR/articles/2-pix" in second
+
+@pytest.mark.asyncio
+async def test_solve_keeps_the_decision_of_the_answer(monkeypatch):
+    for k in ("ANSWER_CACHE", "CONTEXT_CACHE"):
+        monkeypatch.setenv(k, "0")
+    monkeypatch.setattr(knowledge, "_allowlist", lambda: {})
+    response, details, decision = await knowledge.aknowledge_solve("qual a taxa da maquininha?", "u", "c", None)
+    assert decision == "no_pages" and details.startswith("Sources: []")
+
+@pytest.mark.asyncio
+async def test_bm25_check_runs_off_the_event_loop(monkeypatch):
+    import threading
+    from backend.app.rag import store
+    threads = []
+
+    def confident(text):
+        threads.append(threading.current_thread())
+        return True
+
+    monkeypatch.setenv("ANSWER_CACHE", "1")
+    monkeypatch.setattr(store, "keyword_confident", confident)
+    monkeypatch.setattr(knowledge, "_answer_in_context", lambda *a: (("r", "d", "no_valid_hits"), knowledge.Retrieval(0.0, [], [], "bm25")))
+    await knowledge.aknowledge_solve("maquininha", "u", "c", None)
+    assert threads and threading.main_thread() not in threads
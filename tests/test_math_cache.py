@@ -0,0 +1,38 @@
+import pytest
+import fakeredis
+from backend.app.agents import arith
+from backend.app.agents.math_cache import MathCache, REQUESTS, EVICTIONS, key
+
+def test_key_is_canonical():
+    assert key(*arith.lex("1000 x 0.0349")) == key(*arith.lex(" 1000*0.0349 ")) == "1000*0.0349"
+    assert key(*arith.lex("2 ** 3")) == "2^3"
+
+@pytest.mark.asyncio
+async def test_local_lru_cap_and_templates():
+    cache = MathCache(client=fakeredis.FakeAsyncRedis(decode_responses=True), max_entries=2)
+    before = EVICTIONS.value(tier="local")
+    for k in ("1+1", "2+2", "3+3"):
+        await cache.put(k, (k, "engine=fast"))
+    assert await cache.get("1+1") is None
+    assert await cache.get("3+3") == (("3+3", "engine=fast"), "local")
+    assert EVICTIONS.value(tier="local") == before + 1
+    shape_a, _ = arith.lex("1000 * 0.0349")
+    shape_b, _ = arith.lex("250 x 0.05")
+    assert cache.template(shape_a) is cache.template(shape_b)
+
+@pytest.mark.asyncio
+async def test_redis_tier_shared_between_instances(monkeypatch):
+    monkeypatch.setenv("MATH_CACHE_REDIS", "1")
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    await MathCache(client=client).put("2^0.5", ("1.4142135623730951", "engine=sympy"))
+    hit = await MathCache(client=client).get("2^0.5")
+    assert hit == (("1.4142135623730951", "engine=sympy"), "redis")
+    assert REQUESTS.value(tier="redis", result="hit") >= 1
+
+@pytest.mark.asyncio
+async def test_redis_errors_are_misses(monkeypatch):
+    monkeypatch.setenv("MATH_CACHE_REDIS", "1")
+    cache = MathCache(client=fakeredis.FakeAsyncRedis(decode_responses=True, connected=False))
+    await cache.put("1+1", ("2", "engine=fast"))
+    assert await cache.get("2+2") is None
+    assert await cache.get("1+1") == (("2", "engine=fast"), "local")
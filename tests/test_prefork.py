@@ -0,0 +1,53 @@
+import os
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from backend.app.core import redis as core_redis
+from backend.app.rag import batcher, store
+from backend.app.serve import Restarts
+
+def _in_child(fn) -> bytes:
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        try:
+            os.write(w, fn())
+        finally:
+            os._exit(0)
+    os.close(w)
+    out = os.read(r, 64)
+    os.waitpid(pid, 0)
+    return out
+
+def test_redis_client_is_per_process():
+    parent = core_redis.redis_client.get()
+    assert core_redis.redis_client.get() is parent
+    child = _in_child(lambda: str(id(core_redis.redis_client.get()) == id(parent)).encode())
+    assert child == b"False"
+
+def test_store_reopens_after_fork_keeping_the_model(tmp_path, monkeypatch):
+    monkeypatch.setenv("PERSIST_DIR", str(tmp_path))
+    monkeypatch.setenv("COLLECTION_NAME", "test")
+    monkeypatch.setenv("STORE_RELOAD_CHECK_S", "0")
+    loads = []
+    monkeypatch.setattr(store, "_embedding", lambda: loads.append(1) or DeterministicFakeEmbedding(size=16))
+    store.open_store(str(tmp_path), "test", DeterministicFakeEmbedding(size=16)).add_documents(
+        [Document(page_content="taxas da maquininha", metadata={"url": "https://x/a"})]
+    )
+    warm = store.WarmStore()
+    warm.preload()
+    base = warm._emb.base if isinstance(warm._emb, batcher.BatchedEmbeddings) else warm._emb
+    warm.after_fork()
+    assert not warm.ready
+    warm.get()
+    assert warm.ready and len(loads) == 1
+    assert (warm._emb.base if isinstance(warm._emb, batcher.BatchedEmbeddings) else warm._emb) is base
+
+def test_restarts_back_off_and_give_up():
+    now = [0.0]
+    restarts = Restarts(max_restarts=4, window_s=60, base_s=0.5, cap_s=0.75, clock=lambda: now[0])
+    assert [restarts.next_delay() for _ in range(4)] == [0.0, 0.5, 0.75, 0.75]
+    assert restarts.next_delay() is None
+    # Fora da janela os reinícios antigos deixam de contar.
+    now[0] = 61.0
+    assert restarts.next_delay() == 0.0
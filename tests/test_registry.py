@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from backend.app.agents import registry
+from backend.app.core.analysis import analyze
+
+def _agent(name, score, answer, delay=0.0, confident=True, timeout=5.0):
+    async def run(a, user_id, cid, log):
+        await asyncio.sleep(delay)
+        return answer, name, "ok" if confident else "weak"
+    return registry.Agent(name, lambda a: score, run, lambda a, r: r[2] == "ok", f"{name.upper()}_T", timeout)
+
+@pytest.fixture
+def agents(monkeypatch):
+    monkeypatch.setattr(registry, "_AGENTS", {})
+    return lambda *specs: [registry.register(s) for s in specs]
+
+@pytest.mark.asyncio
+async def test_top_confident_cancels_rest(agents):
+    agents(_agent("Fast", 0.9, "a"), _agent("Slow", 0.5, "b", delay=5))
+    agent, result, traces = await registry.dispatch(analyze("x"), "u", "c", None)
+    assert agent.name == "Fast" and result[0] == "a"
+    assert [(t["agent"], t["outcome"]) for t in traces] == [("Slow", "cancelled"), ("Fast", "winner")]
+
+@pytest.mark.asyncio
+async def test_speculative_candidate_wins_when_top_is_not_confident(agents):
+    agents(_agent("Top", 0.9, "weak", delay=0.05, confident=False), _agent("Spec", 0.5, "good"))
+    agent, result, traces = await registry.dispatch(analyze("x"), "u", "c", None)
+    assert agent.name == "Spec"
+    assert [(t["agent"], t["outcome"]) for t in traces] == [("Top", "loser"), ("Spec", "winner")]
+
+@pytest.mark.asyncio
+async def test_per_agent_timeout_and_low_scores_not_dispatched(agents):
+    agents(_agent("Top", 0.9, "late", delay=1, timeout=0.05), _agent("Spec", 0.5, "b"),
+           _agent("Never", 0.1, "c"))
+    agent, _, traces = await registry.dispatch(analyze("x"), "u", "c", None)
+    assert agent.name == "Spec"
+    assert [(t["agent"], t["outcome"]) for t in traces] == [("Top", "timeout"), ("Spec", "winner")]
+
+@pytest.mark.asyncio
+async def test_top_error_propagates_without_confident_answer(agents, monkeypatch):
+    async def boom(a, user_id, cid, log):
+        raise RuntimeError("saturated")
+    agents(registry.Agent("Top", lambda a: 0.9, boom, lambda a, r: True, "TOP_T"),
+           _agent("Spec", 0.5, "weak", confident=False))
+    with pytest.raises(RuntimeError):
+        await registry.dispatch(analyze("x"), "u", "c", None)
+
+def test_builtin_scores_keep_routing():
+    from backend.app.agents import router  # registra MathAgent e KnowledgeAgent
+    names = lambda m: [a.name for a, _ in registry.candidates(analyze(m))]
+    assert names("70 + 12") == ["MathAgent"]
+    assert names("Qual a taxa da maquininha?") == ["KnowledgeAgent"]
+    assert names("taxa de 3% em 1200") == ["KnowledgeAgent", "MathAgent"]
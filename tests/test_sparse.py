@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from backend.app.rag import store
+from backend.app.rag.sparse import SparseIndex, rrf_fuse, SPARSE_DIR
+
+TEXTS = {
+    "a": "Quais são as taxas da maquininha para MEI e CNPJ",
+    "b": "Como contestar um chargeback na InfinitePay",
+    "c": "InfiniteTap: use o celular como maquininha",
+    "d": "Taxas do link de pagamento e parcelamento",
+}
+
+def test_bm25_ranks_keyword_matches():
+    idx = SparseIndex.build(list(TEXTS), list(TEXTS.values()))
+    assert idx.search("chargeback", k=2)[0][0] == "b"
+    assert idx.search("infinitetap", k=2)[0][0] == "c"
+    assert idx.search("qual a", k=2) == []
+
+def test_save_and_mmap_load_roundtrip(tmp_path):
+    idx = SparseIndex.build(list(TEXTS), list(TEXTS.values()))
+    idx.save(str(tmp_path / SPARSE_DIR))
+    loaded = SparseIndex.load(str(tmp_path / SPARSE_DIR))
+    assert isinstance(loaded.docs, np.memmap)
+    assert loaded.search("taxas maquininha", k=3) == idx.search("taxas maquininha", k=3)
+
+def test_rrf_fuse_rewards_agreement():
+    assert rrf_fuse([["x", "y", "z"], ["y", "w"]])[0] == "y"
+
+@pytest.fixture
+def hybrid(tmp_path, monkeypatch):
+    monkeypatch.setenv("PERSIST_DIR", str(tmp_path))
+    monkeypatch.setenv("COLLECTION_NAME", "test")
+    monkeypatch.setenv("STORE_RELOAD_CHECK_S", "0")
+    monkeypatch.setenv("BM25_MIN_SCORE", "0.5")
+    monkeypatch.setattr(store, "_embedding", lambda: DeterministicFakeEmbedding(size=16))
+    vs = store.open_store(str(tmp_path), "test", DeterministicFakeEmbedding(size=16))
+    vs.add_documents([Document(page_content=t, metadata={"url": f"https://x/{i}"}) for i, t in TEXTS.items()],
+                     ids=list(TEXTS))
+    SparseIndex.build(list(TEXTS), list(TEXTS.values())).save(str(tmp_path / SPARSE_DIR))
+    monkeypatch.setattr(store, "_warm", store.WarmStore())
+    store.warmup()
+
+def test_keyword_fast_path_skips_embedding(hybrid, monkeypatch):
+    def no_embed(*a, **kw):
+        raise AssertionError("embedding should not run")
+    monkeypatch.setattr(store._warm.embeddings, "embed_query", no_embed)
+    docs, mode = store.hybrid_search("chargeback", k=2)
+    assert mode == "bm25" and docs[0].id == "b"
+
+def test_ambiguous_query_is_fused(hybrid, monkeypatch):
+    monkeypatch.setenv("BM25_MIN_SCORE", "5")
+    docs, mode = store.hybrid_search("taxas maquininha", k=3)
+    assert mode == "hybrid"
+    assert {d.id for d in docs} <= set(TEXTS) and len(docs) == 3
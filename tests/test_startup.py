@@ -0,0 +1,33 @@
+import json, os, subprocess, sys
+from backend.app.rag import store
+
+BACKEND = os.path.join(os.path.dirname(__file__), "..", "backend")
+HEAVY = ("chromadb", "langchain_chroma", "langchain_huggingface", "sentence_transformers", "torch", "sympy")
+
+def _import_main():
+    code = (
+        "import sys, time; t0 = time.perf_counter(); import app.main; "
+        "import json; elapsed = time.perf_counter() - t0; "
+        f"print(json.dumps([elapsed, [m for m in {HEAVY!r} if m in sys.modules]]))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, capture_output=True,
+                         text=True, check=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"})
+    elapsed, loaded = json.loads(out.stdout.strip().splitlines()[-1])
+    return elapsed, loaded
+
+def test_import_main_skips_heavy_subsystems():
+    _, loaded = _import_main()
+    assert loaded == []
+
+def test_import_main_within_budget():
+    budget = float(os.getenv("STARTUP_IMPORT_BUDGET_S", "3.0"))
+    elapsed, _ = _import_main()
+    assert elapsed < budget, f"import app.main levou {elapsed:.2f}s (orçamento {budget}s)"
+
+def test_model_path_prefers_local_copy(tmp_path, monkeypatch):
+    monkeypatch.setenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    monkeypatch.setenv("EMBEDDING_MODEL_DIR", str(tmp_path))
+    assert store.model_path() == "sentence-transformers/all-MiniLM-L6-v2"
+    local = tmp_path / "sentence-transformers__all-MiniLM-L6-v2"
+    local.mkdir()
+    assert store.model_path() == str(local)
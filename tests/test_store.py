@@ -0,0 +1,30 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from backend.app.rag import store
+
+@pytest.fixture
+def warm(tmp_path, monkeypatch):
+    monkeypatch.setenv("PERSIST_DIR", str(tmp_path))
+    monkeypatch.setenv("COLLECTION_NAME", "test")
+    monkeypatch.setenv("STORE_RELOAD_CHECK_S", "0")
+    monkeypatch.setattr(store, "_embedding", lambda: DeterministicFakeEmbedding(size=16))
+    store.open_store(str(tmp_path), "test", DeterministicFakeEmbedding(size=16)).add_documents(
+        [Document(page_content="taxas da maquininha", metadata={"url": "https://x/a"})]
+    )
+    monkeypatch.setattr(store, "_warm", store.WarmStore())
+    return tmp_path
+
+def test_store_is_shared_between_calls(warm):
+    assert not store.is_ready()
+    s1 = store.warmup()
+    assert store.is_ready()
+    assert store.get_store() is s1
+    assert store.similarity_search("taxas", k=1)[0].metadata["url"] == "https://x/a"
+
+def test_store_reloads_on_index_rebuild(warm):
+    s1 = store.get_store()
+    version = store.mark_index_built(str(warm))
+    s2 = store.get_store()
+    assert s2 is not s1
+    assert store.status()["index_version"] == version
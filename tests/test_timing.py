@@ -0,0 +1,26 @@
+import pytest
+from httpx import AsyncClient
+from backend.app.main import app
+from backend.app.core import timing
+
+def test_span_records_into_request_and_histogram():
+    before = timing.SPAN_SECONDS.count(span="t_unit")
+    spans = timing.start()
+    with timing.span("t_unit"):
+        pass
+    with timing.span("t_unit"):
+        pass
+    assert set(spans) == {"t_unit"}
+    assert timing.SPAN_SECONDS.count(span="t_unit") == before + 2
+    assert timing.server_timing({"embed": 0.0123}) == "embed;dur=12.3"
+    timing.detach()
+
+@pytest.mark.asyncio
+async def test_chat_server_timing_and_metrics():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.post("/chat", json={"message": "70+12", "user_id": "u1", "conversation_id": "c1"})
+        names = [part.split(";")[0] for part in r.headers["server-timing"].split(", ")]
+        assert {"sanitize", "route", "math", "log", "total"} <= set(names)
+        text = (await ac.get("/metrics")).text
+    assert 'chat_span_seconds_bucket{span="math",le="+Inf"}' in text
+    assert 'agent_seconds_count{agent="MathAgent",decision="evaluated_fast"}' in text
@@ -0,0 +1,58 @@
+import asyncio, threading, time
+import pytest
+from backend.app.core.workers import ProcessPool, WorkerPool, PoolSaturated
+from backend.app.agents import router, knowledge
+
+@pytest.mark.asyncio
+async def test_pool_rejects_when_saturated():
+    pool = WorkerPool("t", max_workers=1, max_queue=1)
+    gate = threading.Event()
+    tasks = [asyncio.create_task(pool.run(gate.wait, 5)) for _ in range(2)]
+    await asyncio.sleep(0.05)
+    with pytest.raises(PoolSaturated):
+        await pool.run(lambda: None)
+    assert pool.stats()["queued"] == 1
+    gate.set()
+    await asyncio.gather(*tasks)
+    assert await pool.run(lambda: 42) == 42
+    pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_math_latency_flat_while_knowledge_saturates(monkeypatch):
+    called = []
+
+    def slow_knowledge(a, user_id, conversation_id, log, *args):
+        called.append(threading.current_thread())
+        time.sleep(0.3)
+        return ("ok", "slow", "vector_rag_validated"), knowledge.Retrieval(0.0, [], [], "vector")
+    monkeypatch.setenv("ANSWER_CACHE", "0")
+    monkeypatch.setenv("CONTEXT_CACHE", "0")
+    monkeypatch.setattr(knowledge, "_answer_in_context", slow_knowledge)
+    monkeypatch.setattr(knowledge, "knowledge_pool", WorkerPool("k", max_workers=2, max_queue=2))
+
+    load = [asyncio.create_task(router.router_agent("taxa da maquininha", "u", "c", None))
+            for _ in range(6)]
+    await asyncio.sleep(0.02)
+    t0 = time.perf_counter()
+    resp, _, workflow = await router.router_agent("70 + 12", "u", "c", None)
+    elapsed = time.perf_counter() - t0
+    assert workflow[0]["decision"] == "MathAgent"
+    assert elapsed < 0.1
+
+    results = await asyncio.gather(*load, return_exceptions=True)
+    assert sum(isinstance(r, PoolSaturated) for r in results) == 2
+    assert [r[0] for r in results if not isinstance(r, BaseException)] == ["ok"] * 4
+    assert len(called) == 4 and threading.main_thread() not in called
+    knowledge.knowledge_pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_process_pool_timeout_kills_the_worker():
+    pool = ProcessPool("t", max_workers=1, max_queue=0)
+    with pytest.raises(asyncio.TimeoutError):
+        await pool.run(0.5, time.sleep, 30)
+    assert pool.killed == 1
+    # A capacidade volta: o próximo run não espera o sleep de 30s.
+    t0 = time.perf_counter()
+    assert await pool.run(10, abs, -3) == 3
+    assert time.perf_counter() - t0 < 10
+    pool.shutdown()